@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+# Benchmarks for the config file and usage journal, with long favorites and
+# recent lists. The runner points HOME at a scratch directory first, so
+# these never touch a real config.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import os
+
+import emojam.emojam_config as emojam_config
+import emojam.emojam_usage as emojam_usage
+
+from harness import benchmark, Timed
+
+LIST_LENGTH = 1000  # favorites and recents, per dataset scale
+
+
+def make_config(dataset):
+    """ A config with long lists, saved to disk """
+    l_names = dataset.sample_names(LIST_LENGTH * dataset.i_scale)
+    config = emojam_config.EmojamConfig()
+    config.load_config()
+    config.favorites = list(l_names)
+    config.recently_used_max_count = len(l_names)
+    config.recently_used_emojis = list(reversed(l_names))
+    config.save()
+    config.flush()
+    return config, l_names
+
+
+@benchmark('config.load', b_scaled=True)
+def bench_config_load(dataset):
+    make_config(dataset)
+
+    def load():
+        emojam_config.EmojamConfig().load_config()
+    return Timed(load)
+
+
+@benchmark('config.save_call', b_scaled=True)
+def bench_config_save_call(dataset):
+    """ What a click pays: add_recent and save(), with the write left to
+    the background writer """
+    config, l_names = make_config(dataset)
+    l_clicks = l_names[:100]
+
+    def clicks():
+        for s_name in l_clicks:
+            config.add_recent(s_name)
+            config.save()
+    return Timed(clicks, len(l_clicks), config.flush)
+
+
+@benchmark('config.write', b_scaled=True)
+def bench_config_write(dataset):
+    """ The background writer's side: serialize and atomically replace the
+    file, fsync included """
+    config, l_names = make_config(dataset)
+
+    def write():
+        config.save()
+        config.flush()
+    return Timed(write)
+
+
+@benchmark('usage.record_pick', b_scaled=True)
+def bench_usage_record_pick(dataset):
+    s_journal_path = os.path.join(os.path.expanduser('~'),
+                                  f'usage_x{dataset.i_scale}.log')
+    usage = emojam_usage.UsageTracker(s_journal_path)
+    l_names = dataset.sample_names(LIST_LENGTH)
+
+    def picks():
+        for s_name in l_names:
+            usage.record_pick(s_name)
+    return Timed(picks, len(l_names), usage.flush)
+
+
+@benchmark('usage.ranked', b_scaled=True)
+def bench_usage_ranked(dataset):
+    usage = emojam_usage.UsageTracker(os.devnull)
+    for i_pick, s_name in enumerate(
+            dataset.sample_names(emojam_usage.MAX_ENTRIES)):
+        usage.apply_pick(s_name, float(i_pick))
+    return Timed(lambda: usage.ranked(100))
+
+
+@benchmark('usage.load_journal', b_scaled=True)
+def bench_usage_load_journal(dataset):
+    """ Replaying a journal just short of compaction """
+    s_journal_path = os.path.join(os.path.expanduser('~'),
+                                  f'usage_load_x{dataset.i_scale}.log')
+    l_names = dataset.sample_names(emojam_usage.COMPACT_AFTER)
+    with open(s_journal_path, 'w', encoding='utf-8') as f_journal:
+        for i_pick, s_name in enumerate(l_names):
+            f_journal.write(f'p\t{i_pick}\t{s_name}\n')
+
+    def load():
+        emojam_usage.UsageTracker(s_journal_path).load()
+    return Timed(load, len(l_names))
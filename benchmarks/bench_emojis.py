@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+# Benchmarks for the emoji database: loading it, its memory use, lookups.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import gc
+import os
+import tracemalloc
+
+import emojam.emojam_emojis as emojam_emojis
+
+from harness import benchmark, Timed
+
+
+@benchmark('emojis.load_csv', b_scaled=True)
+def bench_load_csv(dataset):
+    return Timed(lambda: emojam_emojis.Emojis(dataset.s_csv_path,
+                                              b_use_cache=False))
+
+
+@benchmark('emojis.load_cache', b_scaled=True)
+def bench_load_cache(dataset):
+    emojam_emojis.Emojis(dataset.s_csv_path)    # writes the cache
+    return Timed(lambda: emojam_emojis.Emojis(dataset.s_csv_path))
+
+
+@benchmark('emojis.memory', b_scaled=True)
+def bench_memory(dataset):
+    """ Bytes held by a loaded DB, per emoji. Indexes included, so this is
+    more than the records alone (see tests/test_emojis.py for those) """
+    gc.collect()
+    tracemalloc.start()
+    emo = emojam_emojis.Emojis(dataset.s_csv_path, b_use_cache=False)
+    i_current, i_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'emojis': emo.emoji_count(),
+            'bytes': i_current,
+            'peak_bytes': i_peak,
+            'bytes_per_emoji': round(i_current / emo.emoji_count(), 1)}
+
+
+@benchmark('emojis.emoji_from_name', b_scaled=True)
+def bench_emoji_from_name(dataset):
+    emo = dataset.emo
+    l_names = dataset.sample_names(1000)
+
+    def lookups():
+        for s_name in l_names:
+            emo.emoji_from_name(s_name)
+    return Timed(lookups, len(l_names))
+
+
+@benchmark('emojis.name_from_emoji', b_scaled=True)
+def bench_name_from_emoji(dataset):
+    emo = dataset.emo
+    l_emojis = [emo.emoji_from_name(s_name)
+                for s_name in dataset.sample_names(1000)]
+
+    def lookups():
+        for s_emoji in l_emojis:
+            emo.name_from_emoji(s_emoji)
+    return Timed(lookups, len(l_emojis))
+
+
+@benchmark('emojis.emoji_group_from_name', b_scaled=True)
+def bench_emoji_group_from_name(dataset):
+    emo = dataset.emo
+    l_names = dataset.sample_names(1000)
+
+    def lookups():
+        for s_name in l_names:
+            emo.emoji_group_from_name(s_name)
+    return Timed(lookups, len(l_names))
+
+
+@benchmark('emojis.lookup_miss', b_scaled=True)
+def bench_lookup_miss(dataset):
+    emo = dataset.emo
+    l_names = [f'{s_name} nope' for s_name in dataset.sample_names(1000)]
+
+    def lookups():
+        for s_name in l_names:
+            emo.emoji_from_name(s_name)
+    return Timed(lookups, len(l_names))
+
+
+@benchmark('emojis.csv_size', b_scaled=True)
+def bench_csv_size(dataset):
+    """ Not a timing: how big each scale's dataset is, for reference """
+    return {'rows': len(dataset.l_rows),
+            'csv_bytes': os.path.getsize(dataset.s_csv_path)}
+
+
+@benchmark('emojis.qualification', b_scaled=True)
+def bench_qualification(dataset):
+    """ Not a timing: records and aliases under each qualification policy.
+    tests/test_emojis.py checks the counts add up """
+    d_counts = {}
+    for s_qualification in emojam_emojis.QUALIFICATIONS:
+        emo = emojam_emojis.Emojis(dataset.s_csv_path, b_use_cache=False,
+                                   s_qualification=s_qualification)
+        d_counts[s_qualification] = {'records': len(emo.l_records),
+                                     'aliases': len(emo.l_aliases)}
+    return d_counts
+
+
+# Range queries: codepoint prefixes and emoji versions, by bisecting the
+# sorted indexes, against a scan over every record for comparison
+CODEPOINT_PREFIXES = ['1F6', '1F9D1 200D', '1F3', '26', '1FA']
+VERSION_RANGES = [('>=', (13, 0)), ('<', (1, 0)), ('=', (12, 1)),
+                  ('>', (5, 0))]
+
+
+@benchmark('emojis.range_indexes.build', b_scaled=True)
+def bench_range_indexes_build(dataset):
+    emo = dataset.emo
+    return Timed(emo.build_range_indexes)
+
+
+@benchmark('emojis.range_query.indexed', b_scaled=True)
+def bench_range_query_indexed(dataset):
+    emo = dataset.emo
+    emo.build_range_indexes()
+
+    def queries():
+        for s_prefix in CODEPOINT_PREFIXES:
+            emo.codepoints_starting(s_prefix)
+        for s_operator, t_version in VERSION_RANGES:
+            emo.versions_matching(s_operator, t_version)
+    return Timed(queries, len(CODEPOINT_PREFIXES) + len(VERSION_RANGES))
+
+
+@benchmark('emojis.range_query.scan', b_scaled=True)
+def bench_range_query_scan(dataset):
+    """ The same queries as range_query.indexed, checking every record """
+    emo = dataset.emo
+    d_compare = {'>=': tuple.__ge__, '<': tuple.__lt__, '=': tuple.__eq__,
+                 '>': tuple.__gt__}
+    # both get the same results
+    for s_prefix in CODEPOINT_PREFIXES:
+        assert {emoji_record.id for emoji_record
+                in emo.codepoints_starting(s_prefix)} == \
+            {emo.d_by_codepoint[s_codepoint].id
+             for s_codepoint in emo.d_by_codepoint
+             if s_codepoint.startswith(s_prefix)}
+
+    def queries():
+        for s_prefix in CODEPOINT_PREFIXES:
+            [emoji_record for emoji_record in emo.l_records
+             if emoji_record.codepoint.startswith(s_prefix)]
+        for s_operator, t_version in VERSION_RANGES:
+            f_compare = d_compare[s_operator]
+            [emoji_record for emoji_record in emo.l_records
+             if f_compare(emojam_emojis.parse_version(emoji_record.version),
+                          t_version)]
+    return Timed(queries, len(CODEPOINT_PREFIXES) + len(VERSION_RANGES))
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+# Benchmarks for the GTK-free parts behind the picker window: bitset filters,
+# grid geometry, and the daemon client's round trip.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import os
+import socket
+import tempfile
+import threading
+
+import emojam.emojam_client as emojam_client
+import emojam.emojam_filter as emojam_filter
+import emojam.emojam_geometry as emojam_geometry
+
+from harness import benchmark, Timed
+
+
+@benchmark('filter.build', b_scaled=True)
+def bench_filter_build(dataset):
+    emo = dataset.emo
+    return Timed(lambda: emojam_filter.FilterEngine(emo))
+
+
+@benchmark('filter.group_view', b_scaled=True)
+def bench_filter_group_view(dataset):
+    """ Switching to a group: its bitset to a list of names """
+    filters = emojam_filter.FilterEngine(dataset.emo)
+    l_groups = list(filters.d_group_bits)
+
+    def views():
+        for s_group in l_groups:
+            filters.names_from_bits(filters.group_bits(s_group))
+    return Timed(views, len(l_groups))
+
+
+@benchmark('filter.all_view', b_scaled=True)
+def bench_filter_all_view(dataset):
+    filters = emojam_filter.FilterEngine(dataset.emo)
+    return Timed(lambda: filters.names_from_bits(filters.all_bits))
+
+
+@benchmark('filter.search_in_group', b_scaled=True)
+def bench_filter_search_in_group(dataset):
+    """ Search results narrowed to a group, as the picker shows them """
+    filters = emojam_filter.FilterEngine(dataset.emo)
+    result = dataset.search.ranked_query('face')
+    i_group_bits = filters.group_bits('Smileys-Emotion')
+    return Timed(lambda: filters.names_from_bits(
+            i_group_bits & filters.bits_from_names(result.scores)))
+
+
+@benchmark('geometry.scroll')
+def bench_geometry_scroll(dataset):
+    """ Visible range and hit testing for a scroll through 100,000 cells """
+    geometry = emojam_geometry.GridGeometry(60, 60, 740, 100000)
+    l_offsets = range(0, geometry.total_height(), 997)
+
+    def scroll():
+        for i_offset in l_offsets:
+            geometry.visible_range(i_offset, 400, 2)
+            geometry.index_at(370, i_offset + 200)
+    return Timed(scroll, len(l_offsets))
+
+
+@benchmark('client.round_trip')
+def bench_client_round_trip(dataset):
+    """ Client side of a daemon command: connect, send, read the reply.
+    Answered by a bare socket thread, so this is the protocol's overhead,
+    not GTK's. tests/test_daemon.py checks toggle-to-visible time against
+    the real daemon and picker """
+    s_dir = tempfile.mkdtemp(prefix='emojam-bench-')
+    s_path = os.path.join(s_dir, 'emojam.sock')
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(s_path)
+    server.listen(8)
+
+    def serve():
+        while True:
+            try:
+                client, address = server.accept()
+            except OSError:     # closed, benchmark's over
+                return
+            with client:
+                client.recv(emojam_client.MAX_LINE)
+                client.sendall(b'ok\n')
+
+    threading.Thread(target=serve, daemon=True).start()
+
+    def teardown():
+        server.close()
+        os.unlink(s_path)
+        os.rmdir(s_dir)
+    return Timed(lambda: emojam_client.send_command('show', s_path=s_path),
+                 f_teardown=teardown)
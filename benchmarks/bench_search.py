@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+# Benchmarks for search: building the index, and queries from very selective
+# to matching most of the DB, misspellings included.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import emojam.emojam_search as emojam_search
+
+from harness import benchmark, Timed
+
+# name: query. Roughly from fewest matches to most
+QUERIES = {
+    'exact': 'thumbs up',
+    'selective': 'pizza',
+    'two_words': 'cat fa',
+    'broad': 'face',
+    'single_letter': 'a',
+    'miss': 'xylophonez',
+    'codepoint': 'U+1F6',
+    'version': 'version>=E13.0',
+    'words_and_version': 'person v<E2',
+}
+
+# misspellings people actually make, for the fuzzy matcher
+MISSPELLED = ['smilng', 'thumbs pu', 'grinnig face', 'piza', 'hert',
+              'flag untied states', 'rocet', 'fier', 'sparkels', 'pary popper',
+              'crying laghing', 'eyes heart']
+
+
+@benchmark('search.build_index', b_scaled=True)
+def bench_build_index(dataset):
+    emo = dataset.emo
+    return Timed(lambda: emojam_search.EmojiSearch(emo))
+
+
+def make_query_benchmark(s_query: str):
+    def bench_query(dataset):
+        search = dataset.search
+        return Timed(lambda: search.ranked_query(s_query).ranked())
+    return bench_query
+
+
+for s_query_name, s_query in QUERIES.items():
+    benchmark(f'search.query.{s_query_name}', b_scaled=True)(
+            make_query_benchmark(s_query))
+
+
+@benchmark('search.match_counts', b_scaled=True)
+def bench_match_counts(dataset):
+    """ Not a timing: how many results each query has, for reference """
+    return {s_query_name: len(dataset.search.ranked_query(s_query))
+            for s_query_name, s_query in QUERIES.items()}
+
+
+@benchmark('search.misspelled', b_scaled=True)
+def bench_misspelled(dataset):
+    search = dataset.search
+
+    def queries():
+        for s_query in MISSPELLED:
+            search.ranked_query(s_query).ranked()
+    return Timed(queries, len(MISSPELLED))
+
+
+@benchmark('search.typing_session', b_scaled=True)
+def bench_typing_session(dataset):
+    """ Every keystroke of typing a query, the way the picker runs it """
+    search = dataset.search
+    s_typed = 'smiling face with'
+    l_prefixes = [s_typed[:i_end] for i_end in range(1, len(s_typed) + 1)]
+
+    def keystrokes():
+        session = emojam_search.SearchSession(search)
+        for s_prefix in l_prefixes:
+            session.query(s_prefix)
+    return Timed(keystrokes, len(l_prefixes))
+
+
+@benchmark('search.scan_query', b_scaled=True)
+def bench_scan_query(dataset):
+    """ The command line's one-off search, with no index """
+    search = emojam_search.EmojiSearch(dataset.emo, b_build=False)
+    return Timed(lambda: search.scan_query('cat fa').ranked())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+# Benchmarks for the emojize/demojize text filters, in MB/s of UTF-8 input.
+#
+# The input is made-up chat text: words with an emoji (or a :shortcode:, for
+# emojize) every EMOJI_EVERY words, taken from across the whole DB so ZWJ
+# sequences, flags and skin tones are all in there. It's fed through in
+# CHUNK_SIZE pieces like the emojam filters read it, and checked to round
+# trip before being timed.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import random
+
+import emojam.emojam_text as emojam_text
+
+from harness import benchmark, Timed, synthetic_word
+
+TEXT_WORDS = 200000     # about 1 MB of text
+EMOJI_EVERY = 8         # words per emoji
+PLAIN_WORDS = 500       # vocabulary of the plain words
+
+
+def make_text(l_tokens):
+    """ Made-up text with one of l_tokens every EMOJI_EVERY words """
+    rng = random.Random(1)
+    l_plain = [synthetic_word(i_word) for i_word in range(PLAIN_WORDS)]
+    l_words = [rng.choice(l_tokens) if i_word % EMOJI_EVERY == 0 else
+               rng.choice(l_plain) for i_word in range(TEXT_WORDS)]
+    return ' '.join(l_words)
+
+
+def convert(converter, s_text: str, i_chunk_size: int):
+    """ Run s_text through converter a chunk at a time """
+    l_out = [converter.feed(s_text[i_start:i_start + i_chunk_size])
+             for i_start in range(0, len(s_text), i_chunk_size)]
+    l_out.append(converter.close())
+    return ''.join(l_out)
+
+
+def make_text_benchmark(b_emojize: bool):
+    def bench_text(dataset):
+        text_engine = emojam_text.EmojiText(dataset.emo)
+        l_emojis = [emoji_record.emoji
+                    for emoji_record in dataset.emo.l_records]
+        s_emoji_text = make_text(l_emojis)
+        s_shortcode_text = text_engine.demojize(s_emoji_text)
+        assert text_engine.emojize(s_shortcode_text) == s_emoji_text
+        if b_emojize:
+            s_text, converter_class = s_shortcode_text, emojam_text.Emojizer
+        else:
+            s_text, converter_class = s_emoji_text, emojam_text.Demojizer
+        return Timed(lambda: convert(converter_class(text_engine), s_text,
+                                     emojam_text.CHUNK_SIZE),
+                     i_bytes=len(s_text.encode('utf-8')))
+    return bench_text
+
+
+benchmark('text.emojize')(make_text_benchmark(True))
+benchmark('text.demojize')(make_text_benchmark(False))
+
+
+@benchmark('text.build')
+def bench_build(dataset):
+    emo = dataset.emo
+    return Timed(lambda: emojam_text.EmojiText(emo))
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+# Compare two benchmark runs from run.py, eg: before and after a change.
+#
+# Prints each timed benchmark's median in both runs and the ratio new/old,
+# flagging anything slower than the threshold. Exits with status 1 if
+# anything regressed, so it can be used in CI.
+#
+# Usage: compare.py OLD.json NEW.json [--threshold 1.25]
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import argparse
+import json
+import sys
+
+
+def load_medians(s_path: str):
+    """ {(name, scale): median ms} for the timed results in a run """
+    with open(s_path, encoding='utf-8') as f_report:
+        d_report = json.load(f_report)
+    return {(d_result['name'], d_result['scale']): d_result['median_ms']
+            for d_result in d_report['results'] if 'median_ms' in d_result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare benchmark runs.')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='new/old ratio counted as a regression '
+                             '(default 1.25)')
+    args = parser.parse_args()
+    d_old = load_medians(args.old)
+    d_new = load_medians(args.new)
+    b_regressed = False
+    print(f"{'benchmark':<36} {'scale':>5} {'old ms':>10} {'new ms':>10} "
+          f"{'ratio':>7}")
+    for t_key in sorted(d_old.keys() & d_new.keys(),
+                        key=lambda t_key: (t_key[0], t_key[1] or 0)):
+        s_name, i_scale = t_key
+        f_ratio = d_new[t_key] / d_old[t_key] if d_old[t_key] else 1.0
+        s_flag = ''
+        if f_ratio > args.threshold:
+            s_flag = '  SLOWER'
+            b_regressed = True
+        elif f_ratio < 1 / args.threshold:
+            s_flag = '  faster'
+        print(f"{s_name:<36} {i_scale or '-':>5} {d_old[t_key]:>10.3f} "
+              f"{d_new[t_key]:>10.3f} {f_ratio:>7.2f}{s_flag}")
+    for t_key in sorted(d_old.keys() ^ d_new.keys(), key=str):
+        print(f"{t_key[0]:<36} {t_key[1] or '-':>5} only in "
+              f"{'old' if t_key in d_old else 'new'}")
+    return 1 if b_regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
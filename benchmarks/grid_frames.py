@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+# Frame times of the emoji grid, scrolling and resizing.
+#
+# Shows every emoji in a window, two ways: the picker's custom-drawn
+# EmojiGrid, and for comparison the Gtk.FlowBox of one EventBox and Label per
+# emoji that the picker used to have. Then, for each, scrolls from top to
+# bottom a step at a time and resizes the window through a range of widths,
+# timing each step from the change to the end of the frame that paints it.
+# Prints the p50/p99/max frame times as JSON.
+#
+# Needs PyGObject and a display (run under xvfb-run on a headless box). Runs
+# with a throwaway HOME and cache dir. The grid is measured once its glyph
+# atlas is ready, like it would be from the second launch on.
+#
+# Usage: grid_frames.py [--steps N] [--only grid|flowbox]
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WINDOW_WIDTH = 740
+WINDOW_HEIGHT = 500
+FONT_SIZE = 270         # picker's default zoom, percent
+ATLAS_TIMEOUT = 60      # seconds to wait for the glyph atlas
+
+
+def make_flowbox(emo, l_names):
+    """ The old grid: a widget per emoji, in a FlowBox """
+    from gi.repository import Gtk
+    scrolled = Gtk.ScrolledWindow()
+    scrolled.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+    flowbox = Gtk.FlowBox()
+    flowbox.set_valign(Gtk.Align.START)
+    flowbox.set_max_children_per_line(30)
+    flowbox.set_selection_mode(Gtk.SelectionMode.NONE)
+    for s_emoji_name in l_names:
+        button = Gtk.EventBox()
+        label = Gtk.Label(label=emo.emoji_from_name(s_emoji_name))
+        label.get_style_context().add_class('emoji-button')
+        button.add(label)
+        flowbox.add(button)
+    scrolled.add(flowbox)
+    return scrolled
+
+
+def make_grid(emo, l_names):
+    """ The custom-drawn grid, with its atlas ready """
+    import emojam.emojam_atlas as emojam_atlas
+    import emojam.emojam_grid as emojam_grid
+    l_ready = []
+    atlas = emojam_atlas.GlyphAtlas(
+            [record.emoji for record in emo.l_records],
+            ready=lambda: l_ready.append(True))
+    grid = emojam_grid.EmojiGrid(atlas, emo.emoji_from_name,
+                                 lambda *args: None)
+    grid.set_names(l_names)
+    return grid, l_ready
+
+
+def wait_for_paint(win):
+    """ Run the main loop until win has painted a frame, return ms taken """
+    from gi.repository import Gtk
+    f_start_time = time.perf_counter()
+    l_painted = []
+    frame_clock = win.get_frame_clock()
+    i_handler = frame_clock.connect('after-paint',
+                                    lambda clock: l_painted.append(True))
+    win.queue_draw()
+    while not l_painted:
+        Gtk.main_iteration()
+    frame_clock.disconnect(i_handler)
+    return (time.perf_counter() - f_start_time) * 1000
+
+
+def measure(s_kind: str, emo, i_steps: int):
+    from gi.repository import Gtk
+    import emojam.emojam_profile as emojam_profile
+    import emojam.emojam_style as emojam_style
+    win = Gtk.Window()
+    win.set_default_size(WINDOW_WIDTH, WINDOW_HEIGHT)
+    emojam_style.StyleManager(win, FONT_SIZE)
+    l_names = [record.name for record in emo.l_records]
+    f_start_time = time.perf_counter()
+    if s_kind == 'grid':
+        scrolled, l_ready = make_grid(emo, l_names)
+    else:
+        scrolled, l_ready = make_flowbox(emo, l_names), [True]
+    win.add(scrolled)
+    win.show_all()
+    wait_for_paint(win)
+    f_first_paint = (time.perf_counter() - f_start_time) * 1000
+    f_deadline = time.monotonic() + ATLAS_TIMEOUT
+    while not l_ready and time.monotonic() < f_deadline:
+        Gtk.main_iteration_do(False)
+        time.sleep(0.01)
+    wait_for_paint(win)
+    # scroll top to bottom
+    adjustment = scrolled.get_vadjustment()
+    f_bottom = adjustment.get_upper() - adjustment.get_page_size()
+    l_scroll_ms = []
+    for i_step in range(1, i_steps + 1):
+        adjustment.set_value(f_bottom * i_step / i_steps)
+        l_scroll_ms.append(wait_for_paint(win))
+    # resize, narrower then back out
+    adjustment.set_value(0)
+    wait_for_paint(win)
+    l_resize_ms = []
+    for i_step in range(i_steps):
+        f_fraction = abs(i_step / (i_steps / 2) - 1)    # 1 -> 0 -> 1
+        win.resize(int(WINDOW_WIDTH * (0.5 + 0.5 * f_fraction)),
+                   WINDOW_HEIGHT)
+        l_resize_ms.append(wait_for_paint(win))
+    win.destroy()
+
+    def summary(l_ms):
+        d_summary = emojam_profile.summarize(l_ms)
+        return {s_key: round(d_summary[s_key], 2)
+                for s_key in ('p50', 'p99', 'max')}
+    return {'first_paint_ms': round(f_first_paint, 1),
+            'atlas_ready': bool(l_ready),
+            'scroll_ms': summary(l_scroll_ms),
+            'resize_ms': summary(l_resize_ms)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time emoji grid frames.')
+    parser.add_argument('--steps', type=int, default=40,
+                        help='scroll and resize steps (default 40)')
+    parser.add_argument('--only', choices=('grid', 'flowbox'),
+                        help='only measure one of them')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix='emojam-frames-') as s_home:
+        os.environ['HOME'] = s_home
+        os.environ['XDG_CACHE_HOME'] = os.path.join(s_home, '.cache')
+        sys.path.insert(0, REPO_DIR)
+        import gi
+        gi.require_version("Gtk", "3.0")
+        from gi.repository import Gtk
+        if not Gtk.init_check()[0]:
+            print('grid_frames.py: needs a display', file=sys.stderr)
+            return 1
+        import emojam.emojam_emojis as emojam_emojis
+        emo = emojam_emojis.Emojis(emojam_emojis.DB_FILENAME)
+        d_results = {}
+        for s_kind in ('grid', 'flowbox'):
+            if args.only in (None, s_kind):
+                d_results[s_kind] = measure(s_kind, emo, args.steps)
+    print(json.dumps({'python': sys.version.split()[0],
+                      'emojis': len(emo.l_records), 'steps': args.steps,
+                      'results': d_results}, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
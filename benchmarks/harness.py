@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+# Benchmark harness for Emojam.
+#
+# Benchmarks are plain functions registered with @benchmark. Each one takes a
+# Dataset and either returns a Timed (a callable to time, and how many
+# operations one call does) or a dict of measurements it took itself, like
+# memory use. Benchmarks marked scaled run once per dataset scale: 1 is the
+# real emoji set, 10 and 100 are synthetic sets built from it by adding a
+# made-up word to every name, so vocabulary and index sizes grow too.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import csv
+import gc
+import os
+import statistics
+import time
+
+import emojam.emojam_cache as emojam_cache
+import emojam.emojam_emojis as emojam_emojis
+
+BENCHMARKS = []     # (name, function, scaled), in registration order
+
+
+def benchmark(s_name: str, b_scaled: bool = False):
+    """ Register a benchmark function """
+    def register(f_benchmark):
+        BENCHMARKS.append((s_name, f_benchmark, b_scaled))
+        return f_benchmark
+    return register
+
+
+class Timed:
+    """ A callable for the runner to time. i_ops is how many operations one
+    call does, for per-operation times. i_bytes, if given, is how much data
+    one call gets through, for throughput """
+
+    def __init__(self, f_call, i_ops: int = 1, f_teardown=None,
+                 i_bytes: int = None):
+        self.f_call = f_call
+        self.i_ops = i_ops
+        self.f_teardown = f_teardown
+        self.i_bytes = i_bytes
+
+
+def time_call(timed: Timed, i_repeat: int, f_min_time: float = 0.05):
+    """ Time timed.f_call. Calls it enough times per repeat to take at least
+    f_min_time seconds, and returns stats over i_repeat repeats """
+    timed.f_call()  # warm up, and find out roughly how long it takes
+    f_start_time = time.perf_counter()
+    timed.f_call()
+    f_once = time.perf_counter() - f_start_time
+    i_number = max(1, int(f_min_time / max(f_once, 1e-9)))
+    l_times = []
+    b_gc_was_enabled = gc.isenabled()
+    gc.disable()    # collections would land on random repeats
+    try:
+        for _ in range(i_repeat):
+            f_start_time = time.perf_counter()
+            for _ in range(i_number):
+                timed.f_call()
+            l_times.append((time.perf_counter() - f_start_time) / i_number)
+    finally:
+        if b_gc_was_enabled:
+            gc.enable()
+        if timed.f_teardown is not None:
+            timed.f_teardown()
+    f_median = statistics.median(l_times)
+    d_result = {
+        'ops': timed.i_ops,
+        'calls_per_repeat': i_number,
+        'min_ms': round(min(l_times) * 1000, 4),
+        'median_ms': round(f_median * 1000, 4),
+        'mean_ms': round(statistics.mean(l_times) * 1000, 4),
+        'per_op_us': round(f_median / timed.i_ops * 1e6, 4),
+    }
+    if timed.i_bytes is not None:
+        d_result['mb_per_s'] = round(timed.i_bytes / f_median / 1e6, 2)
+    return d_result
+
+
+def synthetic_word(i_number: int):
+    """ A made-up lowercase word, different for every number: ba, be .. """
+    s_consonants = 'bdfgklmnprstvz'
+    s_vowels = 'aeiou'
+    l_syllables = []
+    while True:
+        i_number, i_syllable = divmod(i_number, len(s_consonants) *
+                                      len(s_vowels))
+        l_syllables.append(s_consonants[i_syllable // len(s_vowels)] +
+                           s_vowels[i_syllable % len(s_vowels)])
+        if not i_number:
+            return ''.join(l_syllables)
+
+
+class Dataset:
+    """ Emoji rows at some scale, as a CSV file in s_work_dir, plus the
+    Emojis and search objects benchmarks share (built on first use) """
+
+    def __init__(self, i_scale: int, s_work_dir: str):
+        self.i_scale = i_scale
+        self.s_csv_path = os.path.join(s_work_dir, f'emojis_x{i_scale}.csv')
+        self.l_rows = self.make_rows(i_scale)
+        with open(self.s_csv_path, 'w', encoding='utf-8', newline='') as \
+                f_csv:
+            writer = csv.writer(f_csv)
+            writer.writerow(emojam_cache.RECORD_FIELDS)
+            writer.writerows(self.l_rows)
+        self._emo = None
+        self._search = None
+
+    @staticmethod
+    def make_rows(i_scale: int):
+        """ The real emoji rows, plus i_scale - 1 renamed copies of them """
+        s_real_path = os.path.join(os.path.dirname(emojam_emojis.__file__),
+                                   'emoji_sets', emojam_emojis.DB_FILENAME)
+        with open(s_real_path, encoding='utf-8', newline='') as f_csv:
+            l_base_rows = [tuple(row[s_field] for s_field
+                                 in emojam_cache.RECORD_FIELDS)
+                           for row in csv.DictReader(f_csv)]
+        l_rows = list(l_base_rows)
+        for i_copy in range(1, i_scale):
+            s_word = synthetic_word(i_copy)
+            # a private use character keeps representations unique
+            s_mark = chr(0xF0000 + i_copy)
+            l_rows.extend((s_group, s_sub_group, s_codepoint, s_status,
+                           s_emoji + s_mark, f'{s_name} {s_word}', s_section)
+                          for (s_group, s_sub_group, s_codepoint, s_status,
+                               s_emoji, s_name, s_section) in l_base_rows)
+        return l_rows
+
+    @property
+    def emo(self):
+        if self._emo is None:
+            # an absolute path bypasses the bundled emoji_sets directory
+            self._emo = emojam_emojis.Emojis(self.s_csv_path,
+                                             b_use_cache=False)
+        return self._emo
+
+    @property
+    def search(self):
+        if self._search is None:
+            import emojam.emojam_search as emojam_search
+            self._search = emojam_search.EmojiSearch(self.emo)
+        return self._search
+
+    def sample_names(self, i_count: int):
+        """ i_count names spread evenly over the dataset """
+        l_records = self.emo.l_records
+        i_step = max(1, len(l_records) // i_count)
+        return [emoji_record.name for emoji_record in l_records[::i_step]]
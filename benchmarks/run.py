@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+# Run Emojam's benchmarks and print the results as JSON.
+#
+# Headless: nothing here imports GTK. HOME and the cache dir are pointed at a
+# scratch directory before anything from emojam is loaded, so a run never
+# reads or writes real user files. Compare two runs with compare.py.
+#
+# Usage: run.py [--scales 1,10,100] [--filter TEXT] [--repeat N]
+#               [--output FILE]
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+BENCHMARK_MODULES = ('bench_emojis', 'bench_search', 'bench_config',
+                     'bench_models', 'bench_text')
+
+
+def git_commit():
+    """ The commit being benchmarked, or None outside a git checkout """
+    try:
+        process = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR,
+                                 capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return process.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Emojam's benchmarks.")
+    parser.add_argument('--scales', default='1,10,100',
+                        help='dataset scales, comma separated (default '
+                             '1,10,100)')
+    parser.add_argument('--filter', default='',
+                        help='only run benchmarks with this in their name')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='timed repeats per benchmark (default 5)')
+    parser.add_argument('--output', help='write JSON here, not to stdout')
+    args = parser.parse_args()
+    l_scales = sorted({int(s_scale) for s_scale in args.scales.split(',')})
+
+    with tempfile.TemporaryDirectory(prefix='emojam-bench-') as s_work_dir:
+        os.environ['HOME'] = s_work_dir
+        os.environ['XDG_CACHE_HOME'] = os.path.join(s_work_dir, '.cache')
+        sys.path[0:0] = [REPO_DIR, BENCHMARKS_DIR]
+        import harness
+        for s_module in BENCHMARK_MODULES:
+            __import__(s_module)
+        l_results = []
+        for i_scale in l_scales:
+            dataset = harness.Dataset(i_scale, s_work_dir)
+            for s_name, f_benchmark, b_scaled in harness.BENCHMARKS:
+                if args.filter not in s_name:
+                    continue
+                if not b_scaled and i_scale != l_scales[0]:
+                    continue    # only needs running once
+                print(f'{s_name} x{i_scale}', file=sys.stderr)
+                outcome = f_benchmark(dataset)
+                if isinstance(outcome, harness.Timed):
+                    d_result = harness.time_call(outcome, args.repeat)
+                else:
+                    d_result = outcome
+                l_results.append({'name': s_name,
+                                  'scale': i_scale if b_scaled else None,
+                                  **d_result})
+            del dataset
+
+    d_report = {
+        'commit': git_commit(),
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(
+                timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'results': l_results,
+    }
+    s_report = json.dumps(d_report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f_output:
+            f_output.write(s_report + '\n')
+    else:
+        print(s_report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+# Search latency and memory budget check, with keyword annotations.
+#
+# Builds the search index over the real emoji set with an annotation file
+# the size of CLDR's English one (about 5 keywords per emoji, from a few
+# thousand distinct words), and measures:
+#   annotations_load    reading the annotation file
+#   index_build         building the search index, annotations included
+#   keystroke_p50/p99   search time per keystroke, typing a mix of names,
+#                       keywords and misspellings into a SearchSession
+#   index_memory        memory the index holds, annotations included
+#   annotation_memory   how much of that the annotations add
+# and compares each against a budget. Prints the results as JSON and exits
+# with status 1 if anything is over budget, like startup_budget.py.
+#
+# The annotation file is synthetic, unless --annotations points at a real
+# one (a CLDR annotations .xml, or an emojam .txt). Runs with a throwaway
+# HOME and cache dir.
+#
+# Usage: search_budget.py [--annotations FILE] [--runs N]
+#                         [--budget NAME=VALUE ...]
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from xml.sax.saxutils import escape, quoteattr
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+# ms and MB. Generous, to allow for slow CI machines: these are meant to
+# catch regressions like a keyword index that doesn't share its strings,
+# not small wobbles
+BUDGETS = {
+    'annotations_load_ms': 150,
+    'index_build_ms': 1500,
+    'keystroke_p50_ms': 5,
+    'keystroke_p99_ms': 30,
+    'index_memory_mb': 40,
+    'annotation_memory_mb': 12,
+}
+
+LOCALE = 'xx'               # made-up locale the synthetic file is for
+KEYWORDS_PER_EMOJI = 5
+KEYWORD_VOCABULARY = 3000   # distinct made-up keywords
+# typed a character at a time. Made-up keywords are added by make_queries
+QUERIES = ['thumbs up', 'face with tears', 'red heart', 'party popper',
+           'cat', 'smilng', 'flag untied states', 'rocet', 'fire',
+           'grinning face', 'sparkles', 'hand']
+
+
+def write_synthetic_annotations(emo, s_path: str):
+    """ Write a CLDR style annotations file for every emoji in emo: a few
+    words of its name, some made-up keywords (common ones more often) and a
+    "translated" name """
+    from harness import synthetic_word
+    rng = random.Random(1)
+    l_vocabulary = [synthetic_word(i_word) + 'ä'
+                    for i_word in range(KEYWORD_VOCABULARY)]
+    l_weights = [1 / (i_word + 1) for i_word in range(KEYWORD_VOCABULARY)]
+    with open(s_path, 'w', encoding='utf-8') as f_annotations:
+        f_annotations.write('<?xml version="1.0" encoding="UTF-8" ?>\n'
+                            '<ldml>\n\t<annotations>\n')
+        for emoji_record in emo.l_records:
+            l_name_words = emoji_record.name.split()
+            l_keywords = rng.sample(l_name_words, min(2, len(l_name_words)))
+            l_keywords += rng.choices(l_vocabulary, l_weights,
+                                      k=KEYWORDS_PER_EMOJI - len(l_keywords))
+            s_cp = quoteattr(emoji_record.emoji)
+            f_annotations.write(
+                    f'\t\t<annotation cp={s_cp}>'
+                    f'{escape(" | ".join(l_keywords))}</annotation>\n'
+                    f'\t\t<annotation cp={s_cp} type="tts">'
+                    f'{escape(emoji_record.name)} {l_keywords[-1]}'
+                    f'</annotation>\n')
+        f_annotations.write('\t</annotations>\n</ldml>\n')
+
+
+def make_queries(annotations):
+    """ QUERIES, plus some of the keywords from the annotations """
+    l_keywords = sorted({s_keyword
+                         for t_keywords in annotations.d_keywords.values()
+                         for s_keyword in t_keywords})
+    rng = random.Random(2)
+    return QUERIES + rng.sample(l_keywords, min(12, len(l_keywords)))
+
+
+def build_search(emo, s_path: str):
+    """ A fully built EmojiSearch with the annotations at s_path, and the
+    Annotations """
+    import emojam.emojam_annotations as emojam_annotations
+    import emojam.emojam_search as emojam_search
+    annotations = emojam_annotations.Annotations([s_path])
+    return emojam_search.EmojiSearch(emo, annotations=annotations), \
+        annotations
+
+
+def retained_mb(f_build):
+    """ MB still allocated by what f_build() returns """
+    gc.collect()
+    tracemalloc.start()
+    i_before = tracemalloc.get_traced_memory()[0]
+    kept = f_build()
+    gc.collect()
+    i_after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (i_after - i_before) / 1e6
+
+
+def keystroke_times_ms(search, l_queries):
+    """ Search time of every keystroke typing l_queries, in ms """
+    import emojam.emojam_search as emojam_search
+    l_times = []
+    for s_query in l_queries:
+        session = emojam_search.SearchSession(search)
+        for i_end in range(1, len(s_query) + 1):
+            f_start_time = time.perf_counter()
+            result = session.query(s_query[:i_end])
+            if result is not None:
+                result.ranked()
+            l_times.append((time.perf_counter() - f_start_time) * 1000)
+    return l_times
+
+
+def measure(s_path: str, i_runs: int):
+    """ Measure everything with the annotations at s_path """
+    import emojam.emojam_annotations as emojam_annotations
+    import emojam.emojam_emojis as emojam_emojis
+    import emojam.emojam_profile as emojam_profile
+    import emojam.emojam_search as emojam_search
+    emo = emojam_emojis.Emojis(emojam_emojis.DB_FILENAME)
+    l_load_ms = []
+    l_build_ms = []
+    for _ in range(i_runs):
+        annotations = emojam_annotations.Annotations([s_path])
+        f_start_time = time.perf_counter()
+        annotations.load()
+        l_load_ms.append((time.perf_counter() - f_start_time) * 1000)
+        f_start_time = time.perf_counter()
+        search = emojam_search.EmojiSearch(emo, annotations=annotations)
+        l_build_ms.append((time.perf_counter() - f_start_time) * 1000)
+    l_keystroke_ms = []
+    l_queries = make_queries(annotations)
+    for _ in range(i_runs):
+        l_keystroke_ms += keystroke_times_ms(search, l_queries)
+    d_keystrokes = emojam_profile.summarize(l_keystroke_ms)
+    f_plain_mb = retained_mb(lambda: emojam_search.EmojiSearch(emo))
+    f_annotated_mb = retained_mb(lambda: build_search(emo, s_path))
+    return {
+        'annotations_load_ms': statistics.median(l_load_ms),
+        'index_build_ms': statistics.median(l_build_ms),
+        'keystroke_p50_ms': d_keystrokes['p50'],
+        'keystroke_p99_ms': d_keystrokes['p99'],
+        'index_memory_mb': f_annotated_mb,
+        'annotation_memory_mb': f_annotated_mb - f_plain_mb,
+    }, {'annotated_emojis': len(annotations.d_keywords),
+        'keywords': sum(map(len, annotations.d_keywords.values())),
+        'keystrokes': len(l_keystroke_ms)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check search latency and '
+                                                 'memory against budgets.')
+    parser.add_argument('--annotations', metavar='FILE',
+                        help='annotation file to use, instead of a '
+                             'synthetic one')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='runs per timing, the median is used')
+    parser.add_argument('--budget', action='append', default=[],
+                        metavar='NAME=VALUE', help='override a budget')
+    args = parser.parse_args()
+    d_budgets = dict(BUDGETS)
+    for s_budget in args.budget:
+        s_name, _, s_value = s_budget.partition('=')
+        if s_name not in d_budgets:
+            parser.error(f"unknown budget {s_name}, expected one of "
+                         f"{', '.join(d_budgets)}")
+        d_budgets[s_name] = float(s_value)
+    with tempfile.TemporaryDirectory(prefix='emojam-search-') as s_home:
+        os.environ['HOME'] = s_home
+        os.environ['XDG_CACHE_HOME'] = os.path.join(s_home, '.cache')
+        sys.path[0:0] = [REPO_DIR, BENCHMARKS_DIR]
+        s_path = args.annotations
+        if s_path is None:
+            import emojam.emojam_emojis as emojam_emojis
+            s_path = os.path.join(s_home, f'{LOCALE}.xml')
+            write_synthetic_annotations(
+                    emojam_emojis.Emojis(emojam_emojis.DB_FILENAME), s_path)
+        d_measures, d_info = measure(s_path, args.runs)
+    d_results = {s_name: {'value': round(d_measures[s_name], 2),
+                          'budget': f_budget,
+                          'ok': d_measures[s_name] <= f_budget}
+                 for s_name, f_budget in d_budgets.items()}
+    print(json.dumps({'python': sys.version.split()[0], 'runs': args.runs,
+                      'annotations': args.annotations or 'synthetic',
+                      **d_info, 'results': d_results}, indent=2))
+    b_ok = all(d_result['ok'] for d_result in d_results.values())
+    return 0 if b_ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
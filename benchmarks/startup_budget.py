@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+# Startup time budget check for Emojam.
+#
+# Measures, each in a fresh interpreter:
+#   cli_import          import time of the emojam entry point (-X importtime)
+#   cli_list            wall time of "emojam list", the GTK-free fast path
+#   gui_import          import time of emojam.main, which pulls in GTK
+#   gui_first_paint     startup to the picker window's first draw
+# and compares the median of several runs against a budget for each. Prints
+# the results as JSON and exits with status 1 if anything is over budget, so
+# it can gate CI. The GUI measurements need PyGObject and a display (run
+# under xvfb-run on a headless box), and are skipped without them.
+#
+# Runs use a throwaway HOME and cache dir, after one warm-up run so the emoji
+# DB cache is in place, like it would be for a user.
+#
+# Usage: startup_budget.py [--runs N] [--budget NAME=MS ...]
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# milliseconds. Generous, to allow for slow CI machines: these are meant to
+# catch regressions like an eager import, not small wobbles
+BUDGETS_MS = {
+    'cli_import': 60,
+    'cli_list': 300,
+    'gui_import': 600,
+    'gui_first_paint': 2000,
+}
+
+# Run in a child interpreter: start the picker the way emojam_cli does,
+# and report when the window is mapped and first drawn
+WINDOW_PROBE = '''
+import json, sys, time
+f_start_time = time.perf_counter()
+import emojam.emojam_emojis as emojam_emojis
+emojis_load = emojam_emojis.BackgroundLoad(emojam_emojis.DB_FILENAME)
+import emojam.main as emojam_main
+from gi.repository import Gtk
+d_times = {}
+def mark(s_event):
+    d_times.setdefault(s_event, (time.perf_counter() - f_start_time) * 1000)
+    return False
+win = emojam_main.EmojamWindow(emojis_load=emojis_load)
+win.connect("map-event", lambda *args: mark("mapped"))
+win.connect_after("draw", lambda *args: mark("first_paint"))
+while "first_paint" not in d_times:
+    Gtk.main_iteration()
+win.destroy()
+win.config.flush()
+print(json.dumps(d_times))
+'''
+
+
+def child_environment(s_home: str):
+    d_env = dict(os.environ)
+    d_env['HOME'] = s_home
+    d_env['XDG_CACHE_HOME'] = os.path.join(s_home, '.cache')
+    d_env['PYTHONPATH'] = os.pathsep.join(
+            [REPO_DIR] + [s_path for s_path in
+                          d_env.get('PYTHONPATH', '').split(os.pathsep)
+                          if s_path])
+    return d_env
+
+
+def import_time_ms(s_module: str, d_env):
+    """ Cumulative import time of s_module, from -X importtime """
+    process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {s_module}'],
+            env=d_env, capture_output=True, text=True, check=True)
+    for s_line in process.stderr.splitlines():
+        l_fields = s_line.split('|')
+        if len(l_fields) == 3 and l_fields[2].strip() == s_module:
+            return int(l_fields[1]) / 1000
+    raise RuntimeError(f"no import time reported for {s_module}")
+
+
+def cli_list_ms(d_env):
+    f_start_time = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'emojam.emojam_cli', 'list'],
+                   env=d_env, stdout=subprocess.DEVNULL, check=True)
+    return (time.perf_counter() - f_start_time) * 1000
+
+
+def gui_first_paint_ms(d_env):
+    process = subprocess.run([sys.executable, '-c', WINDOW_PROBE],
+                             env=d_env, capture_output=True, text=True,
+                             check=True, timeout=60)
+    return json.loads(process.stdout.splitlines()[-1])['first_paint']
+
+
+def gui_available(d_env):
+    """ True if PyGObject is installed and GTK can open a display """
+    process = subprocess.run(
+            [sys.executable, '-c', 'import gi; gi.require_version("Gtk", '
+             '"3.0"); from gi.repository import Gtk; '
+             'raise SystemExit(0 if Gtk.init_check()[0] else 1)'],
+            env=d_env, capture_output=True)
+    return process.returncode == 0
+
+
+def measure(f_measure, i_runs: int):
+    """ Median of i_runs runs of f_measure(), in ms """
+    return statistics.median(f_measure() for _ in range(i_runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check Emojam startup '
+                                                 'times against budgets.')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='runs per measurement, the median is used')
+    parser.add_argument('--budget', action='append', default=[],
+                        metavar='NAME=MS', help='override a budget')
+    args = parser.parse_args()
+    d_budgets = dict(BUDGETS_MS)
+    for s_budget in args.budget:
+        s_name, _, s_ms = s_budget.partition('=')
+        if s_name not in d_budgets:
+            parser.error(f"unknown budget {s_name}, expected one of "
+                         f"{', '.join(d_budgets)}")
+        d_budgets[s_name] = float(s_ms)
+    with tempfile.TemporaryDirectory(prefix='emojam-budget-') as s_home:
+        d_env = child_environment(s_home)
+        d_measures = {
+            'cli_import': lambda: import_time_ms('emojam.emojam_cli', d_env),
+            'cli_list': lambda: cli_list_ms(d_env),
+        }
+        if gui_available(d_env):
+            d_measures['gui_import'] = \
+                lambda: import_time_ms('emojam.main', d_env)
+            d_measures['gui_first_paint'] = lambda: gui_first_paint_ms(d_env)
+        cli_list_ms(d_env)  # warm up: writes the emoji DB cache
+        d_results = {}
+        for s_name, i_budget in d_budgets.items():
+            if s_name not in d_measures:
+                d_results[s_name] = {'skipped': 'needs PyGObject and a '
+                                                'display'}
+                continue
+            f_median = measure(d_measures[s_name], args.runs)
+            d_results[s_name] = {'median_ms': round(f_median, 1),
+                                 'budget_ms': i_budget,
+                                 'ok': f_median <= i_budget}
+    print(json.dumps({'python': sys.version.split()[0],
+                      'runs': args.runs, 'results': d_results}, indent=2))
+    b_ok = all(d_result.get('ok', True) for d_result in d_results.values())
+    return 0 if b_ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 
-from emojam import main
+import sys
+
+from emojam import emojam_cli
 
 if __name__ == "__main__":
     try:
-        main.main()
+        sys.exit(emojam_cli.main())
     except KeyboardInterrupt:
         print("\nCaught interrupt, exiting...")
         exit(0)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+# Keyword annotations for search, per locale.
+#
+# emojis.csv only has each emoji's English name, so searching "lol" or
+# "lachen" finds nothing. Annotation files add keywords for each emoji, in a
+# language: CLDR's annotation files (common/annotations/<locale>.xml in the
+# CLDR release), or plain text files (<locale>.txt) with one emoji per line,
+# a tab, then its keywords separated by "|". They're looked for in
+# $XDG_DATA_HOME/emojam/annotations, then in emoji_sets/annotations next to
+# the emoji DB.
+#
+# Only the files for the active locale are read (from LANGUAGE, LC_ALL,
+# LC_MESSAGES or LANG, where "de_CH" falls back to "de"), and only when
+# search first asks for them. Keywords repeat a lot across emojis ("face",
+# "hand"), so each is kept once and shared, and each emoji's keywords are a
+# tuple.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import os
+
+import emojam.emojam_profile as emojam_profile
+
+ANNOTATION_EXTENSIONS = ('.xml', '.txt')
+KEYWORD_SEPARATOR = '|'
+VARIATION_SELECTOR = '\uFE0F'  # annotation files leave these out, mostly
+LOAD_CHUNK = 50     # annotations read per iter_load() step
+
+
+def annotation_dirs():
+    """ Return the directories annotation files are looked for in, in
+    order """
+    s_data_home = os.environ.get('XDG_DATA_HOME')
+    if not s_data_home:
+        s_data_home = os.path.join(os.path.expanduser('~'), '.local', 'share')
+    return [os.path.join(s_data_home, 'emojam', 'annotations'),
+            os.path.join(os.path.dirname(__file__), 'emoji_sets',
+                         'annotations')]
+
+
+def locale_candidates(d_environment=None):
+    """ Return the user's locales, most wanted first, like ['de_CH', 'de'],
+    from the environment """
+    if d_environment is None:
+        d_environment = os.environ
+    l_values = [s_value for s_value
+                in d_environment.get('LANGUAGE', '').split(':') if s_value]
+    for s_variable in ('LC_ALL', 'LC_MESSAGES', 'LANG'):
+        if d_environment.get(s_variable):
+            l_values.append(d_environment[s_variable])
+            break
+    l_locales = []
+    for s_value in l_values:
+        # de_CH.UTF-8@euro -> de_CH
+        s_locale = s_value.partition('.')[0].partition('@')[0]
+        if s_locale in ('', 'C', 'POSIX'):
+            continue
+        for s_candidate in (s_locale, s_locale.partition('_')[0]):
+            if s_candidate not in l_locales:
+                l_locales.append(s_candidate)
+    return l_locales
+
+
+def find_annotation_files(l_locales):
+    """ Return (locale, [paths]) for the first locale in l_locales that has
+    annotation files, or (None, []) """
+    l_dirs = annotation_dirs()
+    for s_locale in l_locales:
+        l_paths = [os.path.join(s_dir, s_locale + s_extension)
+                   for s_dir in l_dirs
+                   for s_extension in ANNOTATION_EXTENSIONS
+                   if os.path.isfile(os.path.join(s_dir,
+                                                  s_locale + s_extension))]
+        if l_paths:
+            return s_locale, l_paths
+    return None, []
+
+
+def iter_xml_annotations(s_path: str):
+    """ Yield (emoji, keywords) from a CLDR annotations file. The "tts"
+    entries, the emoji's name in that language, count as keywords too """
+    from xml.etree import ElementTree
+    for event, element in ElementTree.iterparse(s_path):
+        if element.tag == 'annotation':
+            s_emoji = element.get('cp')
+            if s_emoji and element.text:
+                yield s_emoji, element.text
+            element.clear()
+
+
+def iter_text_annotations(s_path: str):
+    """ Yield (emoji, keywords) from a text annotations file """
+    with open(s_path, encoding='utf-8') as f_annotations:
+        for s_line in f_annotations:
+            s_emoji, s_tab, s_keywords = s_line.rstrip('\n').partition('\t')
+            if s_tab and not s_emoji.startswith('#'):
+                yield s_emoji, s_keywords
+
+
+class Annotations:
+    """ Keywords per emoji, for one locale. Nothing is read until they're
+    first asked for """
+
+    def __init__(self, l_paths, s_locale=None):
+        self.l_paths = l_paths
+        self.s_locale = s_locale
+        # emoji, without variation selectors: tuple of keywords
+        self.d_keywords = None
+
+    @classmethod
+    def for_locale(cls, l_locales=None):
+        """ Annotations for the first of l_locales (the user's locales, by
+        default) that has any """
+        if l_locales is None:
+            l_locales = locale_candidates()
+        s_locale, l_paths = find_annotation_files(l_locales)
+        return cls(l_paths, s_locale)
+
+    def __bool__(self):
+        """ False if there's no annotation file to read """
+        return bool(self.l_paths)
+
+    def iter_load(self, i_chunk: int = LOAD_CHUNK):
+        """ Read the annotation files, yielding after every i_chunk
+        annotations. Does nothing if they've been read """
+        if self.d_keywords is not None:
+            return
+        from xml.etree.ElementTree import ParseError
+        d_keywords = {}
+        d_pool = {}     # keyword: the one copy of it
+        pool = d_pool.setdefault
+        i_count = 0
+        for s_path in self.l_paths:
+            if s_path.endswith('.xml'):
+                annotations = iter_xml_annotations(s_path)
+            else:
+                annotations = iter_text_annotations(s_path)
+            try:
+                for s_emoji, s_keywords in annotations:
+                    s_key = s_emoji.replace(VARIATION_SELECTOR, '')
+                    l_keywords = list(d_keywords.get(s_key, ()))
+                    for s_keyword in s_keywords.split(KEYWORD_SEPARATOR):
+                        s_keyword = ' '.join(s_keyword.split())
+                        if s_keyword and s_keyword not in l_keywords:
+                            l_keywords.append(pool(s_keyword, s_keyword))
+                    d_keywords[s_key] = tuple(l_keywords)
+                    i_count += 1
+                    if i_count % i_chunk == 0:
+                        yield True
+            except (OSError, UnicodeDecodeError, ParseError):
+                continue    # unreadable, keep what it had up to there
+        self.d_keywords = d_keywords
+
+    @emojam_profile.timed('annotations.load')
+    def load(self):
+        """ Read the annotation files, if they haven't been """
+        for _ in self.iter_load():
+            pass
+
+    def keywords(self, s_emoji: str):
+        """ Return s_emoji's keywords, reading the files on first use """
+        if self.d_keywords is None:
+            self.load()
+        return self.d_keywords.get(s_emoji.replace(VARIATION_SELECTOR, ''),
+                                   ())
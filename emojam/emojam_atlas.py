@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+
+# Pre-rendered emoji glyphs.
+#
+# Shaping and rasterizing color emoji through Pango is the slowest part of
+# drawing the picker, and it all happens again after every zoom. The atlas
+# renders every emoji once, at the picker's current font and size, into one
+# big cairo image ("atlas") laid out in fixed-size slots. Drawing an emoji is
+# then just painting its slot.
+#
+# Atlases are built on a background thread and saved to the cache dir, keyed
+# by the font (description, resolution, scale factor, and the font file that
+# fontconfig picks for it) and the list of emojis. Every zoom level gets its
+# own, so saving one prunes the least recently used ones once they take up
+# more than MAX_CACHE_BYTES. Until an atlas is ready, or for an emoji it
+# couldn't render cleanly, draw() returns False and the caller renders live
+# text as before.
+#
+# Needs pycairo (which PyGObject's cairo support uses anyway). Without it,
+# there's no atlas and everything is live text.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import hashlib
+import json
+import math
+import os
+import subprocess
+import threading
+
+import gi
+
+import emojam.emojam_cache as emojam_cache
+import emojam.emojam_profile as emojam_profile
+
+gi.require_version("Gtk", "3.0")
+gi.require_version("PangoCairo", "1.0")
+
+from gi.repository import GLib, Pango, PangoCairo
+
+try:
+    import cairo
+except ImportError:     # no atlas, draw live text
+    cairo = None
+
+ATLAS_VERSION = 1
+ATLAS_COLUMNS = 64
+MAX_ATLAS_BYTES = 96 * 1024 * 1024  # bigger zooms than this are live text
+MAX_CACHE_BYTES = 48 * 1024 * 1024  # atlas files kept on disk, at most
+REFERENCE_EMOJI = '\U0001F600'      # sizes the slots
+# Emojis wider than the reference by this much didn't render as one glyph
+# (eg: a ZWJ sequence the font doesn't have), so are left to live text
+MAX_WIDTH_RATIO = 1.25
+
+
+def font_key_for(widget, font_description):
+    """ The atlas key for text drawn in font_description on widget: (font
+    description, resolution, scale factor) """
+    return (font_description.to_string(),
+            PangoCairo.context_get_resolution(widget.get_pango_context()),
+            widget.get_scale_factor())
+
+
+def font_file_for(s_family: str):
+    """ The font file fontconfig picks for s_family, or '' if we can't
+    tell """
+    try:
+        process = subprocess.run(['fc-match', '--format=%{file}', s_family],
+                                 capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return ''
+    return process.stdout.strip()
+
+
+def atlas_path_for(t_font, l_emojis):
+    """ Return the cache path (without extension) for an atlas of l_emojis
+    in font t_font """
+    s_font, f_resolution, i_scale = t_font
+    s_family = Pango.FontDescription.from_string(s_font).get_family() or ''
+    s_font_file = font_file_for(s_family)
+    try:
+        font_stat = os.stat(s_font_file)
+        t_font_file = (s_font_file, font_stat.st_size, font_stat.st_mtime_ns)
+    except OSError:
+        t_font_file = (s_font_file, 0, 0)
+    sha = hashlib.sha1()
+    sha.update(repr((ATLAS_VERSION, s_font, f_resolution, i_scale,
+                     t_font_file)).encode())
+    sha.update('\n'.join(l_emojis).encode())
+    return os.path.join(emojam_cache.cache_dir(), 'atlas', sha.hexdigest())
+
+
+class Atlas:
+    """ One rendered atlas: the image, its slot size, and which emojis it
+    has """
+
+    def __init__(self, surface, d_info, l_emojis):
+        self.surface = surface
+        self.i_slot_width = d_info['slot_width']
+        self.i_slot_height = d_info['slot_height']
+        self.i_columns = d_info['columns']
+        s_missing = set(d_info['missing'])
+        self.d_slots = {s_emoji: i_slot
+                        for i_slot, s_emoji in enumerate(l_emojis)
+                        if i_slot not in s_missing}
+
+
+@emojam_profile.timed('atlas.load')
+def load_atlas(s_path: str, l_emojis):
+    """ Load a cached atlas, or return None if there isn't one """
+    try:
+        with open(f'{s_path}.json', encoding='utf-8') as f_info:
+            d_info = json.load(f_info)
+        surface = cairo.ImageSurface.create_from_png(f'{s_path}.png')
+    except (OSError, ValueError, cairo.Error):
+        return None
+    try:    # mark it used, so pruning keeps it
+        os.utime(f'{s_path}.json')
+    except OSError:
+        pass
+    surface.set_device_scale(d_info['scale'], d_info['scale'])
+    return Atlas(surface, d_info, l_emojis)
+
+
+@emojam_profile.timed('atlas.render')
+def render_atlas(t_font, l_emojis, is_cancelled):
+    """ Render l_emojis in font t_font. Returns (surface, info dict), or
+    None if it was cancelled or would be too big """
+    s_font, f_resolution, i_scale = t_font
+    # Own font map, as Pango's default one belongs to the GTK thread
+    font_map = PangoCairo.FontMap.new()
+    pango_context = font_map.create_context()
+    PangoCairo.context_set_resolution(pango_context, f_resolution)
+    layout = Pango.Layout.new(pango_context)
+    layout.set_font_description(Pango.FontDescription.from_string(s_font))
+    layout.set_text(REFERENCE_EMOJI, -1)
+    ink_rect, logical_rect = layout.get_pixel_extents()
+    i_slot_width = max(1, logical_rect.width)
+    i_slot_height = max(1, logical_rect.height)
+    i_rows = math.ceil(len(l_emojis) / ATLAS_COLUMNS)
+    i_width = ATLAS_COLUMNS * i_slot_width * i_scale
+    i_height = i_rows * i_slot_height * i_scale
+    if i_width * i_height * 4 > MAX_ATLAS_BYTES:
+        return None
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, i_width, i_height)
+    surface.set_device_scale(i_scale, i_scale)
+    cairo_context = cairo.Context(surface)
+    PangoCairo.update_context(cairo_context, pango_context)
+    layout.context_changed()
+    l_missing = []
+    for i_slot, s_emoji in enumerate(l_emojis):
+        if is_cancelled():
+            return None
+        layout.set_text(s_emoji, -1)
+        ink_rect, logical_rect = layout.get_pixel_extents()
+        if (layout.get_unknown_glyphs_count() or
+                logical_rect.width > i_slot_width * MAX_WIDTH_RATIO):
+            l_missing.append(i_slot)
+            continue
+        i_row, i_column = divmod(i_slot, ATLAS_COLUMNS)
+        cairo_context.move_to(
+                i_column * i_slot_width +
+                (i_slot_width - logical_rect.width) / 2,
+                i_row * i_slot_height)
+        PangoCairo.show_layout(cairo_context, layout)
+    surface.flush()
+    d_info = {'slot_width': i_slot_width, 'slot_height': i_slot_height,
+              'columns': ATLAS_COLUMNS, 'scale': i_scale,
+              'missing': l_missing}
+    return surface, d_info
+
+
+def save_atlas(s_path: str, surface, d_info):
+    """ Write an atlas to the cache, and prune old ones. The .json goes
+    last, so it's only there once the .png is complete """
+    os.makedirs(os.path.dirname(s_path), exist_ok=True)
+    for s_extension in ('png', 'json'):
+        s_temp_path = f'{s_path}.{os.getpid()}.tmp'
+        try:
+            if s_extension == 'png':
+                surface.write_to_png(s_temp_path)
+            else:
+                with open(s_temp_path, 'w', encoding='utf-8') as f_info:
+                    json.dump(d_info, f_info)
+            os.replace(s_temp_path, f'{s_path}.{s_extension}')
+        finally:
+            if os.path.exists(s_temp_path):
+                os.remove(s_temp_path)
+    emojam_cache.prune_cache_entries(os.path.dirname(s_path),
+                                     MAX_CACHE_BYTES,
+                                     os.path.basename(s_path))
+
+
+class GlyphAtlas:
+    """ Keeps an atlas for the picker's current font, building or loading a
+    new one in the background when the font changes """
+
+    def __init__(self, l_emojis, ready=None):
+        """ l_emojis is every emoji string the picker can show. ready() is
+        called, in the GTK thread, when a new atlas can be drawn from """
+        self.l_emojis = list(dict.fromkeys(l_emojis))
+        self.ready = ready
+        self.atlas = None       # the atlas in use
+        self.t_font = None      # font of the atlas in use, or being built
+        self.i_generation = 0   # bumped for every new font, cancels old work
+
+    def draw(self, cairo_context, t_font, s_emoji: str, f_width: float,
+             f_height: float):
+        """ Paint s_emoji centered in a f_width x f_height cell at the
+        origin. Returns False if the caller should draw it as text """
+        if cairo is None:
+            return False
+        if t_font != self.t_font:
+            self.request(t_font)
+            return False
+        atlas = self.atlas
+        if atlas is None:
+            return False
+        i_slot = atlas.d_slots.get(s_emoji)
+        if i_slot is None:
+            return False
+        i_row, i_column = divmod(i_slot, atlas.i_columns)
+        f_x = (f_width - atlas.i_slot_width) / 2
+        f_y = (f_height - atlas.i_slot_height) / 2
+        cairo_context.set_source_surface(
+                atlas.surface, f_x - i_column * atlas.i_slot_width,
+                f_y - i_row * atlas.i_slot_height)
+        cairo_context.rectangle(f_x, f_y, atlas.i_slot_width,
+                                atlas.i_slot_height)
+        cairo_context.fill()
+        return True
+
+    def request(self, t_font):
+        """ Start getting an atlas for t_font, dropping the current one """
+        self.t_font = t_font
+        self.atlas = None
+        self.i_generation += 1
+        threading.Thread(target=self.build,
+                         args=(self.i_generation, t_font),
+                         daemon=True).start()
+
+    def build(self, i_generation: int, t_font):
+        """ Background thread: load the atlas from the cache, or render and
+        cache it """
+        def is_cancelled():
+            return i_generation != self.i_generation
+
+        s_path = atlas_path_for(t_font, self.l_emojis)
+        atlas = load_atlas(s_path, self.l_emojis)
+        if atlas is None:
+            rendered = render_atlas(t_font, self.l_emojis, is_cancelled)
+            if rendered is None:
+                return
+            surface, d_info = rendered
+            try:
+                save_atlas(s_path, surface, d_info)
+            except (OSError, cairo.Error):
+                pass    # still fine to use, just not cached
+            atlas = Atlas(surface, d_info, self.l_emojis)
+        GLib.idle_add(self.install, i_generation, atlas)
+
+    def install(self, i_generation: int, atlas):
+        """ GTK thread: start drawing from a finished atlas, unless the font
+        changed while it was being built """
+        if i_generation == self.i_generation:
+            self.atlas = atlas
+            if self.ready is not None:
+                self.ready()
+        return GLib.SOURCE_REMOVE
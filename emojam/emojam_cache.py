@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+# Compiled, memory-mapped form of the emoji database.
+#
+# Parsing emojis.csv on every launch is slow, so the first launch writes a
+# binary copy of it to the user's cache dir. Later launches mmap that file,
+# decode its string table in one go and close it again, which skips the CSV
+# parsing and only makes each distinct string once. The cache is tied to the
+# CSV's size and mtime, with a content hash as a second chance, so editing or
+# upgrading the CSV rebuilds it. Anything wrong with the cache means we fall
+# back to the CSV.
+#
+# File layout (native byte order, all ints are uint32 unless noted):
+#   header          see HEADER_FORMAT
+#   string offsets  n_strings + 1 offsets into the string blob
+#   string blob     utf-8 bytes of every unique string
+#   records         n_records rows of RECORD_FIELDS string ids
+#
+# There are no lookup indexes in the file: the loaded DB renames clashing
+# emojis under its qualification policy, so it builds its own indexes anyway.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b'EMJC'
+FORMAT_VERSION = 2
+HEADER_FORMAT = '=4sHHQQ20sII'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+# Same column order as emojis.csv
+RECORD_FIELDS = ('Group', 'Subgroup', 'CodePoint', 'Status',
+                 'Representation', 'Name', 'Section')
+RECORD_WIDTH = len(RECORD_FIELDS)
+BYTE_ORDER_FLAG = 1 if sys.byteorder == 'little' else 2
+
+
+def cache_dir():
+    """ Return the per-user cache directory for Emojam """
+    s_cache_home = os.environ.get('XDG_CACHE_HOME')
+    if not s_cache_home:
+        s_cache_home = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(s_cache_home, 'emojam')
+
+
+def cache_path_for(s_db_filename: str):
+    """ Return the cache file path for a given emoji CSV file name """
+    s_base = os.path.basename(s_db_filename)
+    return os.path.join(cache_dir(), f'{s_base}.v{FORMAT_VERSION}.cache')
+
+
+def file_digest(s_path: str):
+    """ SHA1 of a file's contents """
+    sha = hashlib.sha1()
+    with open(s_path, 'rb') as f_in:
+        for chunk in iter(lambda: f_in.read(65536), b''):
+            sha.update(chunk)
+    return sha.digest()
+
+
+def prune_cache_entries(s_dir: str, i_max_bytes: int, s_keep=None):
+    """ Delete the least recently used entries in s_dir until the rest take
+    up at most i_max_bytes. An entry is every file whose name starts with
+    the same stem (up to the first dot), and it was last used when the
+    newest of them was modified. The entry with stem s_keep is never
+    deleted. Returns the number of entries deleted """
+    d_entries = {}  # stem: [last used, bytes, [paths]]
+    try:
+        l_dir_entries = list(os.scandir(s_dir))
+    except OSError:
+        return 0
+    for dir_entry in l_dir_entries:
+        try:
+            if not dir_entry.is_file(follow_symlinks=False):
+                continue
+            file_stat = dir_entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        l_entry = d_entries.setdefault(dir_entry.name.partition('.')[0],
+                                       [0, 0, []])
+        l_entry[0] = max(l_entry[0], file_stat.st_mtime_ns)
+        l_entry[1] += file_stat.st_size
+        l_entry[2].append(dir_entry.path)
+    i_total = sum(l_entry[1] for l_entry in d_entries.values())
+    i_deleted = 0
+    for s_stem, (i_used, i_size, l_paths) in sorted(
+            d_entries.items(), key=lambda t_item: t_item[1][0]):
+        if i_total <= i_max_bytes:
+            break
+        if s_stem == s_keep:
+            continue
+        for s_path in l_paths:
+            try:
+                os.remove(s_path)
+            except FileNotFoundError:
+                pass
+        i_total -= i_size
+        i_deleted += 1
+    return i_deleted
+
+
+def write_cache(s_cache_path: str, l_rows, s_csv_path: str):
+    """ Compile l_rows (tuples in RECORD_FIELDS order) into a cache file,
+    stamped with the size, mtime and hash of s_csv_path """
+    csv_stat = os.stat(s_csv_path)
+    digest = file_digest(s_csv_path)
+    # intern strings into a table
+    d_string_ids = {}
+    l_strings = []
+    records = array.array('I')
+    for t_row in l_rows:
+        for s_field in t_row:
+            i_id = d_string_ids.get(s_field)
+            if i_id is None:
+                i_id = len(l_strings)
+                d_string_ids[s_field] = i_id
+                l_strings.append(s_field)
+            records.append(i_id)
+    offsets = array.array('I', [0])
+    blob = bytearray()
+    for s_string in l_strings:
+        blob += s_string.encode('utf-8')
+        offsets.append(len(blob))
+    # pad blob so the arrays after it stay 4-byte aligned
+    blob += b'\0' * (-len(blob) % 4)
+    i_count = len(l_rows)
+    header = struct.pack(HEADER_FORMAT, MAGIC, FORMAT_VERSION,
+                         BYTE_ORDER_FLAG, csv_stat.st_size,
+                         csv_stat.st_mtime_ns, digest, i_count, len(l_strings))
+    os.makedirs(os.path.dirname(s_cache_path), exist_ok=True)
+    s_temp_path = f'{s_cache_path}.{os.getpid()}.tmp'
+    try:
+        with open(s_temp_path, 'wb') as f_out:
+            f_out.write(header)
+            f_out.write(offsets.tobytes())
+            f_out.write(blob)
+            f_out.write(records.tobytes())
+        os.replace(s_temp_path, s_cache_path)
+    finally:
+        if os.path.exists(s_temp_path):
+            os.remove(s_temp_path)
+
+
+class CacheError(Exception):
+    """ Raised when a cache file is missing, stale or damaged """
+
+
+class EmojiCache:
+    """ Read-only view of a compiled emoji database, backed by mmap. Close
+    it once its rows are read """
+
+    def __init__(self, s_cache_path: str):
+        self.s_cache_path = s_cache_path
+        try:
+            with open(s_cache_path, 'rb') as f_cache:
+                self.mm = mmap.mmap(f_cache.fileno(), 0,
+                                    access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as err:
+            raise CacheError(str(err))
+        self.l_views = []   # released before the mapping is closed
+        try:
+            self.map_sections()
+        except CacheError:
+            self.close()
+            raise
+        except (struct.error, TypeError, IndexError, ValueError) as err:
+            self.close()
+            raise CacheError(f'damaged: {err}')
+
+    def section(self, i_pos: int, i_size: int, s_format: str = 'B'):
+        """ Return a view of i_size bytes at i_pos, as s_format items """
+        if i_pos + i_size > len(self.mm):
+            raise CacheError('truncated')
+        view = memoryview(self.mm)[i_pos:i_pos + i_size].cast(s_format)
+        self.l_views.append(view)
+        return view
+
+    def map_sections(self):
+        if len(self.mm) < HEADER_SIZE:
+            raise CacheError('truncated header')
+        (magic, i_version, i_byte_order, self.i_csv_size, self.i_csv_mtime,
+         self.csv_digest, self.i_count, i_strings) = \
+            struct.unpack_from(HEADER_FORMAT, self.mm, 0)
+        if magic != MAGIC or i_version != FORMAT_VERSION or \
+                i_byte_order != BYTE_ORDER_FLAG:
+            raise CacheError('wrong format')
+        i_pos = HEADER_SIZE
+        i_size = (i_strings + 1) * 4
+        self.offsets = self.section(i_pos, i_size, 'I')
+        i_pos += i_size
+        i_blob_size = self.offsets[i_strings]
+        self.blob = self.section(i_pos, i_blob_size)
+        i_pos += i_blob_size + (-i_blob_size % 4)
+        i_size = self.i_count * RECORD_WIDTH * 4
+        self.records = self.section(i_pos, i_size, 'I')
+        i_pos += i_size
+        if i_pos != len(self.mm):
+            raise CacheError('wrong size')
+
+    def is_fresh_for(self, s_csv_path: str):
+        """ True if this cache was compiled from the current CSV file """
+        try:
+            csv_stat = os.stat(s_csv_path)
+        except OSError:
+            return False
+        if csv_stat.st_size != self.i_csv_size:
+            return False
+        if csv_stat.st_mtime_ns == self.i_csv_mtime:
+            return True
+        # touched or reinstalled - still good if the contents match
+        return file_digest(s_csv_path) == self.csv_digest
+
+    def __len__(self):
+        return self.i_count
+
+    def rows(self):
+        """ Return every record as a tuple, decoding each string once. They
+        don't refer to the mapping, so it can be closed after """
+        b_blob = bytes(self.blob)
+        l_offsets = self.offsets.tolist()
+        if l_offsets != sorted(l_offsets):
+            raise CacheError('damaged string offsets')
+        try:
+            l_strings = [b_blob[i_start:i_end].decode('utf-8')
+                         for i_start, i_end in zip(l_offsets, l_offsets[1:])]
+            l_fields = [l_strings[i_id] for i_id in self.records.tolist()]
+        except (UnicodeDecodeError, IndexError) as err:
+            raise CacheError(f'damaged: {err}')
+        return zip(*[iter(l_fields)] * RECORD_WIDTH)
+
+    def close(self):
+        for view in self.l_views:
+            view.release()
+        self.l_views = []
+        self.mm.close()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+
+# Command line entry point for Emojam.
+#
+# Works out what to do from the arguments before anything heavy is imported.
+# Commands for a running daemon (--toggle, --show, --search) only need
+# emojam_client, so they never import gi. If no daemon is running they fall
+# back to starting the picker normally. A daemon that is running but too slow
+# to answer is an error instead, so there's never a second picker.
+#
+# The search, lookup and list subcommands query the emoji database without
+# any GUI, for scripts and launchers like dmenu and rofi:
+#   emojam list | rofi -dmenu | cut -d ' ' -f 1
+# Output is written record by record as it's produced.
+#
+# The emojize and demojize subcommands are filters, converting :shortcodes:
+# to emojis and back from stdin to stdout, a chunk at a time:
+#   emojam demojize < chat.log > chat.txt
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import argparse
+import itertools
+import os
+import sys
+import time
+
+OUTPUT_FORMATS = ('dmenu', 'tsv', 'json')
+JSON_KEYS = ('emoji', 'name', 'group', 'sub_group', 'codepoint', 'version')
+
+
+def count_argument(s_value: str):
+    """ argparse type for a count: an int, 0 or more """
+    try:
+        i_value = int(s_value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a number: '{s_value}'")
+    if i_value < 0:
+        raise argparse.ArgumentTypeError(f"can't be negative: {i_value}")
+    return i_value
+
+
+def make_argument_parser():
+    parser = argparse.ArgumentParser(
+            prog='emojam', description='A lightweight emoji picker.')
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument('--daemon', action='store_true',
+                        help='keep a hidden picker running, for --toggle, '
+                             '--show and --search to show quickly')
+    action.add_argument('--toggle', action='store_true',
+                        help="show the daemon's picker, or hide it if it's "
+                             "showing")
+    action.add_argument('--show', action='store_true',
+                        help="show the daemon's picker")
+    action.add_argument('--search', metavar='QUERY',
+                        help="show the daemon's picker, searching for QUERY")
+    action.add_argument('--quit', action='store_true',
+                        help='stop the daemon')
+    parser.add_argument('--profile', action='store_true',
+                        help='time the hot paths, and print a report on '
+                             'exit')
+    parser.add_argument('--profile-output', metavar='FILE',
+                        help='also save the --profile report to FILE, as '
+                             'JSON. Implies --profile')
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+    search_parser = subparsers.add_parser(
+            'search', help='print emojis matching a query, best first. The '
+                           'query can have codepoints (U+1F6, 1F9D1 200D) '
+                           'and emoji versions (version>=E13.0) in it')
+    search_parser.add_argument('query', nargs='+')
+    search_parser.add_argument('--limit', type=count_argument, default=None,
+                               help='print at most this many')
+    lookup_parser = subparsers.add_parser(
+            'lookup', help='print the emoji with this name, emoji or '
+                           'codepoint (like 1F600 or U+1F600)')
+    lookup_parser.add_argument('key', nargs='+')
+    list_parser = subparsers.add_parser('list', help='print every emoji')
+    list_parser.add_argument('--group', help='only this group')
+    subparsers.add_parser(
+            'emojize', help='copy stdin to stdout, turning :shortcodes: '
+                            '(like :thumbs_up:) into emojis')
+    subparsers.add_parser(
+            'demojize', help='copy stdin to stdout, turning emojis into '
+                             ':shortcodes:')
+    for subparser in (search_parser, list_parser):
+        subparser.add_argument(
+                '--max-version', metavar='VERSION',
+                help='leave out emojis newer than this emoji version (like '
+                     'E12.0), for fonts that lack them')
+    for subparser, s_default in ((search_parser, 'dmenu'),
+                                 (lookup_parser, 'tsv'),
+                                 (list_parser, 'dmenu')):
+        subparser.add_argument(
+                '--format', choices=OUTPUT_FORMATS, default=s_default,
+                help=f'dmenu: "emoji name" lines, tsv: emoji, name, group, '
+                     f'sub-group and codepoint, json: an array of objects. '
+                     f'Default: {s_default}')
+    return parser
+
+
+def load_emojis():
+    import emojam.emojam_emojis as emojam_emojis
+    return emojam_emojis.Emojis(emojam_emojis.DB_FILENAME)
+
+
+def format_lines(records, s_format: str):
+    """ Yield output lines for emoji records, one at a time """
+    if s_format == 'dmenu':
+        for emoji_record in records:
+            yield f'{emoji_record.emoji} {emoji_record.name}\n'
+    elif s_format == 'tsv':
+        for emoji_record in records:
+            yield f'{emoji_record.emoji}\t{emoji_record.name}\t' \
+                  f'{emoji_record.group}\t{emoji_record.sub_group}\t' \
+                  f'{emoji_record.codepoint}\n'
+    else:
+        import json
+        s_separator = '[\n'
+        for emoji_record in records:
+            yield s_separator + json.dumps(
+                    {s_key: emoji_record[s_key] for s_key in JSON_KEYS},
+                    ensure_ascii=False)
+            s_separator = ',\n'
+        yield '[]\n' if s_separator == '[\n' else '\n]\n'
+
+
+def write_lines(lines):
+    """ Write lines to stdout as they come. Returns an exit status """
+    try:
+        for s_line in lines:
+            sys.stdout.write(s_line)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # the reader (head, dmenu..) has gone, that's fine. Point stdout at
+        # /dev/null so Python doesn't complain flushing it at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    return 0
+
+
+def max_version_filter(args):
+    """ Return a function telling if a record is within --max-version, or
+    None if there's no cap. Exits on a bad version """
+    if args.max_version is None:
+        return None
+    import emojam.emojam_emojis as emojam_emojis
+    try:
+        t_version = emojam_emojis.parse_version(args.max_version)
+    except ValueError as err:
+        print(f"Emojam: {err}", file=sys.stderr)
+        sys.exit(2)
+
+    def is_shown(emoji_record):
+        try:
+            return emojam_emojis.parse_version(emoji_record.version) <= \
+                t_version
+        except ValueError:  # no version, keep it
+            return True
+    return is_shown
+
+
+def run_search(args):
+    import emojam.emojam_annotations as emojam_annotations
+    import emojam.emojam_search as emojam_search
+    is_shown = max_version_filter(args)
+    emo = load_emojis()
+    search = emojam_search.EmojiSearch(
+            emo, b_build=False,
+            annotations=emojam_annotations.Annotations.for_locale())
+    result = search.scan_query(' '.join(args.query))
+    if result is None:
+        return 0
+    records = (emo.d_by_name[s_name] for s_name in result.ranked())
+    if is_shown is not None:
+        records = filter(is_shown, records)
+    if args.limit is not None:
+        records = itertools.islice(records, args.limit)
+    return write_lines(format_lines(records, args.format))
+
+
+def lookup_record(emo, s_key: str):
+    """ Find a record by name, emoji or codepoint """
+    emoji_record = emo.emoji_dict_from_name(s_key) or \
+        emo.d_by_emoji.get(s_key)
+    if emoji_record is None:
+        s_codepoint = ' '.join(s_point.upper().replace('U+', '')
+                               for s_point in s_key.split())
+        emoji_record = emo.emoji_dict_from_codepoint(s_codepoint)
+    return emoji_record
+
+
+def run_lookup(args):
+    emo = load_emojis()
+    s_key = ' '.join(args.key)
+    emoji_record = lookup_record(emo, s_key)
+    if emoji_record is None:
+        print(f"Emojam: no emoji matches {s_key!r}", file=sys.stderr)
+        return 1
+    return write_lines(format_lines([emoji_record], args.format))
+
+
+def run_list(args):
+    emo = load_emojis()
+    if args.group is not None:
+        if args.group not in emo.d_group_names:
+            print(f"Emojam: no group named {args.group!r}. Groups are: "
+                  f"{', '.join(emo.d_group_names)}", file=sys.stderr)
+            return 1
+        records = emo.d_emojis[args.group].values()
+    else:
+        records = emo.l_records
+    is_shown = max_version_filter(args)
+    if is_shown is not None:
+        records = filter(is_shown, records)
+    return write_lines(format_lines(records, args.format))
+
+
+def run_convert(args):
+    """ emojize or demojize stdin to stdout. Bytes that aren't UTF-8 are
+    passed through as they are """
+    import codecs
+    import emojam.emojam_text as emojam_text
+    text_engine = emojam_text.EmojiText(load_emojis())
+    if args.command == 'emojize':
+        converter = emojam_text.Emojizer(text_engine)
+    else:
+        converter = emojam_text.Demojizer(text_engine)
+    decoder = codecs.getincrementaldecoder('utf-8')('surrogateescape')
+    f_in = sys.stdin.buffer
+    f_out = sys.stdout.buffer
+    try:
+        while True:
+            bytes_chunk = f_in.read1(emojam_text.CHUNK_SIZE)
+            s_text = decoder.decode(bytes_chunk, final=not bytes_chunk)
+            if not bytes_chunk:
+                break
+            f_out.write(converter.feed(s_text).encode('utf-8',
+                                                      'surrogateescape'))
+        s_text = converter.feed(s_text) + converter.close()
+        f_out.write(s_text.encode('utf-8', 'surrogateescape'))
+        f_out.flush()
+    except BrokenPipeError:
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    return 0
+
+
+def run_picker(s_search=None, b_daemon=False):
+    """ Start the GTK picker in this process """
+    f_start_time = time.perf_counter()
+    import emojam.emojam_emojis as emojam_emojis
+    # load the DB on a thread while gi is imported, which is slow
+    emojis_load = emojam_emojis.BackgroundLoad(emojam_emojis.DB_FILENAME)
+    import emojam.main as emojam_main
+    return emojam_main.main(s_search=s_search, b_daemon=b_daemon,
+                            emojis_load=emojis_load,
+                            f_start_time=f_start_time)
+
+
+def run_client(s_command: str, s_argument=None):
+    """ Send a command to the daemon. Returns an exit status, or None if
+    there's no daemon to send it to """
+    import emojam.emojam_client as emojam_client
+    try:
+        s_reply, f_elapsed_ms = emojam_client.timed_send_command(s_command,
+                                                                 s_argument)
+    except emojam_client.DaemonUnavailable:
+        return None
+    except emojam_client.DaemonTimeout:
+        # it's running but busy: starting another picker would only
+        # make two
+        print(f"Emojam: the daemon didn't answer within "
+              f"{emojam_client.REPLY_TIMEOUT:g} s", file=sys.stderr)
+        return 1
+    if s_reply.startswith('error'):
+        print(f"Emojam: {s_reply.partition(chr(9))[2]}", file=sys.stderr)
+        return 1
+    if os.environ.get("EMOJAM_TIMING"):
+        print(f"Daemon replied '{s_reply}' in {f_elapsed_ms:.1f} ms",
+              file=sys.stderr)
+    return 0
+
+
+def main(l_args=None):
+    parser = make_argument_parser()
+    args = parser.parse_args(l_args)
+    if args.profile or args.profile_output:
+        # emojam_profile reads this when it's first imported, which hasn't
+        # happened yet: nothing instrumented is imported until it's needed
+        os.environ['EMOJAM_PROFILE'] = args.profile_output or '1'
+    if args.command is not None:
+        if args.daemon or args.toggle or args.show or args.quit or \
+                args.search is not None:
+            parser.error(f"{args.command} can't be combined with daemon "
+                         f"options")
+        return {'search': run_search, 'lookup': run_lookup,
+                'list': run_list, 'emojize': run_convert,
+                'demojize': run_convert}[args.command](args)
+    if args.daemon:
+        return run_picker(b_daemon=True)
+    if args.quit:
+        i_status = run_client('quit')
+        if i_status is None:
+            print("Emojam: no daemon is running", file=sys.stderr)
+            return 1
+        return i_status
+    if args.toggle or args.show:
+        i_status = run_client('toggle' if args.toggle else 'show')
+    elif args.search is not None:
+        i_status = run_client('search', args.search)
+    else:
+        return run_picker()
+    if i_status is None:    # no daemon, start up the slow way
+        return run_picker(s_search=args.search)
+    return i_status
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\nCaught interrupt, exiting...")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+# Client side of Emojam's daemon mode.
+#
+# "emojam --daemon" keeps a hidden, fully built picker window running. Other
+# emojam commands (--toggle, --show, --search) connect to it over a per-user
+# UNIX socket, send one command line and wait for the reply, which is a lot
+# quicker than starting GTK from scratch. This module must not import gi, so
+# the fast path stays fast - the daemon side lives in emojam_daemon.
+#
+# The protocol is one line each way, tab separated:
+#   client: <command>[\t<argument>]\n     command is toggle, show, search
+#                                         or quit
+#   daemon: ok\n                          done
+#           shown\n                       done, and the window has drawn
+#           error\t<message>\n
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import os
+import socket
+import time
+
+COMMANDS = ('toggle', 'show', 'search', 'quit')
+REPLY_TIMEOUT = 2.0     # seconds to wait on the daemon before giving up
+MAX_LINE = 4096         # longest command line the daemon will read
+
+
+class DaemonUnavailable(Exception):
+    """ No daemon is listening, or it went away without answering """
+
+
+class DaemonTimeout(Exception):
+    """ The daemon took the command, but didn't answer in time. It's still
+    there, so don't start another picker """
+
+
+def socket_path():
+    """ Return the path of this user's daemon socket """
+    s_runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if s_runtime_dir and os.path.isdir(s_runtime_dir):
+        return os.path.join(s_runtime_dir, 'emojam.sock')
+    # no runtime dir: use a private directory in /tmp instead
+    return os.path.join('/tmp', f'emojam-{os.getuid()}', 'emojam.sock')
+
+
+def encode_command(s_command: str, s_argument=None):
+    """ Return the wire form of a command """
+    if s_command not in COMMANDS:
+        raise ValueError(f"unknown daemon command: {s_command}")
+    if s_argument is None:
+        s_line = s_command
+    else:   # tabs and newlines would break up the line
+        s_argument = ' '.join(s_argument.split())
+        s_line = f'{s_command}\t{s_argument}'
+    return (s_line + '\n').encode('utf-8')
+
+
+def decode_command(b_line: bytes):
+    """ Return (command, argument or None) from a line sent by a client.
+    Raises ValueError if it isn't a valid command """
+    l_fields = b_line.decode('utf-8').rstrip('\n').split('\t', 1)
+    if l_fields[0] not in COMMANDS:
+        raise ValueError(f"unknown daemon command: {l_fields[0]}")
+    if len(l_fields) == 1:
+        return l_fields[0], None
+    return l_fields[0], l_fields[1]
+
+
+def daemon_running(s_path=None):
+    """ True if a daemon is listening on the socket """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(s_path or socket_path())
+        except OSError:
+            return False
+    return True
+
+
+def send_command(s_command: str, s_argument=None, s_path=None):
+    """ Send a command to the running daemon and return its reply line.
+    Raises DaemonUnavailable if there's no daemon to talk to, and
+    DaemonTimeout if there is one but it's too slow to answer """
+    if s_path is None:
+        s_path = socket_path()
+    b_line = encode_command(s_command, s_argument)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(REPLY_TIMEOUT)
+        try:
+            client.connect(s_path)
+        except socket.timeout as err:   # there, but its backlog is full
+            raise DaemonTimeout(str(err)) from err
+        except OSError as err:  # no socket, stale socket..
+            raise DaemonUnavailable(str(err)) from err
+        b_reply = b''
+        try:
+            client.sendall(b_line)
+            while not b_reply.endswith(b'\n'):
+                b_chunk = client.recv(MAX_LINE)
+                if not b_chunk:
+                    break
+                b_reply += b_chunk
+        except socket.timeout as err:
+            raise DaemonTimeout(str(err)) from err
+        except OSError as err:  # it went away mid-command
+            raise DaemonUnavailable(str(err)) from err
+    if not b_reply:
+        raise DaemonUnavailable("daemon closed the connection")
+    return b_reply.decode('utf-8').rstrip('\n')
+
+
+def timed_send_command(s_command: str, s_argument=None, s_path=None):
+    """ Like send_command, but return (reply, milliseconds taken) """
+    f_start_time = time.perf_counter()
+    s_reply = send_command(s_command, s_argument, s_path)
+    return s_reply, (time.perf_counter() - f_start_time) * 1000
@@ -6,12 +6,33 @@
 # program. Some program state lives here and gets saved automatically to
 # emojam.ini.
 #
+# Saving is write-behind: save() only copies the settings into a snapshot and
+# marks it pending. A background thread turns it into text and writes it out
+# once things have been quiet for SAVE_DELAY seconds, so a burst of clicks
+# becomes one write and the GUI never waits on configparser or the disk.
+# Writes go to a temp file that is renamed over emojam.ini, so a crash can't
+# leave a half-written config. A write that fails is tried again after
+# SAVE_RETRY_DELAY, unless a newer save has replaced it by then. flush()
+# writes anything pending right away, and runs automatically at exit.
+#
 # Part of Emojam, (c) 2022 Sam Foster
 # See LICENSE file for details
 
+import atexit
 import configparser
+import io
 import os
 import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import emojam.emojam_profile as emojam_profile
+
+SAVE_DELAY = 0.5        # seconds of quiet before a pending save is written
+SAVE_MAX_DELAY = 2.0    # but never hold a save back longer than this
+SAVE_RETRY_DELAY = 5.0  # seconds before trying a failed write again
 
 
 class EmojamConfig:
@@ -27,7 +48,18 @@ class EmojamConfig:
         self.show_statusbar = False
         self.show_zoomer = False
         self.auto_copy = False
+        self.skin_tone = ''     # default skin tone, '' for none (yellow)
+        # newest emoji version to show, like E12.0, '' for all of them
+        self.max_emoji_version = ''
         self.config = configparser.ConfigParser()
+        # write-behind state, see save()
+        self.save_lock = threading.Lock()
+        self.save_wakeup = threading.Condition(self.save_lock)
+        self.write_lock = threading.Lock()  # one writer at a time
+        self.d_pending_snapshot = None  # snapshot waiting to be written
+        self.f_save_due = 0
+        self.f_save_deadline = 0
+        self.writer_thread = None
 
     def add_favorite(self, s_emoji_name: str):
         if s_emoji_name not in self.favorites:
@@ -38,11 +70,14 @@ class EmojamConfig:
             self.favorites.remove(s_emoji_name)
 
     def add_recent(self, s_emoji_name: str):
-        if s_emoji_name not in self.recently_used_emojis:
-            self.recently_used_emojis.insert(0, s_emoji_name)
-            # if this puts it over the max count setting, truncate it
-            if len(self.recently_used_emojis) > self.recently_used_max_count:
-                self.recently_used_emojis.pop()     # remove oldest/last item
+        """ Put s_emoji_name at the front of the recent list. The ranking for
+        the Recently Used view comes from emojam_usage; this list is kept so
+        older versions can still read the config """
+        if s_emoji_name in self.recently_used_emojis:
+            self.recently_used_emojis.remove(s_emoji_name)  # move to front
+        self.recently_used_emojis.insert(0, s_emoji_name)
+        # if this puts it over the max count setting, truncate it
+        del self.recently_used_emojis[self.recently_used_max_count:]
 
     def enable_statusbar(self):
         self.show_statusbar = True
@@ -77,6 +112,18 @@ class EmojamConfig:
     def get_picker_font_size(self):
         return self.picker_font_size
 
+    def set_skin_tone(self, s_skin_tone: str):
+        self.skin_tone = s_skin_tone
+
+    def get_skin_tone(self):
+        return self.skin_tone
+
+    def set_max_emoji_version(self, s_version: str):
+        self.max_emoji_version = s_version
+
+    def get_max_emoji_version(self):
+        return self.max_emoji_version
+
     def is_in_recent_emojis(self, s_emoji_name: str):
         """ Returns True if emoji is in the recent list """
         if s_emoji_name in self.recently_used_emojis:
@@ -127,16 +174,109 @@ class EmojamConfig:
                     self.auto_copy = True
                 else:
                     self.auto_copy = False
+            if 'skin_tone' in self.config['Emojam']:
+                self.skin_tone = self.config['Emojam']['skin_tone']
+            if 'max_emoji_version' in self.config['Emojam']:
+                self.max_emoji_version = \
+                    self.config['Emojam']['max_emoji_version']
+
+    def snapshot(self):
+        """ Return a copy of the saved settings, in file order. Cheap, so
+        the GUI thread can take one on every change """
+        return {'favorites': tuple(self.favorites),
+                'picker_font_size': self.picker_font_size,
+                'recently_used': tuple(self.recently_used_emojis),
+                'show_statusbar': self.show_statusbar,
+                'show_zoomer': self.show_zoomer,
+                'auto_copy': self.auto_copy,
+                'skin_tone': self.skin_tone,
+                'max_emoji_version': self.max_emoji_version}
+
+    def serialize(self, d_snapshot=None):
+        """ Return the config file contents for a snapshot (by default, of
+        the current settings), as a string """
+        if d_snapshot is None:
+            d_snapshot = self.snapshot()
+        # lists are comma separated, everything else is its str()
+        self.config['Emojam'] = {
+                s_key: ','.join(value) if isinstance(value, tuple) else
+                str(value) for s_key, value in d_snapshot.items()}
+        config_text = io.StringIO()
+        self.config.write(config_text)
+        return config_text.getvalue()
 
+    @emojam_profile.timed('config.save')
     def save(self):
-        self.config['Emojam'] = {}
-        s_favorites_serialized = ','.join(self.favorites)
-        self.config['Emojam']['favorites'] = s_favorites_serialized
-        self.config['Emojam']['picker_font_size'] = str(self.picker_font_size)
-        s_recently_used_serialized = ','.join(self.recently_used_emojis)
-        self.config['Emojam']['recently_used'] = s_recently_used_serialized
-        self.config['Emojam']['show_statusbar'] = str(self.show_statusbar)
-        self.config['Emojam']['show_zoomer'] = str(self.show_zoomer)
-        self.config['Emojam']['auto_copy'] = str(self.auto_copy)
-        with open(self.full_config_path, 'w') as config_file_handle:
-            self.config.write(config_file_handle)
+        """ Queue the current config to be written by the background writer.
+        Returns right away """
+        d_snapshot = self.snapshot()
+        f_now = time.monotonic()
+        with self.save_lock:
+            if self.d_pending_snapshot is None:
+                self.f_save_deadline = f_now + SAVE_MAX_DELAY
+            self.d_pending_snapshot = d_snapshot
+            self.f_save_due = min(f_now + SAVE_DELAY, self.f_save_deadline)
+            if self.writer_thread is None:
+                self.writer_thread = threading.Thread(
+                        target=self.writer_loop, name="emojam-config-writer",
+                        daemon=True)
+                self.writer_thread.start()
+                atexit.register(self.flush)
+            self.save_wakeup.notify()
+
+    def writer_loop(self):
+        """ Background thread: write pending saves once they come due """
+        while True:
+            with self.save_lock:
+                while self.d_pending_snapshot is None:
+                    self.save_wakeup.wait()
+                f_wait = self.f_save_due - time.monotonic()
+                if f_wait > 0:
+                    # another save may push the due time back, so re-check
+                    self.save_wakeup.wait(f_wait)
+                    continue
+            try:
+                self.flush()
+            except OSError as err:
+                print(f"Emojam: couldn't save config: {err}", file=sys.stderr)
+
+    def flush(self):
+        """ Write any pending save now, on the calling thread. If that fails,
+        the save stays pending, for the writer to try again """
+        with self.write_lock:
+            with self.save_lock:
+                d_snapshot = self.d_pending_snapshot
+                self.d_pending_snapshot = None
+            if d_snapshot is None:
+                return
+            try:
+                self.write_config_file(self.serialize(d_snapshot))
+            except OSError:
+                with self.save_lock:
+                    if self.d_pending_snapshot is None:     # nothing newer
+                        self.d_pending_snapshot = d_snapshot
+                        self.f_save_due = self.f_save_deadline = \
+                            time.monotonic() + SAVE_RETRY_DELAY
+                raise
+
+    @emojam_profile.timed('config.write_file')
+    def write_config_file(self, s_text: str):
+        """ Atomically replace the config file with s_text """
+        s_config_dir = os.path.dirname(self.full_config_path)
+        i_temp_fd, s_temp_path = tempfile.mkstemp(
+                prefix=f'.{self.s_config_file_name}.', suffix='.tmp',
+                dir=s_config_dir)
+        try:
+            with os.fdopen(i_temp_fd, 'w') as config_file_handle:
+                config_file_handle.write(s_text)
+                config_file_handle.flush()
+                os.fsync(config_file_handle.fileno())
+            try:    # keep the old file's permissions
+                i_mode = os.stat(self.full_config_path).st_mode & 0o777
+                os.chmod(s_temp_path, i_mode)
+            except FileNotFoundError:
+                pass
+            os.replace(s_temp_path, self.full_config_path)
+        except BaseException:
+            os.remove(s_temp_path)
+            raise
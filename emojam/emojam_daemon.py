@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+# Daemon side of Emojam's daemon mode.
+#
+# Listens on the per-user UNIX socket from emojam_client, inside the GTK main
+# loop, and passes commands on to the resident picker window. Replies to a
+# command that shows the window are held back until the window has drawn, so
+# what the client measures is the real time to a visible picker.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import os
+import socket
+import stat
+import sys
+
+import gi
+
+import emojam.emojam_client as emojam_client
+
+gi.require_version("Gtk", "3.0")
+
+from gi.repository import GLib
+
+SHOW_REPLY_TIMEOUT = 1000   # ms to wait for a draw before replying anyway
+
+
+class DaemonError(Exception):
+    """ The daemon socket couldn't be set up """
+
+
+class DaemonServer:
+    """ Accepts client commands on a UNIX socket and runs them on a window.
+    The window needs a daemon_command(command, argument) method, which
+    returns True if the command made the window visible """
+
+    def __init__(self, win, s_path=None):
+        self.win = win
+        self.s_path = s_path or emojam_client.socket_path()
+        self.server_socket = None
+        self.watch_source = None
+        self.l_waiting_for_draw = []    # connections owed a "shown" reply
+        self.draw_handler = None
+        self.draw_timeout_source = None
+
+    def start(self):
+        """ Bind the socket and start listening from the main loop """
+        s_dir = os.path.dirname(self.s_path)
+        os.makedirs(s_dir, mode=0o700, exist_ok=True)
+        dir_stat = os.stat(s_dir)
+        if dir_stat.st_uid != os.getuid() or \
+                stat.S_IMODE(dir_stat.st_mode) & 0o077:
+            raise DaemonError(f"{s_dir} isn't private to this user")
+        if emojam_client.daemon_running(self.s_path):
+            raise DaemonError("an Emojam daemon is already running")
+        try:
+            os.unlink(self.s_path)  # left behind by a daemon that crashed
+        except FileNotFoundError:
+            pass
+        self.server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        i_old_umask = os.umask(0o177)   # socket only usable by this user
+        try:
+            self.server_socket.bind(self.s_path)
+        finally:
+            os.umask(i_old_umask)
+        self.server_socket.listen(8)
+        self.server_socket.setblocking(False)
+        self.watch_source = GLib.io_add_watch(
+                self.server_socket.fileno(), GLib.PRIORITY_HIGH,
+                GLib.IO_IN, self.accept_client)
+
+    def stop(self):
+        if self.watch_source is not None:
+            GLib.source_remove(self.watch_source)
+            self.watch_source = None
+        if self.server_socket is not None:
+            self.server_socket.close()
+            self.server_socket = None
+            try:
+                os.unlink(self.s_path)
+            except FileNotFoundError:
+                pass
+
+    def accept_client(self, i_fd, condition):
+        try:
+            client, address = self.server_socket.accept()
+        except BlockingIOError:
+            return GLib.SOURCE_CONTINUE
+        client.setblocking(False)
+        l_buffer = []
+        GLib.io_add_watch(client.fileno(), GLib.PRIORITY_HIGH,
+                          GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR,
+                          self.read_client, client, l_buffer)
+        return GLib.SOURCE_CONTINUE
+
+    def read_client(self, i_fd, condition, client, l_buffer):
+        """ Collect a command line from a client, then run it """
+        try:
+            b_chunk = client.recv(emojam_client.MAX_LINE)
+        except BlockingIOError:
+            return GLib.SOURCE_CONTINUE
+        except OSError:
+            b_chunk = b''
+        l_buffer.append(b_chunk)
+        b_line = b''.join(l_buffer)
+        if b_chunk and not b_line.endswith(b'\n') and \
+                len(b_line) < emojam_client.MAX_LINE:
+            return GLib.SOURCE_CONTINUE     # wait for the rest
+        if not b_line.endswith(b'\n'):  # hung up early, or line too long
+            client.close()
+            return GLib.SOURCE_REMOVE
+        try:
+            s_command, s_argument = emojam_client.decode_command(b_line)
+        except ValueError as err:
+            self.reply(client, f'error\t{err}')
+            return GLib.SOURCE_REMOVE
+        if s_command == 'quit':
+            self.reply(client, 'ok')
+            self.win.destroy()
+        elif self.win.daemon_command(s_command, s_argument):
+            self.reply_when_drawn(client)
+        else:
+            self.reply(client, 'ok')
+        return GLib.SOURCE_REMOVE
+
+    def reply(self, client, s_reply: str):
+        try:
+            client.setblocking(True)
+            client.sendall((s_reply + '\n').encode('utf-8'))
+        except OSError as err:
+            print(f"Emojam: couldn't reply to client: {err}", file=sys.stderr)
+        client.close()
+
+    def reply_when_drawn(self, client):
+        """ Reply "shown" to client once the window has drawn """
+        self.l_waiting_for_draw.append(client)
+        if self.draw_handler is None:
+            self.draw_handler = self.win.connect_after("draw",
+                                                       self.window_drawn)
+            self.draw_timeout_source = GLib.timeout_add(SHOW_REPLY_TIMEOUT,
+                                                        self.draw_timed_out)
+
+    def window_drawn(self, win, cairo_context):
+        GLib.source_remove(self.draw_timeout_source)
+        self.reply_to_waiting()
+        return False
+
+    def draw_timed_out(self):
+        self.reply_to_waiting()
+        return GLib.SOURCE_REMOVE
+
+    def reply_to_waiting(self):
+        self.draw_timeout_source = None
+        if self.draw_handler is not None:
+            self.win.disconnect(self.draw_handler)
+            self.draw_handler = None
+        l_clients = self.l_waiting_for_draw
+        self.l_waiting_for_draw = []
+        for client in l_clients:
+            self.reply(client, 'shown')
@@ -4,62 +4,430 @@
 # Part of Emojam, (c) 2022 Sam Foster
 # See LICENSE file for details
 
-import csv
-from importlib.resources import files
+import bisect
+import importlib
+import os
+import re
+import threading
+from collections.abc import Mapping
+
+import emojam.emojam_cache as emojam_cache
+import emojam.emojam_profile as emojam_profile
+
+DB_FILENAME = "emojis.csv"  # the emoji set that ships with Emojam
+
+# Qualification policies: which Status values get a record (and a place in
+# the picker) of their own. Rows with any other status become aliases of the
+# record with the same name, so looking up their representation or codepoint
+# still works. Components (skin tones, hair styles) are always shown.
+QUALIFICATIONS = {
+    'fully-qualified': ('component', 'fully-qualified'),
+    'minimally-qualified': ('component', 'fully-qualified',
+                            'minimally-qualified'),
+    'all': ('component', 'fully-qualified', 'minimally-qualified',
+            'unqualified'),
+}
+DEFAULT_QUALIFICATION = 'fully-qualified'
+
+# Emoji modifier codepoints: name used for them in the config
+SKIN_TONES = {'1F3FB': 'light', '1F3FC': 'medium-light', '1F3FD': 'medium',
+              '1F3FE': 'medium-dark', '1F3FF': 'dark'}
+# Gendered forms fold under the gender-neutral emoji: sequences ending in a
+# female or male sign, and these people, when first in a sequence
+GENDER_SIGNS = ('2640', '2642')
+GENDERED_PEOPLE = {'1F468': '1F9D1', '1F469': '1F9D1',   # man, woman: person
+                   '1F466': '1F9D2', '1F467': '1F9D2',   # boy, girl: child
+                   '1F474': '1F9D3', '1F475': '1F9D3'}   # older person
+
+# Emoji versions, as in the CSV's Section column (eg: E13.0). The E is
+# optional when reading one, and so is the minor version
+VERSION_RE = re.compile(r'[Ee]?(\d+)(?:\.(\d+))?')
+# comparison operators for versions_matching()
+VERSION_OPERATORS = ('>=', '<=', '>', '<', '=')
+
+
+def parse_version(s_version: str):
+    """ Take an emoji version like 'E13.0', '13.1' or '5', return it as a
+    (major, minor) tuple that sorts in version order. Raises ValueError if
+    it isn't a version """
+    match = VERSION_RE.fullmatch(s_version.strip())
+    if match is None:
+        raise ValueError(f"not an emoji version: {s_version!r}")
+    return int(match.group(1)), int(match.group(2) or 0)
+
+
+def format_version(t_version):
+    """ Take a (major, minor) version tuple, return it like 'E13.0' """
+    return f'E{t_version[0]}.{t_version[1]}'
+
+
+class EmojiRecord(Mapping):
+    """ One emoji. Slotted to keep memory down, but still readable like the
+    old metadata dict, eg: record['name'] """
+    # keys readable through the mapping interface
+    KEYS = ('name', 'emoji', 'group', 'sub_group', 'codepoint', 'version',
+            'favorite')
+    # id is a dense number, 0 to count - 1, set when the DB is indexed
+    __slots__ = KEYS + ('id',)
+
+    def __init__(self, s_name, s_emoji, s_group, s_sub_group, s_codepoint,
+                 s_version=''):
+        self.name = s_name
+        self.emoji = s_emoji
+        self.group = s_group
+        self.sub_group = s_sub_group
+        self.codepoint = s_codepoint
+        self.version = s_version    # emoji version it came in, eg: E13.0
+        self.favorite = False
+        self.id = None
+
+    def __getitem__(self, s_key):
+        if s_key not in EmojiRecord.KEYS:
+            raise KeyError(s_key)
+        return getattr(self, s_key)
+
+    def __iter__(self):
+        return iter(EmojiRecord.KEYS)
+
+    def __len__(self):
+        return len(EmojiRecord.KEYS)
+
+    def __repr__(self):
+        return f"EmojiRecord({dict(self)!r})"
+
+
+def ungendered_codepoints(l_codepoints):
+    """ Take a sequence's codepoints, return them for the gender-neutral
+    form: without a trailing ZWJ + gender sign, and with a gendered person
+    at the start swapped for the neutral one """
+    l_codepoints = list(l_codepoints)
+    if l_codepoints[-1] == 'FE0F':
+        l_codepoints.pop()
+    if len(l_codepoints) > 2 and l_codepoints[-1] in GENDER_SIGNS and \
+            l_codepoints[-2] == '200D':
+        del l_codepoints[-2:]
+    l_codepoints[0] = GENDERED_PEOPLE.get(l_codepoints[0], l_codepoints[0])
+    return l_codepoints
 
 
 class Emojis:
     """ Load, contain and manage an emoji database """
 
-    def __init__(self, s_db_filename: str):
+    def __init__(self, s_db_filename: str, b_use_cache: bool = True,
+                 s_qualification: str = DEFAULT_QUALIFICATION):
         self.s_db_filename = s_db_filename
-        self.load_emojis_from_csv_file(s_db_filename)
+        self.t_shown_statuses = QUALIFICATIONS[s_qualification]
+        if not (b_use_cache and self.load_emojis_from_cache(s_db_filename)):
+            self.load_emojis_from_csv_file(s_db_filename, b_use_cache)
 
     def get_resource(self, module: str, name: str) -> str:
-        """Load a textual resource file."""
-        # return files(module).joinpath(name).read_text(encoding="utf-8")
+        """Return the path of a resource file in a package."""
+        # importlib.resources takes longer to import than loading the whole
+        # cached DB, so only use it when the package isn't a plain directory
+        for s_dir in importlib.import_module(module).__path__:
+            s_path = os.path.join(s_dir, name)
+            if os.path.isfile(s_path):
+                return s_path
+        from importlib.resources import files
         return files(module).joinpath(name)
 
-    def load_emojis_from_csv_file(self, s_db_filename: str):
-        self.d_emojis = {}  # our DB of emojis.
-        self.i_emoji_count = 0
-        # { group {name: represenation}}
+    @emojam_profile.timed('emojis.load_cache')
+    def load_emojis_from_cache(self, s_db_filename: str):
+        """ Try to load from the compiled cache. Returns False if the cache
+        is missing or stale, so the caller can fall back to the CSV """
+        s_db_fullpath = str(self.get_resource("emojam.emoji_sets",
+                                              s_db_filename))
+        try:
+            cache = emojam_cache.EmojiCache(
+                    emojam_cache.cache_path_for(s_db_filename))
+        except emojam_cache.CacheError:
+            return False
+        try:
+            if not cache.is_fresh_for(s_db_fullpath):
+                return False
+            l_rows = list(cache.rows())
+        except emojam_cache.CacheError:
+            return False
+        finally:
+            cache.close()
+        self.load_emojis_from_rows(l_rows)
+        return True
+
+    @emojam_profile.timed('emojis.load_csv')
+    def load_emojis_from_csv_file(self, s_db_filename: str,
+                                  b_write_cache: bool = False):
+        import csv  # only needed when there's no cache, so import it here
         # Load emoji from relative resource/module path
         s_db_fullpath = self.get_resource("emojam.emoji_sets", s_db_filename)
         with open(s_db_fullpath, mode='r') as f_db_csv:
             self.csv_reader = csv.DictReader(f_db_csv)
-            for row in self.csv_reader:
-                # Add the category if it isn't already there
-                if row['Group'] not in self.d_emojis:
-                    self.d_emojis[row['Group']] = {}
-                # Make metadata dict for emoji
-                d_emoji_metadata = {
-                        "name": row['Name'],
-                        "emoji": row['Representation'],
-                        "group": row['Group'],
-                        "sub_group": row['Subgroup'],
-                        "codepoint": row['CodePoint'],
-                        "favorite": False
-                        }
-                # Add the emoji to its given group
-                self.d_emojis[row['Group']].update({row['Name']: d_emoji_metadata})
-                self.i_emoji_count += 1
+            l_rows = [tuple(row[s_field]
+                            for s_field in emojam_cache.RECORD_FIELDS)
+                      for row in self.csv_reader]
+        self.load_emojis_from_rows(l_rows)
+        if b_write_cache:
+            try:
+                emojam_cache.write_cache(
+                        emojam_cache.cache_path_for(s_db_filename), l_rows,
+                        str(s_db_fullpath))
+            except OSError:
+                pass    # read-only home or similar, the CSV still works
+
+    def load_emojis_from_rows(self, rows):
+        """ Fill the DB from (Group, Subgroup, CodePoint, Status,
+        Representation, Name, Section) tuples, in CSV column order. Rows
+        with a status the qualification policy doesn't show are kept as
+        aliases of the shown record with the same name """
+        self.d_emojis = {}  # our DB of emojis.
+        self.i_emoji_count = 0
+        self.l_aliases = []     # (representation, codepoint, record)
+        # (group, name as in the CSV): [(status, record)], while loading
+        self.d_csv_names = {}
+        # Group and sub-group names repeat thousands of times, so share one
+        # copy of each
+        self.d_string_pool = {}
+        l_alias_rows = []
+        for t_row in rows:
+            if t_row[3] in self.t_shown_statuses:
+                self.add_record(t_row)
+            else:
+                l_alias_rows.append(t_row)
+        # Aliases go last, when every record they could point at is in
+        for t_row in l_alias_rows:
+            (s_group, s_sub_group, s_codepoint, s_status, s_emoji, s_name,
+             s_section) = t_row
+            l_forms = self.d_csv_names.get((s_group, s_name))
+            if not l_forms:     # no other form of it, so show it
+                self.add_record(t_row)
+                continue
+            # with the same name, eg: "keycap", pick by first character
+            emoji_record = next((emoji_record for s_shown_status, emoji_record
+                                 in l_forms
+                                 if emoji_record.emoji[0] == s_emoji[0]),
+                                l_forms[0][1])
+            self.l_aliases.append((s_emoji, s_codepoint, emoji_record))
+        del self.d_string_pool, self.d_csv_names
+        self.build_indexes()
+
+    def add_record(self, t_row):
+        """ Add a CSV row as a record, making its name unique in its group
+        if it has to be """
+        (s_group, s_sub_group, s_codepoint, s_status, s_emoji, s_name,
+         s_section) = t_row
+        pool = self.d_string_pool.setdefault
+        s_group = pool(s_group, s_group)
+        # Add the category if it isn't already there
+        if s_group not in self.d_emojis:
+            self.d_emojis[s_group] = {}
+        d_group = self.d_emojis[s_group]
+        emoji_record = EmojiRecord(s_name, s_emoji, s_group,
+                                   pool(s_sub_group, s_sub_group),
+                                   s_codepoint, pool(s_section, s_section))
+        l_forms = self.d_csv_names.setdefault((s_group, s_name), [])
+        if l_forms:
+            # Names are keys, so two emojis can't share one. Tell them
+            # apart by status if it's not the first one's, eg: "smiling face
+            # (unqualified)", and by first character if the status is the
+            # same too, as in "keycap #" and "keycap *"
+            s_suffix = ''
+            if s_status != l_forms[0][0]:
+                s_suffix = f' ({s_status})'
+            if any(s_status == s_form_status
+                   for s_form_status, form_record in l_forms):
+                taken_record = d_group.pop(s_name + s_suffix, None)
+                if taken_record is not None:    # first clash, rename both
+                    taken_record.name = \
+                        f'{s_name} {taken_record.emoji[0]}{s_suffix}'
+                    d_group[taken_record.name] = taken_record
+                emoji_record.name = f'{s_name} {s_emoji[0]}{s_suffix}'
+            else:
+                emoji_record.name = s_name + s_suffix
+            if emoji_record.name in d_group:    # same character too
+                emoji_record.name = f'{s_name} {s_codepoint}{s_suffix}'
+        l_forms.append((s_status, emoji_record))
+        # Add the emoji to its given group
+        d_group[emoji_record.name] = emoji_record
+        self.i_emoji_count += 1
+
+    @emojam_profile.timed('emojis.build_indexes')
+    def build_indexes(self):
+        """ Build lookup indexes over self.d_emojis, so lookups don't have to
+        scan every group """
+        self.d_by_name = {}         # name: record
+        self.d_by_emoji = {}        # representation: record
+        self.d_by_codepoint = {}    # codepoint: record
+        self.d_group_names = {}     # group: [names, in load order]
+        self.d_subgroup_names = {}  # (group, sub_group): [names]
+        self.l_records = []         # every record, by id
+        for s_group in self.d_emojis:
+            l_group_names = []
+            for s_name, d_emoji in self.d_emojis[s_group].items():
+                d_emoji.id = len(self.l_records)
+                self.l_records.append(d_emoji)
+                # first group wins, same as the old linear scan
+                self.d_by_name.setdefault(s_name, d_emoji)
+                self.d_by_emoji.setdefault(d_emoji.emoji, d_emoji)
+                self.d_by_codepoint.setdefault(d_emoji.codepoint, d_emoji)
+                l_group_names.append(s_name)
+                t_subgroup = (s_group, d_emoji.sub_group)
+                self.d_subgroup_names.setdefault(t_subgroup, []).append(s_name)
+            self.d_group_names[s_group] = l_group_names
+        # other forms of an emoji, eg: unqualified, find its record
+        for s_emoji, s_codepoint, d_emoji in self.l_aliases:
+            self.d_by_emoji.setdefault(s_emoji, d_emoji)
+            self.d_by_codepoint.setdefault(s_codepoint, d_emoji)
+        self.build_variants()
+        # sorted indexes for range queries, built on first use
+        self.l_codepoint_keys = None    # every codepoint, sorted
+        self.l_codepoint_records = None     # and their records
+        self.l_version_keys = None      # every record's version, sorted
+        self.l_version_records = None   # and the records
+
+    def build_variants(self):
+        """ Group skin tone and gender variants under their base emoji, by
+        taking the modifiers out of their codepoints """
+        self.d_variants = {}        # base name: [variant names]
+        self.d_variant_base = {}    # variant name: base name
+        self.d_toned = {}           # (base name, skin tone): variant name
+        for d_emoji in self.l_records:
+            l_codepoints = d_emoji.codepoint.split()
+            l_tones = [s_codepoint for s_codepoint in l_codepoints
+                       if s_codepoint in SKIN_TONES]
+            l_untoned = [s_codepoint for s_codepoint in l_codepoints
+                         if s_codepoint not in SKIN_TONES]
+            if not l_untoned:   # a skin tone on its own
+                continue
+            untoned_emoji = self.d_by_codepoint.get(' '.join(l_untoned))
+            base_emoji = self.d_by_codepoint.get(
+                    ' '.join(ungendered_codepoints(l_untoned))) or \
+                untoned_emoji
+            if base_emoji is None or base_emoji is d_emoji:
+                continue
+            self.d_variants.setdefault(base_emoji.name, []).append(
+                    d_emoji.name)
+            self.d_variant_base[d_emoji.name] = base_emoji.name
+            if len(l_tones) == 1 and untoned_emoji is base_emoji:
+                self.d_toned[(base_emoji.name, SKIN_TONES[l_tones[0]])] = \
+                    d_emoji.name
+
+    def base_name(self, s_emoji_name: str):
+        """ Take an emoji name, return the name of the emoji it's a variant
+        of, or the same name if it isn't a variant """
+        return self.d_variant_base.get(s_emoji_name, s_emoji_name)
+
+    def variant_names(self, s_emoji_name: str):
+        """ Take a base emoji name, return its variants' names """
+        return self.d_variants.get(s_emoji_name, [])
+
+    def toned_name(self, s_emoji_name: str, s_skin_tone: str):
+        """ Take a base emoji name and a skin tone (see SKIN_TONES), return
+        the name of that skin tone of it, or the same name if there's no
+        such variant """
+        return self.d_toned.get((s_emoji_name, s_skin_tone), s_emoji_name)
+
+    @emojam_profile.timed('emojis.build_range_indexes')
+    def build_range_indexes(self):
+        """ Sort codepoints and versions, for codepoints_starting() and
+        versions_matching() to bisect """
+        l_codepoints = sorted(self.d_by_codepoint.items())
+        self.l_codepoint_keys = [s_codepoint for s_codepoint, d_emoji
+                                 in l_codepoints]
+        self.l_codepoint_records = [d_emoji for s_codepoint, d_emoji
+                                    in l_codepoints]
+        d_versions = {}     # version string: parsed, they repeat a lot
+        l_versions = []
+        for d_emoji in self.l_records:
+            t_version = d_versions.get(d_emoji.version)
+            if t_version is None:
+                try:
+                    t_version = parse_version(d_emoji.version)
+                except ValueError:  # no version, treat it as the oldest
+                    t_version = (0, 0)
+                d_versions[d_emoji.version] = t_version
+            l_versions.append((t_version, d_emoji.id))
+        l_versions.sort()
+        self.l_version_keys = [t_version for t_version, i_id in l_versions]
+        self.l_version_records = [self.l_records[i_id]
+                                  for t_version, i_id in l_versions]
+
+    def codepoints_starting(self, s_prefix: str):
+        """ Take the start of a codepoint sequence, like '1F6' or '1F9D1
+        200D', return the records whose codepoints start with it, in
+        codepoint order. Other forms of an emoji (see l_aliases) find its
+        record too, so it's only returned once """
+        if self.l_codepoint_keys is None:
+            self.build_range_indexes()
+        s_prefix = ' '.join(s_prefix.upper().split())
+        l_keys = self.l_codepoint_keys
+        i_start = bisect.bisect_left(l_keys, s_prefix)
+        # every key starting with s_prefix sorts below this one
+        i_end = bisect.bisect_left(l_keys, s_prefix + '\U0010FFFF', i_start)
+        d_found = {}    # id: record
+        for d_emoji in self.l_codepoint_records[i_start:i_end]:
+            d_found.setdefault(d_emoji.id, d_emoji)
+        return list(d_found.values())
+
+    def versions_matching(self, s_operator: str, t_version):
+        """ Return the records whose version compares to t_version (a
+        (major, minor) tuple) with s_operator, one of VERSION_OPERATORS.
+        Oldest first """
+        if self.l_version_keys is None:
+            self.build_range_indexes()
+        l_keys = self.l_version_keys
+        i_count = len(l_keys)
+        if s_operator == '>=':
+            i_start, i_end = bisect.bisect_left(l_keys, t_version), i_count
+        elif s_operator == '>':
+            i_start, i_end = bisect.bisect_right(l_keys, t_version), i_count
+        elif s_operator == '<=':
+            i_start, i_end = 0, bisect.bisect_right(l_keys, t_version)
+        elif s_operator == '<':
+            i_start, i_end = 0, bisect.bisect_left(l_keys, t_version)
+        elif s_operator == '=':
+            i_start = bisect.bisect_left(l_keys, t_version)
+            i_end = bisect.bisect_right(l_keys, t_version, i_start)
+        else:
+            raise ValueError(f"not a version operator: {s_operator!r}")
+        return self.l_version_records[i_start:i_end]
+
+    def versions(self):
+        """ Return every emoji version in the DB, oldest first, like
+        'E0.6' """
+        set_versions = set()
+        for s_version in {d_emoji.version for d_emoji in self.l_records}:
+            try:
+                set_versions.add(parse_version(s_version))
+            except ValueError:
+                pass
+        return [format_version(t_version)
+                for t_version in sorted(set_versions)]
 
     def emoji_count(self):
         return self.i_emoji_count
 
     def emoji_from_name(self, s_emoji_name: str):
         """ Takes in an emoji name, returno the emoji """
-        for group in self.d_emojis:
-            if s_emoji_name in self.d_emojis[group]:
-                return(self.d_emojis[group][s_emoji_name]['emoji'])
+        d_emoji = self.d_by_name.get(s_emoji_name)
+        if d_emoji:
+            return d_emoji.emoji
 
     def name_from_emoji(self, s_emoji: str):
         """ Take an emoji, return emoji name """
-        for group in self.d_emojis:
-            for name in self.d_emojis[group]:
-                if self.d_emojis[group][name]['emoji'] == s_emoji:
-                    return name
+        d_emoji = self.d_by_emoji.get(s_emoji)
+        if d_emoji:
+            return d_emoji.name
+
+    def emoji_dict_from_codepoint(self, s_codepoint: str):
+        """ Take a codepoint string like '1F600', return the dict entry """
+        return self.d_by_codepoint.get(s_codepoint.upper())
+
+    def names_in_group(self, s_group: str):
+        """ Take a group name, return its emoji names in load order """
+        return self.d_group_names.get(s_group, [])
+
+    def names_in_subgroup(self, s_group: str, s_sub_group: str):
+        """ Take a group and sub-group name, return emoji names in it """
+        return self.d_subgroup_names.get((s_group, s_sub_group), [])
 
     def emoji_from_group(self, s_emoji_name: str):
         """ Takes in a group name, returns an emoji to represent that group """
@@ -95,12 +463,37 @@ class Emojis:
 
     def emoji_dict_from_name(self, s_emoji_name: str):
         """ Take an emoji name, return the dict entry """
-        for group in self.d_emojis:
-            if s_emoji_name in self.d_emojis[group]:
-                return(self.d_emojis[group][s_emoji_name])
+        return self.d_by_name.get(s_emoji_name)
 
     def emoji_group_from_name(self, s_emoji_name: str):
         """ Take an emoji name, return the group name """
-        for group in self.d_emojis:
-            if s_emoji_name in self.d_emojis[group]:
-                return(group)
+        d_emoji = self.d_by_name.get(s_emoji_name)
+        if d_emoji:
+            return d_emoji.group
+
+
+class BackgroundLoad:
+    """ Load an Emojis DB on a thread, so the caller can get on with
+    something else (like starting GTK) meanwhile """
+
+    def __init__(self, s_db_filename: str,
+                 s_qualification: str = DEFAULT_QUALIFICATION):
+        self.emo = None
+        self.error = None
+        self.thread = threading.Thread(target=self.load,
+                                       args=(s_db_filename, s_qualification),
+                                       daemon=True)
+        self.thread.start()
+
+    def load(self, s_db_filename: str, s_qualification: str):
+        try:
+            self.emo = Emojis(s_db_filename, s_qualification=s_qualification)
+        except BaseException as err:    # handed to whoever calls result()
+            self.error = err
+
+    def result(self):
+        """ Wait for the load to finish, and return the Emojis """
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.emo
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+# Bitset filters for the emoji picker.
+#
+# Every emoji record has a dense id (0 to count - 1). A set of emojis is a
+# Python int with bit <id> set for each member, so groups, favorites, recents
+# and search results can be combined with & and | in one step, no matter how
+# many emojis there are. Group and sub-group bitsets are built once; favorites
+# and recents are kept up to date as they change.
+#
+# Skin tone and gender variants are folded out of group views: a group shows
+# just the base emoji, and its variants are picked from there.
+#
+# Emojis newer than the emoji version cap (for fonts that can't draw them)
+# are hidden from every view.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import emojam.emojam_profile as emojam_profile
+
+
+class FilterEngine:
+    """ Bitsets over emoji ids, for everything the picker can filter by """
+
+    @emojam_profile.timed('filter.build')
+    def __init__(self, emo):
+        self.emo = emo
+        self.all_bits = (1 << len(emo.l_records)) - 1
+        self.d_group_bits = {}      # group: bitset
+        self.d_subgroup_bits = {}   # (group, sub_group): bitset
+        self.variant_bits = 0       # skin tone and gender variants
+        d_variant_base = emo.d_variant_base
+        for emoji_record in emo.l_records:
+            i_bit = 1 << emoji_record.id
+            s_group = emoji_record.group
+            t_subgroup = (s_group, emoji_record.sub_group)
+            self.d_group_bits[s_group] = \
+                self.d_group_bits.get(s_group, 0) | i_bit
+            self.d_subgroup_bits[t_subgroup] = \
+                self.d_subgroup_bits.get(t_subgroup, 0) | i_bit
+            if emoji_record.name in d_variant_base:
+                self.variant_bits |= i_bit
+        self.favorites_bits = 0
+        self.recent_bits = 0
+        self.hidden_bits = 0        # newer than the version cap
+
+    def bit_for_name(self, s_emoji_name: str):
+        """ Return the bit for an emoji name, or 0 if it isn't in the DB """
+        emoji_record = self.emo.d_by_name.get(s_emoji_name)
+        if emoji_record is None:
+            return 0
+        return 1 << emoji_record.id
+
+    @emojam_profile.timed('filter.bits_from_names')
+    def bits_from_names(self, names):
+        """ Return the bitset for an iterable of emoji names """
+        i_bits = 0
+        for s_emoji_name in names:
+            i_bits |= self.bit_for_name(s_emoji_name)
+        return i_bits
+
+    def ids_from_bits(self, i_bits: int):
+        """ Return the ids in a bitset, lowest first """
+        # Scanning the binary string runs in C, unlike shifting bit by bit
+        s_bits = format(i_bits, 'b')[::-1]
+        l_ids = []
+        i_id = s_bits.find('1')
+        while i_id != -1:
+            l_ids.append(i_id)
+            i_id = s_bits.find('1', i_id + 1)
+        return l_ids
+
+    @emojam_profile.timed('filter.names_from_bits')
+    def names_from_bits(self, i_bits: int):
+        """ Return the emoji names in a bitset, in database order """
+        l_records = self.emo.l_records
+        return [l_records[i_id].name for i_id in self.ids_from_bits(i_bits)]
+
+    def group_bits(self, s_group: str, b_fold_variants: bool = True):
+        """ Return the bitset for a group, or for one of the pseudo groups:
+        All, Favorites and Recently Used. Unless b_fold_variants is False,
+        real groups and All leave out skin tone and gender variants.
+        Favorites and Recently Used have just what the user picked """
+        if s_group == "Favorites":
+            return self.favorites_bits & ~self.hidden_bits
+        elif s_group == "Recently Used":
+            return self.recent_bits & ~self.hidden_bits
+        if s_group == "All":
+            i_bits = self.all_bits
+        else:
+            i_bits = self.d_group_bits.get(s_group, 0)
+        if b_fold_variants:
+            i_bits &= ~self.variant_bits
+        return i_bits & ~self.hidden_bits
+
+    def subgroup_bits(self, s_group: str, s_sub_group: str):
+        return self.d_subgroup_bits.get((s_group, s_sub_group), 0)
+
+    def set_favorites(self, names):
+        self.favorites_bits = self.bits_from_names(names)
+
+    def set_favorite(self, s_emoji_name: str, b_favorite: bool):
+        i_bit = self.bit_for_name(s_emoji_name)
+        if b_favorite:
+            self.favorites_bits |= i_bit
+        else:
+            self.favorites_bits &= ~i_bit
+
+    def set_recent(self, names):
+        self.recent_bits = self.bits_from_names(names)
+
+    def add_recent(self, s_emoji_name: str):
+        """ Add a just-picked emoji to the recents. Recently Used is shown
+        in frecency order, and cut to length, when it's looked at """
+        self.recent_bits |= self.bit_for_name(s_emoji_name)
+
+    @emojam_profile.timed('filter.set_max_version')
+    def set_max_version(self, t_version):
+        """ Hide emojis newer than t_version, a (major, minor) tuple. None
+        shows every version """
+        self.hidden_bits = 0
+        if t_version is not None:
+            for emoji_record in self.emo.versions_matching('>', t_version):
+                self.hidden_bits |= 1 << emoji_record.id
+
+    def is_hidden(self, s_emoji_name: str):
+        """ True if the version cap hides s_emoji_name """
+        return bool(self.bit_for_name(s_emoji_name) & self.hidden_bits)
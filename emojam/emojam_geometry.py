@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+# Grid layout math for the emoji picker.
+#
+# Every cell in the picker is the same size, so where a cell goes, which cells
+# are on screen and which cell is under the pointer can all be worked out with
+# arithmetic instead of asking GTK. Kept free of GTK so it can be benchmarked
+# and reused headless.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+
+class GridGeometry:
+    """ Fixed-size cell grid: columns from width, rows from cell count """
+
+    def __init__(self, i_cell_width=1, i_cell_height=1, i_width=1,
+                 i_count=0):
+        self.i_cell_width = max(1, i_cell_width)
+        self.i_cell_height = max(1, i_cell_height)
+        self.i_width = max(1, i_width)
+        self.i_count = i_count
+
+    def set_cell_size(self, i_cell_width, i_cell_height):
+        self.i_cell_width = max(1, i_cell_width)
+        self.i_cell_height = max(1, i_cell_height)
+
+    def set_width(self, i_width):
+        self.i_width = max(1, i_width)
+
+    def set_count(self, i_count):
+        self.i_count = i_count
+
+    def columns(self):
+        return max(1, self.i_width // self.i_cell_width)
+
+    def rows(self):
+        i_columns = self.columns()
+        return (self.i_count + i_columns - 1) // i_columns
+
+    def total_height(self):
+        return self.rows() * self.i_cell_height
+
+    def cell_position(self, i_index):
+        """ Return the (x, y) of the top left corner of cell i_index """
+        i_row, i_column = divmod(i_index, self.columns())
+        return i_column * self.i_cell_width, i_row * self.i_cell_height
+
+    def visible_range(self, f_scroll_y, f_page_height, i_overscan_rows=0):
+        """ Return (first, end) cell indexes covering the rows between
+        f_scroll_y and f_scroll_y + f_page_height, plus i_overscan_rows
+        extra rows above and below. end is exclusive """
+        i_columns = self.columns()
+        i_first_row = int(f_scroll_y) // self.i_cell_height - i_overscan_rows
+        i_end_row = -(-int(f_scroll_y + f_page_height) //
+                      self.i_cell_height) + i_overscan_rows
+        i_first = max(0, i_first_row * i_columns)
+        i_end = min(self.i_count, max(0, i_end_row * i_columns))
+        return i_first, max(i_first, i_end)
+
+    def index_at(self, f_x, f_y):
+        """ Return the index of the cell at (f_x, f_y), or None """
+        if f_x < 0 or f_y < 0:
+            return None
+        i_column = int(f_x) // self.i_cell_width
+        if i_column >= self.columns():
+            return None
+        i_index = (int(f_y) // self.i_cell_height) * self.columns() + i_column
+        if i_index >= self.i_count:
+            return None
+        return i_index
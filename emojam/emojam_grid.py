@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+
+# Custom-drawn emoji grid.
+#
+# The grid is a single widget: a Gtk.Layout (for scrolling) that draws every
+# emoji itself, in fixed-size cells, instead of having a widget per emoji.
+# Only cells in the region GTK asks to be redrawn get drawn, so scrolling
+# draws just the newly exposed rows and a hover change just two cells. Where
+# cells go, and which cell is under the pointer, is worked out by the grid
+# geometry.
+#
+# Emojis are painted from the glyph atlas when it has them, and shaped as
+# text with Pango when it doesn't. Cells are styled by CSS as if they were
+# nodes with the .emoji-button class (font size, padding), and the hovered
+# one also with .highlighted.
+#
+# Pointer events are passed on to the window's handler along with the emoji
+# under the pointer. A left click is passed on when the button is released,
+# so that a long press (for an emoji's variants) doesn't pick it as well.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import gi
+
+import emojam.emojam_atlas as emojam_atlas
+import emojam.emojam_geometry as emojam_geometry
+import emojam.emojam_profile as emojam_profile
+
+gi.require_version("Gtk", "3.0")
+
+from gi.repository import Gtk, Gdk, GLib
+
+
+class EmojiGrid(Gtk.ScrolledWindow):
+    """ Scrollable grid of emojis, drawn by hand """
+
+    def __init__(self, atlas, emoji_from_name, emoji_event,
+                 emoji_long_press=None):
+        super().__init__()
+        self.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+        self.atlas = atlas  # emojam_atlas.GlyphAtlas
+        self.emoji_from_name = emoji_from_name  # name -> emoji string
+        # emoji_event(event_type, s_emoji_name, event), for enter, leave,
+        # button press (except left) and left button release on an emoji
+        self.emoji_event = emoji_event
+        # emoji_long_press(s_emoji_name, rectangle), with the cell's area
+        self.emoji_long_press = emoji_long_press
+        self.i_hover_index = None
+        self.s_pressed_name = None  # emoji under the last press, for drags
+        self.i_pressed_index = None
+        self.b_long_pressed = False
+        self.l_names = []           # the model: emoji names, in order
+        self.geometry = emojam_geometry.GridGeometry()
+        self.relayout_source = None
+        self.b_measured = False
+        self.text_layout = None     # Pango layout for live text
+        self.t_font = None          # atlas font key
+        self.padding = None         # .emoji-button CSS padding
+        self.layout = Gtk.Layout()
+        self.layout.connect("size-allocate", self.layout_size_allocate)
+        self.layout.connect("draw", self.layout_draw)
+        self.layout.connect("style-updated", self.layout_style_updated)
+        self.layout.add_events(Gdk.EventMask.POINTER_MOTION_MASK |
+                               Gdk.EventMask.BUTTON_PRESS_MASK |
+                               Gdk.EventMask.BUTTON_RELEASE_MASK |
+                               Gdk.EventMask.LEAVE_NOTIFY_MASK)
+        self.layout.connect("motion-notify-event", self.layout_motion)
+        self.layout.connect("leave-notify-event", self.layout_leave)
+        self.layout.connect("button-press-event", self.layout_button_press)
+        self.layout.connect("button-release-event",
+                            self.layout_button_release)
+        self.long_press = Gtk.GestureLongPress.new(self.layout)
+        self.long_press.set_propagation_phase(Gtk.PropagationPhase.BUBBLE)
+        self.long_press.connect("pressed", self.layout_long_press)
+        self.add(self.layout)
+
+    def name_at(self, f_x, f_y):
+        """ Return the emoji name under layout coordinates, or None """
+        i_index = self.geometry.index_at(f_x, f_y)
+        if i_index is None:
+            return None
+        return self.l_names[i_index]
+
+    def cell_rectangle(self, i_index):
+        """ Return cell i_index's area, in the layout widget's coordinates
+        (eg: for pointing a popover at it) """
+        i_x, i_y = self.geometry.cell_position(i_index)
+        rectangle = Gdk.Rectangle()
+        rectangle.x = i_x
+        rectangle.y = i_y - int(self.get_vadjustment().get_value())
+        rectangle.width = self.geometry.i_cell_width
+        rectangle.height = self.geometry.i_cell_height
+        return rectangle
+
+    def pressed_cell_rectangle(self):
+        """ cell_rectangle() of the last emoji pressed """
+        return self.cell_rectangle(self.i_pressed_index)
+
+    def invalidate_cell(self, i_index):
+        """ Have cell i_index redrawn """
+        bin_window = self.layout.get_bin_window()
+        if bin_window is None or i_index >= self.geometry.i_count:
+            return
+        i_x, i_y = self.geometry.cell_position(i_index)
+        rectangle = Gdk.Rectangle()
+        rectangle.x, rectangle.y = i_x, i_y
+        rectangle.width = self.geometry.i_cell_width
+        rectangle.height = self.geometry.i_cell_height
+        bin_window.invalidate_rect(rectangle, False)
+
+    def set_hover_index(self, i_index, event):
+        """ Move the hover to cell i_index (None for no cell), sending leave
+        and enter to the window """
+        if i_index == self.i_hover_index:
+            return
+        i_old_index = self.i_hover_index
+        self.i_hover_index = i_index
+        if i_old_index is not None:
+            self.invalidate_cell(i_old_index)
+            self.emoji_event(Gdk.EventType.LEAVE_NOTIFY,
+                             self.l_names[i_old_index], event)
+        if i_index is not None:
+            self.invalidate_cell(i_index)
+            self.emoji_event(Gdk.EventType.ENTER_NOTIFY,
+                             self.l_names[i_index], event)
+
+    def layout_motion(self, layout, event):
+        self.set_hover_index(self.geometry.index_at(event.x, event.y), event)
+        return False
+
+    def layout_leave(self, layout, event):
+        self.set_hover_index(None, event)
+        return False
+
+    def layout_button_press(self, layout, event):
+        i_index = self.geometry.index_at(event.x, event.y)
+        self.i_pressed_index = i_index
+        self.b_long_pressed = False
+        if i_index is None:
+            self.s_pressed_name = None
+            return False
+        self.s_pressed_name = self.l_names[i_index]
+        if event.button != 1:
+            self.emoji_event(Gdk.EventType.BUTTON_PRESS,
+                             self.l_names[i_index], event)
+        return False    # let drag and drop see the press too
+
+    def layout_button_release(self, layout, event):
+        """ A left click is a press and release on the same emoji, that
+        wasn't a long press """
+        i_index = self.geometry.index_at(event.x, event.y)
+        if (event.button == 1 and i_index is not None and
+                i_index == self.i_pressed_index and not self.b_long_pressed):
+            self.emoji_event(Gdk.EventType.BUTTON_RELEASE,
+                             self.l_names[i_index], event)
+        self.i_pressed_index = None
+        return False
+
+    def layout_long_press(self, gesture, f_x, f_y):
+        """ Gesture coordinates are the widget's, so add the scroll offset
+        to get the layout's """
+        i_index = self.geometry.index_at(
+                f_x, f_y + self.get_vadjustment().get_value())
+        if i_index is None or self.emoji_long_press is None:
+            return
+        self.b_long_pressed = True
+        self.emoji_long_press(self.l_names[i_index],
+                              self.cell_rectangle(i_index))
+
+    @emojam_profile.timed('grid.set_names')
+    def set_names(self, l_names, b_scroll_to_top=True):
+        """ Show l_names (a list of emoji names) in the grid """
+        if l_names == self.l_names:
+            return
+        self.set_hover_index(None, None)
+        self.l_names = l_names
+        if not self.b_measured:
+            self.measure_cells()
+        self.geometry.set_count(len(l_names))
+        self.update_layout_size()
+        if b_scroll_to_top:
+            self.get_vadjustment().set_value(0)
+        self.layout.queue_draw()
+
+    def cell_style_context(self, b_highlighted=False):
+        """ The layout's style context, saved and styled as a cell. Call
+        restore() on it when done """
+        style_context = self.layout.get_style_context()
+        style_context.save()
+        style_context.add_class('emoji-button')
+        if b_highlighted:
+            style_context.add_class('highlighted')
+        return style_context
+
+    @emojam_profile.timed('grid.measure_cells')
+    def measure_cells(self):
+        """ Work out the cell size from the emoji font size, which comes from
+        CSS, so do this again after zooming """
+        style_context = self.cell_style_context()
+        font_description = style_context.get_property(
+                'font', Gtk.StateFlags.NORMAL)
+        self.padding = style_context.get_padding(Gtk.StateFlags.NORMAL)
+        style_context.restore()
+        self.text_layout = self.layout.create_pango_layout(
+                emojam_atlas.REFERENCE_EMOJI)
+        self.text_layout.set_font_description(font_description)
+        self.t_font = emojam_atlas.font_key_for(self.layout, font_description)
+        ink_rect, logical_rect = self.text_layout.get_pixel_extents()
+        padding = self.padding
+        self.geometry.set_cell_size(
+                logical_rect.width + padding.left + padding.right,
+                logical_rect.height + padding.top + padding.bottom)
+        self.b_measured = True
+
+    def layout_style_updated(self, layout):
+        if self.b_measured:
+            self.queue_relayout()
+
+    def redraw_cells(self):
+        """ Repaint the grid, eg: when there's a new atlas """
+        self.layout.queue_draw()
+
+    def queue_relayout(self):
+        """ Re-measure and redraw once pending style changes have been
+        applied """
+        if self.relayout_source is None:
+            self.relayout_source = GLib.idle_add(self.relayout)
+
+    @emojam_profile.timed('grid.relayout')
+    def relayout(self):
+        self.relayout_source = None
+        self.measure_cells()
+        self.update_layout_size()
+        self.layout.queue_draw()
+        return GLib.SOURCE_REMOVE
+
+    def layout_size_allocate(self, layout, allocation):
+        if allocation.width != self.geometry.i_width:
+            self.geometry.set_width(allocation.width)
+            self.update_layout_size()
+            self.layout.queue_draw()
+
+    def update_layout_size(self):
+        self.layout.set_size(self.geometry.i_width,
+                             self.geometry.total_height())
+
+    @emojam_profile.timed('grid.draw')
+    def layout_draw(self, layout, cairo_context):
+        """ Draw the cells in the damaged region """
+        if not self.b_measured:
+            return False
+        bin_window = layout.get_bin_window()
+        Gtk.cairo_transform_to_window(cairo_context, layout, bin_window)
+        b_clipped, clip = Gdk.cairo_get_clip_rectangle(cairo_context)
+        if not b_clipped:
+            return False
+        geometry = self.geometry
+        i_cell_width = geometry.i_cell_width
+        i_cell_height = geometry.i_cell_height
+        i_first, i_end = geometry.visible_range(clip.y, clip.height)
+        style_context = self.cell_style_context()
+        i_drawn = 0
+        for i_index in range(i_first, i_end):
+            i_x, i_y = geometry.cell_position(i_index)
+            if i_x + i_cell_width <= clip.x or i_x >= clip.x + clip.width:
+                continue
+            cairo_context.save()
+            cairo_context.translate(i_x, i_y)
+            if i_index == self.i_hover_index:
+                hover_style_context = self.cell_style_context(True)
+                Gtk.render_background(hover_style_context, cairo_context, 0,
+                                      0, i_cell_width, i_cell_height)
+                self.draw_emoji(cairo_context, hover_style_context,
+                                self.l_names[i_index])
+                hover_style_context.restore()
+            else:
+                self.draw_emoji(cairo_context, style_context,
+                                self.l_names[i_index])
+            cairo_context.restore()
+            i_drawn += 1
+        style_context.restore()
+        if emojam_profile.ENABLED:
+            emojam_profile.sample('grid.cells_drawn', i_drawn)
+        return False
+
+    def draw_emoji(self, cairo_context, style_context, s_emoji_name: str):
+        """ Draw an emoji in the cell at the origin, from the atlas or as
+        text """
+        s_emoji = self.emoji_from_name(s_emoji_name)
+        i_cell_width = self.geometry.i_cell_width
+        i_cell_height = self.geometry.i_cell_height
+        if self.atlas.draw(cairo_context, self.t_font, s_emoji, i_cell_width,
+                           i_cell_height):
+            if emojam_profile.ENABLED:
+                emojam_profile.count('grid.cells_drawn_from_atlas')
+            return
+        text_layout = self.text_layout
+        text_layout.set_text(s_emoji, -1)
+        ink_rect, logical_rect = text_layout.get_pixel_extents()
+        Gtk.render_layout(style_context, cairo_context,
+                          (i_cell_width - logical_rect.width) / 2,
+                          (i_cell_height - logical_rect.height) / 2,
+                          text_layout)
+        if emojam_profile.ENABLED:
+            emojam_profile.count('grid.cells_drawn_as_text')
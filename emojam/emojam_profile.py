@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+# Hot-path instrumentation for Emojam.
+#
+# Named timers (the timed decorator), counters and samples, reported at exit
+# when profiling is on. Profiling is switched on by the EMOJAM_PROFILE
+# environment variable, which "emojam --profile" sets. It is read once, when
+# this module is imported, and when it's off timed() hands back the function
+# it was given, so instrumented code runs exactly as if it weren't. Counters
+# and samples in hot paths are guarded by "if emojam_profile.ENABLED".
+#
+# EMOJAM_PROFILE=1 prints a text report to stderr at exit. Any other value
+# is a file name to also write the report to, as JSON.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import atexit
+import functools
+import math
+import os
+import sys
+import time
+
+s_profile_setting = os.environ.get('EMOJAM_PROFILE', '')
+ENABLED = bool(s_profile_setting)
+
+d_timings = {}  # timer name: [seconds per call]
+d_counters = {}  # counter name: total
+d_samples = {}  # sample name: [values]
+
+
+def timed(s_name: str):
+    """ Decorator: time every call of the function as timer s_name """
+    def decorate(f_timed):
+        if not ENABLED:
+            return f_timed
+
+        @functools.wraps(f_timed)
+        def timed_call(*args, **kwargs):
+            f_start_time = time.perf_counter()
+            try:
+                return f_timed(*args, **kwargs)
+            finally:
+                d_timings.setdefault(s_name, []).append(
+                        time.perf_counter() - f_start_time)
+        return timed_call
+    return decorate
+
+
+def count(s_name: str, i_amount: int = 1):
+    """ Add i_amount to counter s_name """
+    d_counters[s_name] = d_counters.get(s_name, 0) + i_amount
+
+
+def sample(s_name: str, value):
+    """ Record one value of s_name, eg: results per keystroke """
+    d_samples.setdefault(s_name, []).append(value)
+
+
+def percentile(l_sorted, f_fraction: float):
+    """ Nearest-rank percentile of an already sorted list """
+    return l_sorted[max(1, math.ceil(len(l_sorted) * f_fraction)) - 1]
+
+
+def summarize(l_values):
+    l_sorted = sorted(l_values)
+    return {'count': len(l_sorted),
+            'total': sum(l_sorted),
+            'p50': percentile(l_sorted, 0.5),
+            'p99': percentile(l_sorted, 0.99),
+            'max': l_sorted[-1]}
+
+
+def report():
+    """ Return everything recorded so far, summarized, as a dict. Timer
+    durations are in milliseconds """
+    d_timers = {}
+    for s_name, l_seconds in sorted(d_timings.items()):
+        d_summary = summarize([f_seconds * 1000 for f_seconds in l_seconds])
+        d_timers[s_name] = {'calls': d_summary['count'],
+                            'total_ms': round(d_summary['total'], 3),
+                            'p50_ms': round(d_summary['p50'], 3),
+                            'p99_ms': round(d_summary['p99'], 3),
+                            'max_ms': round(d_summary['max'], 3)}
+    d_sample_summaries = {}
+    for s_name, l_values in sorted(d_samples.items()):
+        d_summary = summarize(l_values)
+        d_sample_summaries[s_name] = {
+                'samples': d_summary['count'],
+                'mean': round(d_summary['total'] / d_summary['count'], 3),
+                'p50': d_summary['p50'],
+                'p99': d_summary['p99'],
+                'max': d_summary['max']}
+    return {'timers': d_timers,
+            'counters': dict(sorted(d_counters.items())),
+            'samples': d_sample_summaries}
+
+
+def format_report(d_report):
+    """ Return a report from report() as a text table """
+    l_lines = ['Emojam profile', '',
+               f"{'timer':<32} {'calls':>7} {'total ms':>10} {'p50 ms':>9} "
+               f"{'p99 ms':>9} {'max ms':>9}"]
+    for s_name, d_timer in d_report['timers'].items():
+        l_lines.append(f"{s_name:<32} {d_timer['calls']:>7} "
+                       f"{d_timer['total_ms']:>10.2f} "
+                       f"{d_timer['p50_ms']:>9.3f} {d_timer['p99_ms']:>9.3f} "
+                       f"{d_timer['max_ms']:>9.3f}")
+    if d_report['counters']:
+        l_lines += ['', f"{'counter':<32} {'total':>7}"]
+        for s_name, i_total in d_report['counters'].items():
+            l_lines.append(f"{s_name:<32} {i_total:>7}")
+    if d_report['samples']:
+        l_lines += ['', f"{'sample':<32} {'samples':>7} {'mean':>10} "
+                        f"{'p50':>9} {'p99':>9} {'max':>9}"]
+        for s_name, d_sample in d_report['samples'].items():
+            l_lines.append(f"{s_name:<32} {d_sample['samples']:>7} "
+                           f"{d_sample['mean']:>10} {d_sample['p50']:>9} "
+                           f"{d_sample['p99']:>9} {d_sample['max']:>9}")
+    return '\n'.join(l_lines) + '\n'
+
+
+def write_report():
+    """ At exit: print the report, and save it as JSON if asked to """
+    import json
+    d_report = report()
+    sys.stderr.write(format_report(d_report))
+    if s_profile_setting != '1':
+        try:
+            with open(s_profile_setting, 'w', encoding='utf-8') as f_json:
+                json.dump(d_report, f_json, indent=2)
+        except OSError as err:
+            print(f"Emojam: couldn't write profile: {err}", file=sys.stderr)
+
+
+if ENABLED:
+    atexit.register(write_report)
@@ -0,0 +1,624 @@
+#!/usr/bin/env python3
+
+# Search engine for the emoji database.
+#
+# Names, groups and sub-groups are split into lowercase word tokens once, at
+# load time. Each token goes into an inverted index (token -> emoji names),
+# and every prefix of every token goes into a trie whose nodes hold the names
+# reachable below them. A query is split the same way and each word is matched
+# as a token prefix, so "cat fa" finds "cat face". Words are ANDed together.
+#
+# For typos there is also a trigram index, over name tokens and over whole
+# names. Fuzzy candidates are scored by trigram overlap (Dice coefficient).
+# Short words share few trigrams even with a one letter typo ("hert" and
+# "heart"), so a token one typo away from a query word always counts as
+# similar. A fuzzy match on a token that isn't in the emoji's own name (its
+# group, sub-group or keywords) counts for less than one in the name.
+# Ranked results order matches as: exact name > exact keyword > name prefix >
+# token prefix > fuzzy. Within a tier, emojis the user picks often come first
+# (see emojam_usage), then shorter names, then alphabetical order.
+#
+# Queries can also pick emojis by codepoint or emoji version, alone or along
+# with words:
+#   U+1F6, 1F9D1 200D       codepoints starting with these (without U+, each
+#                           needs 4+ hex digits, one of them a digit)
+#   version>=E13.0, v<5     emoji version, with >=, <=, >, < or =
+# These are answered by range scans over the DB's sorted codepoint and
+# version indexes (see Emojis.codepoints_starting), not by the word index.
+#
+# Keyword annotations for the user's language (see emojam_annotations), if
+# there are any, are indexed along with the names, so "lol" can find "face
+# with tears of joy". A query that is exactly one of an emoji's keywords
+# ranks it above the name prefix matches, so "lol" puts that before
+# "lollipop".
+#
+# The GUI builds the index while idle, a step at a time (see build_step), so
+# each step is kept small: a few emojis indexed, or about a thousand set
+# members merged.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import re
+
+import emojam.emojam_emojis as emojam_emojis
+import emojam.emojam_profile as emojam_profile
+
+TOKEN_RE = re.compile(r'\w+')
+NON_WORD_RE = re.compile(r'[^\w\n]+')
+NORMALIZE_LINES_RE = re.compile(r' ?\n ?')
+# query terms that aren't words, see the top of the file
+HEX_RE = r'(?=[0-9A-Fa-f]*[0-9])[0-9A-Fa-f]{4,}'
+CODEPOINT_TERM_RE = re.compile(
+        r'(?<!\S)(?:[Uu]\+[0-9A-Fa-f]+|%s)(?:\s+(?:[Uu]\+)?%s)*(?!\S)'
+        % (HEX_RE, HEX_RE))
+VERSION_TERM_RE = re.compile(
+        r'(?<!\S)(?:version|v)\s*(>=|<=|>|<|=|:)\s*([Ee]?\d+(?:\.\d+)?)'
+        r'(?!\S)', re.IGNORECASE)
+
+# Ranking tiers. A score is tier + a fraction below 1 used within the tier.
+TIER_EXACT = 5
+TIER_KEYWORD = 4
+TIER_PREFIX = 3
+TIER_TOKEN = 2
+TIER_FUZZY = 1
+FUZZY_THRESHOLD = 0.5   # minimum trigram similarity for a fuzzy match
+FUZZY_MIN_LENGTH = 3    # don't fuzz queries shorter than this
+TYPO_SIMILARITY = 0.6   # similarity of a token one typo away from a word
+# fuzzy similarity of a token that's in the group, sub-group or keywords,
+# but not the name, is scaled by this
+OTHER_TOKEN_WEIGHT = 0.8
+# Work per index build step: emojis indexed, and set members merged (into
+# the trie, or when freezing sets)
+BUILD_STEP_NAMES = 20
+BUILD_STEP_MERGES = 1000
+
+
+def tokenize(s_text: str):
+    """ Split text into lowercase word tokens """
+    return TOKEN_RE.findall(s_text.lower())
+
+
+def normalize(s_text: str):
+    """ Lowercase text with the punctuation squeezed out, for comparisons """
+    return ' '.join(tokenize(s_text))
+
+
+def parse_query(s_query: str):
+    """ Split a query into its words and its codepoint and version terms.
+    Returns (words, terms). Terms are ('codepoint', prefix) or ('version',
+    operator, (major, minor)) """
+    l_terms = []
+
+    def version_term(match):
+        s_operator = '=' if match.group(1) == ':' else match.group(1)
+        l_terms.append(('version', s_operator,
+                        emojam_emojis.parse_version(match.group(2))))
+        return ' '
+
+    def codepoint_term(match):
+        l_terms.append(('codepoint', match.group(0).upper().replace('U+', '')))
+        return ' '
+
+    if ':' in s_query or '=' in s_query or '<' in s_query or \
+            '>' in s_query:
+        s_query = VERSION_TERM_RE.sub(version_term, s_query)
+    s_query = CODEPOINT_TERM_RE.sub(codepoint_term, s_query)
+    return tokenize(s_query), l_terms
+
+
+def trigrams(s_text: str):
+    """ Return the set of space-padded trigrams in s_text """
+    s_padded = f' {s_text} '
+    return {s_padded[i:i + 3] for i in range(len(s_padded) - 2)}
+
+
+def one_typo_apart(s_a: str, s_b: str):
+    """ True if s_b is s_a with one character inserted, deleted or
+    changed, or two neighbouring characters swapped """
+    i_length_a, i_length_b = len(s_a), len(s_b)
+    if abs(i_length_a - i_length_b) > 1 or s_a == s_b:
+        return False
+    i_pos = 0
+    while i_pos < min(i_length_a, i_length_b) and \
+            s_a[i_pos] == s_b[i_pos]:
+        i_pos += 1
+    if i_length_a < i_length_b:
+        return s_a[i_pos:] == s_b[i_pos + 1:]
+    if i_length_a > i_length_b:
+        return s_a[i_pos + 1:] == s_b[i_pos:]
+    if s_a[i_pos + 1:] == s_b[i_pos + 1:]:
+        return True
+    return i_pos + 1 < i_length_a and s_a[i_pos] == s_b[i_pos + 1] and \
+        s_a[i_pos + 1] == s_b[i_pos] and s_a[i_pos + 2:] == s_b[i_pos + 2:]
+
+
+class SearchResult:
+    """ Names matching a query, with a score for ranking each of them """
+    __slots__ = ('names', 'scores', '_ranked')
+
+    def __init__(self, d_scores):
+        self.scores = d_scores
+        self.names = d_scores.keys()
+        self._ranked = None
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __contains__(self, s_name):
+        return s_name in self.scores
+
+    def ranked(self):
+        """ Return matching names, best first """
+        if self._ranked is None:
+            # the sort is stable, so ties stay in alphabetical order
+            self._ranked = sorted(sorted(self.scores),
+                                  key=self.scores.__getitem__, reverse=True)
+        return self._ranked
+
+
+class TrieNode:
+    """ One character step in the prefix trie """
+    __slots__ = ('children', 'names')
+
+    def __init__(self):
+        self.children = {}
+        self.names = set()
+
+
+class EmojiSearch:
+    """ Inverted token index plus prefix trie over an Emojis database """
+
+    def __init__(self, emo, b_build=True, annotations=None):
+        self.emo = emo
+        # emojam_annotations.Annotations, or None for names only
+        self.annotations = annotations or None
+        self.d_keyword_names = None     # normalized keyword: [names]
+        self.d_index = {}   # token: set of emoji names
+        self.d_name_index = {}  # token: set of names with it in the name
+        self.trie = TrieNode()
+        self.d_normalized = {}      # name: normalized name
+        self.d_token_trigrams = {}  # trigram: set of tokens
+        self.d_name_trigrams = {}   # trigram: set of emoji names
+        self.d_name_trigram_count = {}  # name: number of trigrams in it
+        self.b_ready = False
+        # f_usage_boost(name) -> 0 <= boost < 1, for how much the user likes
+        # an emoji. None ranks on the query alone
+        self.f_usage_boost = None
+        self.build_steps = self.iter_build_steps()
+        if b_build:
+            self.build_index()
+
+    def index_names(self):
+        """ Yield (name, text to index) for every emoji in the DB """
+        if self.annotations is None:
+            for s_group in self.emo.d_emojis:
+                for s_name, d_emoji in self.emo.d_emojis[s_group].items():
+                    yield s_name, f"{s_name} {s_group} {d_emoji.sub_group}"
+            return
+        keywords = self.annotations.keywords
+        for s_group in self.emo.d_emojis:
+            for s_name, d_emoji in self.emo.d_emojis[s_group].items():
+                yield s_name, f"{s_name} {s_group} {d_emoji.sub_group} " \
+                              f"{' '.join(keywords(d_emoji.emoji))}"
+
+    def iter_build_keyword_names(self, i_chunk=BUILD_STEP_NAMES):
+        """ Index which emojis have each keyword, for ranking a query
+        that is exactly a keyword. Yields after every i_chunk emojis """
+        d_keyword_names = {}
+        if self.annotations is not None:
+            keywords = self.annotations.keywords
+            d_normalized = {}   # keywords repeat, so normalize each once
+            for i_count, d_emoji in enumerate(self.emo.l_records, 1):
+                if i_count % i_chunk == 0:
+                    yield True
+                for s_keyword in keywords(d_emoji.emoji):
+                    s_normalized = d_normalized.get(s_keyword)
+                    if s_normalized is None:
+                        s_normalized = d_normalized[s_keyword] = \
+                            normalize(s_keyword)
+                    d_keyword_names.setdefault(s_normalized,
+                                               []).append(d_emoji.name)
+        self.d_keyword_names = d_keyword_names
+
+    def build_index(self):
+        """ Finish building the index, however far along it is """
+        for _ in self.build_steps:
+            pass
+
+    @emojam_profile.timed('search.build_step')
+    def build_step(self):
+        """ Do one small chunk of index building. Returns False once the
+        index is complete. Lets the GUI build it a bit at a time, while idle """
+        return next(self.build_steps, None) is not None
+
+    def iter_build_steps(self, i_chunk=BUILD_STEP_NAMES,
+                         i_merges=BUILD_STEP_MERGES):
+        """ Build the index, yielding after every i_chunk emojis indexed, and
+        after about every i_merges set members merged """
+        if self.annotations is not None:
+            yield from self.annotations.iter_load()
+        yield from self.iter_build_keyword_names(i_chunk)
+        for i_count, (s_name, s_text) in enumerate(self.index_names(), 1):
+            for s_token in tokenize(s_text):
+                self.d_index.setdefault(s_token, set()).add(s_name)
+            s_normalized = normalize(s_name)
+            self.d_normalized[s_name] = s_normalized
+            for s_token in s_normalized.split(' '):
+                self.d_name_index.setdefault(s_token, set()).add(s_name)
+            s_name_trigrams = trigrams(s_normalized)
+            self.d_name_trigram_count[s_name] = len(s_name_trigrams)
+            for s_trigram in s_name_trigrams:
+                self.d_name_trigrams.setdefault(s_trigram, []).append(s_name)
+            if i_count % i_chunk == 0:
+                yield True
+        # A token's names are merged into every node along it, which adds up
+        # for common keywords, so count the work and yield in between nodes
+        i_work = 0
+        for s_token, names in self.d_index.items():
+            for s_trigram in trigrams(s_token):
+                self.d_token_trigrams.setdefault(s_trigram, []).append(s_token)
+            node = self.trie
+            for s_char in s_token:
+                node = node.children.setdefault(s_char, TrieNode())
+                node.names |= names
+                i_work += len(names)
+                if i_work >= i_merges:
+                    i_work = 0
+                    yield True
+        # freeze everything, so query results can be handed out directly
+        for s_token, names in self.d_index.items():
+            self.d_index[s_token] = frozenset(names)
+            i_work += len(names)
+            if i_work >= i_merges:
+                i_work = 0
+                yield True
+        l_nodes = [self.trie]
+        while l_nodes:
+            node = l_nodes.pop()
+            node.names = frozenset(node.names)
+            l_nodes.extend(node.children.values())
+            i_work += len(node.names) + 1
+            if i_work >= i_merges:
+                i_work = 0
+                yield True
+        self.b_ready = True
+
+    def prefix_matches(self, s_prefix: str):
+        """ Return names with any token starting with s_prefix """
+        if not self.b_ready:
+            self.build_index()
+        node = self.trie
+        for s_char in s_prefix:
+            node = node.children.get(s_char)
+            if node is None:
+                return frozenset()
+        return node.names
+
+    def token_matches(self, s_token: str):
+        """ Return names with a token exactly equal to s_token """
+        return self.d_index.get(s_token, frozenset())
+
+    def query(self, s_query: str):
+        """ Return the set of emoji names matching every word in s_query, or
+        None if the query is empty (meaning: don't filter) """
+        l_words = tokenize(s_query)
+        if not l_words:
+            return None
+        return self.query_words(l_words)
+
+    def query_words(self, l_words):
+        """ Return the set of names matching every (tokenized) word """
+        if not self.b_ready:
+            self.build_index()
+        l_sets = sorted((self.prefix_matches(s_word) for s_word in l_words),
+                        key=len)
+        matches = l_sets[0]
+        for names in l_sets[1:]:
+            if not matches:
+                break
+            matches = matches & names
+        return matches
+
+    def similar(self, d_postings, s_text: str, f_size, b_typos=False):
+        """ Return {key: similarity} for keys in d_postings (trigram index)
+        whose trigrams overlap s_text enough. f_size(key) gives the number of
+        trigrams in a key. With b_typos, keys one typo away from s_text are
+        similar enough too """
+        s_trigrams = trigrams(s_text)
+        d_overlap = {}
+        for s_trigram in s_trigrams:
+            for key in d_postings.get(s_trigram, ()):
+                d_overlap[key] = d_overlap.get(key, 0) + 1
+        i_query_size = len(s_trigrams)
+        i_length = len(s_text)
+        d_similar = {}
+        for key, i_overlap in d_overlap.items():
+            f_dice = 2 * i_overlap / (i_query_size + f_size(key))
+            if b_typos and f_dice < TYPO_SIMILARITY and \
+                    -1 <= len(key) - i_length <= 1 and \
+                    one_typo_apart(s_text, key):
+                f_dice = TYPO_SIMILARITY
+            if f_dice >= FUZZY_THRESHOLD:
+                d_similar[key] = f_dice
+        return d_similar
+
+    @emojam_profile.timed('search.fuzzy_matches')
+    def fuzzy_matches(self, s_query: str):
+        """ Return {name: similarity} for names that roughly match s_query """
+        if not self.b_ready:
+            self.build_index()
+        l_words = tokenize(s_query)
+        s_normalized = ' '.join(l_words)
+        # whole name against whole query, good for swapped letters across
+        # words like "thumbs pu"
+        d_fuzzy = self.similar(self.d_name_trigrams, s_normalized,
+                               self.d_name_trigram_count.__getitem__)
+        # and word by word, good for "smilng"
+        d_words = None
+        for s_word in l_words:
+            d_word = dict.fromkeys(self.prefix_matches(s_word), 1.0)
+            if len(s_word) >= FUZZY_MIN_LENGTH:
+                d_tokens = self.similar(self.d_token_trigrams, s_word,
+                                        lambda s_token: len(s_token) + 2,
+                                        b_typos=True)
+                for s_token, f_similarity in d_tokens.items():
+                    in_name = self.d_name_index.get(s_token, ())
+                    f_other = f_similarity * OTHER_TOKEN_WEIGHT
+                    for s_name in self.d_index[s_token]:
+                        f_name_similarity = f_similarity \
+                            if s_name in in_name else f_other
+                        if d_word.get(s_name, 0) < f_name_similarity:
+                            d_word[s_name] = f_name_similarity
+            if d_words is None:
+                d_words = d_word
+            else:
+                d_words = {s_name: f_similarity + d_words[s_name]
+                           for s_name, f_similarity in d_word.items()
+                           if s_name in d_words}
+            if not d_words:
+                break
+        for s_name, f_total in (d_words or {}).items():
+            f_similarity = f_total / len(l_words)
+            if d_fuzzy.get(s_name, 0) < f_similarity:
+                d_fuzzy[s_name] = f_similarity
+        return d_fuzzy
+
+    def ranked_query(self, s_query: str):
+        """ Return a SearchResult for s_query, or None if the query is empty
+        (meaning: don't filter) """
+        l_words, l_terms = parse_query(s_query)
+        if l_terms:
+            return self.ranked_terms_query(l_words, l_terms)
+        if not l_words:
+            return None
+        return self.score_matches(l_words, self.query_words(l_words))
+
+    @emojam_profile.timed('search.term_matches')
+    def term_matches(self, l_terms):
+        """ Return {name: record} for emojis matching every codepoint and
+        version term (see parse_query) """
+        d_matches = None
+        for t_term in l_terms:
+            if t_term[0] == 'codepoint':
+                records = self.emo.codepoints_starting(t_term[1])
+            else:
+                records = self.emo.versions_matching(t_term[1], t_term[2])
+            d_term = {d_emoji.name: d_emoji for d_emoji in records
+                      if d_matches is None or d_emoji.name in d_matches}
+            d_matches = d_term
+            if not d_matches:
+                break
+        return d_matches
+
+    def ranked_terms_query(self, l_words, l_terms):
+        """ Return a SearchResult for words and terms from parse_query,
+        when there are terms. Words rank as usual among the term matches.
+        Without words, an exact codepoint comes first, then shorter codepoint
+        sequences """
+        d_matches = self.term_matches(l_terms)
+        if l_words:
+            return self.score_matches(
+                    l_words, self.query_words(l_words) & d_matches.keys(),
+                    d_matches)
+        set_exact = {t_term[1] for t_term in l_terms
+                     if t_term[0] == 'codepoint'}
+        d_scores = {}
+        for s_name, d_emoji in d_matches.items():
+            i_tier = TIER_EXACT if d_emoji.codepoint in set_exact else \
+                TIER_TOKEN
+            f_boost = self.f_usage_boost(s_name) if self.f_usage_boost else 0
+            d_scores[s_name] = i_tier + f_boost * 0.5 + \
+                0.5 / (2 + len(d_emoji.codepoint))
+        return SearchResult(d_scores)
+
+    @emojam_profile.timed('search.score_matches')
+    def score_matches(self, l_words, strict_matches, allowed=None):
+        """ Rank strict_matches (names matching l_words as token prefixes)
+        and add fuzzy matches for l_words, returning a SearchResult. If
+        allowed (a collection of names) is given, fuzzy matches outside it
+        are left out """
+        s_normalized = ' '.join(l_words)
+        d_scores = {}
+        if len(s_normalized.replace(' ', '')) >= FUZZY_MIN_LENGTH:
+            for s_name, f_similarity in \
+                    self.fuzzy_matches(s_normalized).items():
+                if allowed is not None and s_name not in allowed:
+                    continue
+                d_scores[s_name] = self.fuzzy_score(
+                        s_name, self.d_normalized[s_name], f_similarity)
+        for s_name in strict_matches:
+            d_scores[s_name] = self.strict_score(
+                    s_name, self.d_normalized[s_name], s_normalized)
+        return SearchResult(d_scores)
+
+    def strict_score(self, s_name, s_name_normalized, s_normalized):
+        """ Score a name that matches every query word as a token prefix """
+        if s_name_normalized == s_normalized:
+            i_tier = TIER_EXACT
+        elif s_name in self.d_keyword_names.get(s_normalized, ()):
+            i_tier = TIER_KEYWORD
+        elif s_name_normalized.startswith(s_normalized):
+            i_tier = TIER_PREFIX
+        else:
+            i_tier = TIER_TOKEN
+        f_boost = self.f_usage_boost(s_name) if self.f_usage_boost else 0
+        # most used, then shorter names first within a tier
+        return i_tier + f_boost * 0.5 + 0.5 / (2 + len(s_name_normalized))
+
+    def fuzzy_score(self, s_name, s_name_normalized, f_similarity):
+        """ Score a fuzzy match. Never reaches the next tier up """
+        f_boost = self.f_usage_boost(s_name) if self.f_usage_boost else 0
+        return TIER_FUZZY + f_similarity * 0.8 + f_boost * 0.1 + \
+            0.09 / (2 + len(s_name_normalized))
+
+    @emojam_profile.timed('search.scan_query')
+    def scan_query(self, s_query: str):
+        """ Like ranked_query, but scan the DB instead of using the index.
+        Slower per query, but there's nothing to build first, so it is the
+        quick way to run a single query (from the command line) """
+        l_words, l_terms = parse_query(s_query)
+        if self.d_keyword_names is None:
+            for _ in self.iter_build_keyword_names():
+                pass
+        rows = self.index_names()
+        if l_terms:
+            if not l_words:
+                return self.ranked_terms_query(l_words, l_terms)
+            # only scan what the terms let through
+            d_matches = self.term_matches(l_terms)
+            rows = [(s_name, s_text) for s_name, s_text in rows
+                    if s_name in d_matches]
+            if not rows:
+                return SearchResult({})
+        if not l_words:
+            return None
+        s_normalized = ' '.join(l_words)
+        b_fuzzy = len(s_normalized.replace(' ', '')) >= FUZZY_MIN_LENGTH
+        l_names, l_texts = zip(*rows)
+        # The per-name work has to stay in regexes and set operations to be
+        # quick, so everything that can be is done up front, over the
+        # vocabulary or all names at once
+        l_normalized = NORMALIZE_LINES_RE.sub(
+                '\n', NON_WORD_RE.sub(' ', '\n'.join(l_names).lower())
+                ).strip(' ').split('\n')
+        # a word matches strictly if some token starts with it
+        l_strict_res = [re.compile(r'(?<!\w)' + s_word)
+                        for s_word in l_words]
+        l_fuzzy_res = []    # and roughly if a token is similar enough
+        l_word_tokens = []  # per word, {token: similarity}
+        if b_fuzzy:
+            vocabulary = set(TOKEN_RE.findall('\n'.join(l_texts).lower()))
+            for s_word in l_words:
+                d_tokens = {}
+                s_word_trigrams = trigrams(s_word)
+                for s_token in vocabulary:
+                    if s_token.startswith(s_word):
+                        d_tokens[s_token] = 1.0
+                    elif len(s_word) >= FUZZY_MIN_LENGTH:
+                        f_similarity = self.token_similarity(
+                                s_word, s_word_trigrams, s_token)
+                        if f_similarity:
+                            d_tokens[s_token] = f_similarity
+                l_word_tokens.append(d_tokens)
+                l_fuzzy_res.append(re.compile(
+                        r'(?<!\w)(?:%s)(?!\w)' % '|'.join(sorted(
+                                d_tokens, key=len, reverse=True))
+                        if d_tokens else r'(?!)'))
+            s_query_trigrams = trigrams(s_normalized)
+            query_trigram_re = re.compile('|'.join(
+                    re.escape(s_trigram) for s_trigram in s_query_trigrams))
+        d_scores = {}
+        for s_name, s_text, s_name_normalized in zip(l_names, l_texts,
+                                                     l_normalized):
+            s_text = s_text.lower()
+            if all(word_re.search(s_text) for word_re in l_strict_res):
+                d_scores[s_name] = self.strict_score(
+                        s_name, s_name_normalized, s_normalized)
+                continue
+            if not b_fuzzy:
+                continue
+            # the same two measures as fuzzy_matches. Whole name against
+            # whole query first
+            f_similarity = 0
+            s_padded = f' {s_name_normalized} '
+            if query_trigram_re.search(s_padded):
+                i_overlap = sum(s_trigram in s_padded
+                                for s_trigram in s_query_trigrams)
+                f_similarity = 2 * i_overlap / (
+                        len(s_query_trigrams) + len(trigrams(s_name_normalized)))
+                if f_similarity < FUZZY_THRESHOLD:
+                    f_similarity = 0
+            # then word by word, averaging each word's best token
+            if all(word_re.search(s_text) for word_re in l_fuzzy_res):
+                tokens = set(TOKEN_RE.findall(s_text))
+                name_tokens = set(s_name_normalized.split())
+                f_words_total = 0
+                for d_tokens in l_word_tokens:
+                    f_words_total += max(
+                            d_tokens[s_token] if s_token in name_tokens or
+                            d_tokens[s_token] == 1.0 else
+                            d_tokens[s_token] * OTHER_TOKEN_WEIGHT
+                            for s_token in tokens.intersection(d_tokens))
+                f_similarity = max(f_similarity, f_words_total / len(l_words))
+            if f_similarity:
+                d_scores[s_name] = self.fuzzy_score(
+                        s_name, s_name_normalized, f_similarity)
+        return SearchResult(d_scores)
+
+    def token_similarity(self, s_word: str, s_word_trigrams, s_token: str):
+        """ Trigram similarity of a word to a token, as similar() would
+        score it with b_typos, or 0 if below FUZZY_THRESHOLD """
+        i_overlap = len(s_word_trigrams & trigrams(s_token))
+        if not i_overlap:   # similar() never sees these
+            return 0
+        f_similarity = 2 * i_overlap / \
+            (len(s_word_trigrams) + len(s_token) + 2)
+        if f_similarity < TYPO_SIMILARITY and one_typo_apart(s_word, s_token):
+            f_similarity = TYPO_SIMILARITY
+        return f_similarity if f_similarity >= FUZZY_THRESHOLD else 0
+
+
+class SearchSession:
+    """ Runs queries as the user types. If the new query only extends the
+    last one, its strict matches are narrowed down from the last result
+    instead of being computed from scratch """
+
+    def __init__(self, search: EmojiSearch):
+        self.search = search
+        self.l_words = []
+        self.strict_matches = None
+
+    def narrows(self, l_words):
+        """ True if l_words can only match a subset of self.l_words """
+        i_last = len(self.l_words) - 1
+        if i_last < 0 or len(l_words) <= i_last:
+            return False
+        return l_words[:i_last] == self.l_words[:i_last] and \
+            l_words[i_last].startswith(self.l_words[i_last])
+
+    @emojam_profile.timed('search.session_query')
+    def query(self, s_query: str):
+        """ Return a SearchResult for s_query, or None if it is empty """
+        l_words, l_terms = parse_query(s_query)
+        if l_terms:     # range scans are quick, so just run it
+            self.l_words = []
+            self.strict_matches = None
+            return self.search.ranked_terms_query(l_words, l_terms)
+        if not l_words:
+            self.l_words = []
+            self.strict_matches = None
+            return None
+        if self.narrows(l_words):
+            matches = self.strict_matches
+            for i_word, s_word in enumerate(l_words):
+                if not matches:
+                    break
+                if i_word >= len(self.l_words) or \
+                        s_word != self.l_words[i_word]:
+                    matches = matches & self.search.prefix_matches(s_word)
+        else:   # deleted or edited, start over
+            matches = self.search.query_words(l_words)
+        self.l_words = l_words
+        self.strict_matches = matches
+        return self.search.score_matches(l_words, matches)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+# CSS styling for the picker window.
+#
+# The stylesheet is split by role: "base" (fonts, and highlight colors taken
+# from the GTK theme) and "zoom" (the emoji font size). Each role has exactly
+# one Gtk.CssProvider, added to the screen once. Restyling loads new data
+# into the existing provider instead of stacking another one on top. The
+# generated CSS is cached, base per theme and zoom per size, so flipping back
+# to a theme or zoom level doesn't build it again.
+#
+# Zoom changes are coalesced: a burst of zoom clicks within ZOOM_SETTLE_MS
+# becomes a single restyle, at the latest size.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import gi
+
+import emojam.emojam_profile as emojam_profile
+
+gi.require_version("Gtk", "3.0")
+
+from gi.repository import Gtk, Gdk, GLib
+
+ZOOM_SETTLE_MS = 50     # zoom clicks this close together restyle once
+
+BASE_CSS = """
+    .group-button {
+        font-family: Noto Color Emoji;
+        font-size: 90%%;
+    }
+    .output-field {
+        font-family: Noto Color Emoji;
+    }
+    .variant-button {
+        font-family: Noto Color Emoji;
+        font-size: 200%%;
+    }
+    .highlighted {
+        border-radius: 10px;
+        background-color: %(highlight)s;
+        text-shadow: 1px 1px 3px black;
+    }
+    .selected-group {
+        border-radius: 5px;
+        background-color: %(highlight)s;
+        text-shadow: 1px 1px 2px black;
+    }
+    .hovered-group {
+        border-radius: 5px;
+        background-color: %(highlight_faint)s;
+        text-shadow: 1px 1px 2px black;
+    }
+    """
+
+ZOOM_CSS = """
+    .emoji-button {
+        font-family: Noto Color Emoji;
+        font-size: %i%%;
+    }
+    """
+
+
+class StyleManager:
+    """ Owns the picker's CSS providers, one per role """
+
+    def __init__(self, widget, i_font_size: int, restyled=None):
+        """ widget is any of our widgets, for looking up theme colors.
+        restyled() is called after a zoom change has been applied """
+        self.widget = widget
+        self.restyled = restyled
+        self.d_base_css = {}    # (theme name, dark): css
+        self.d_zoom_css = {}    # font size: css
+        self.base_provider = Gtk.CssProvider()
+        self.zoom_provider = Gtk.CssProvider()
+        screen = Gdk.Screen.get_default()
+        for provider in (self.base_provider, self.zoom_provider):
+            Gtk.StyleContext.add_provider_for_screen(
+                    screen, provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
+        self.t_theme = None
+        self.i_font_size = None
+        self.i_pending_font_size = None
+        self.zoom_source = None
+        self.apply_font_size(i_font_size)
+        self.update_theme()
+
+    def theme_key(self):
+        settings = Gtk.Settings.get_default()
+        return (settings.get_property("gtk-theme-name"),
+                settings.get_property("gtk-application-prefer-dark-theme"))
+
+    def make_base_css(self):
+        """ Base CSS, with highlights in the theme's selection color """
+        style_context = self.widget.get_style_context()
+        b_found, selected_bg_color = style_context.lookup_color(
+                'theme_selected_bg_color')
+        if not b_found:     # theme doesn't say, use Adwaita's
+            selected_bg_color = Gdk.RGBA()
+            selected_bg_color.parse('#3584e4')
+        s_highlight = selected_bg_color.to_string()
+        selected_bg_color.alpha = 0.5
+        return BASE_CSS % {'highlight': s_highlight,
+                           'highlight_faint': selected_bg_color.to_string()}
+
+    @emojam_profile.timed('style.update_theme')
+    def update_theme(self):
+        """ Restyle for the current GTK theme, if it changed """
+        t_theme = self.theme_key()
+        if t_theme == self.t_theme:
+            return
+        self.t_theme = t_theme
+        s_css = self.d_base_css.get(t_theme)
+        if s_css is None:
+            s_css = self.d_base_css[t_theme] = self.make_base_css()
+        self.base_provider.load_from_data(s_css.encode())
+
+    def set_font_size(self, i_font_size: int):
+        """ Zoom the emojis to i_font_size percent. Applied once clicks
+        settle, see ZOOM_SETTLE_MS """
+        self.i_pending_font_size = i_font_size
+        if self.zoom_source is None:
+            self.zoom_source = GLib.timeout_add(ZOOM_SETTLE_MS,
+                                                self.apply_pending_font_size)
+
+    def apply_pending_font_size(self):
+        self.zoom_source = None
+        self.apply_font_size(self.i_pending_font_size)
+        if self.restyled is not None:
+            self.restyled()
+        return GLib.SOURCE_REMOVE
+
+    @emojam_profile.timed('style.apply_font_size')
+    def apply_font_size(self, i_font_size: int):
+        if i_font_size == self.i_font_size:
+            return
+        self.i_font_size = i_font_size
+        s_css = self.d_zoom_css.get(i_font_size)
+        if s_css is None:
+            s_css = self.d_zoom_css[i_font_size] = ZOOM_CSS % i_font_size
+        self.zoom_provider.load_from_data(s_css.encode())
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+# Emojize and demojize text, a chunk at a time.
+#
+# Emojize turns :shortcodes: into emojis. A shortcode is an emoji's name in
+# lower case with underscores for spaces, eg: :thumbs_up:, :keycap_hash:.
+# Demojize does the reverse, finding emojis with an Aho-Corasick automaton
+# over every form of every emoji in the DB, so multi-codepoint emojis (ZWJ
+# sequences, flags, skin tones) are recognized whole: the longest emoji
+# starting leftmost wins.
+#
+# Both work on a stream: feed() takes the next chunk of text and returns the
+# converted text it's sure about, holding back only the few characters that
+# could still be part of a shortcode or emoji. So memory use doesn't grow
+# with the input, and chunks can split anywhere.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import re
+
+import emojam.emojam_profile as emojam_profile
+
+CHUNK_SIZE = 64 * 1024  # bytes read per chunk by the emojam filters
+SHORTCODE_RE = re.compile(r':([\w+\-]+)(?=:)')
+SHORTCODE_TAIL_RE = re.compile(r':[\w+\-]*')
+NON_SHORTCODE_RE = re.compile(r'[^\w+\-]+')
+# symbols that appear in emoji names, spelled out for shortcodes
+SHORTCODE_WORDS = {'#': ' hash ', '*': ' asterisk '}
+VARIATION_SELECTOR = '\uFE0F'
+
+
+def shortcode_for(s_emoji_name: str):
+    """ Take an emoji name, return its shortcode (without colons) """
+    s_shortcode = s_emoji_name.lower()
+    for s_symbol, s_word in SHORTCODE_WORDS.items():
+        s_shortcode = s_shortcode.replace(s_symbol, s_word)
+    return NON_SHORTCODE_RE.sub('_', s_shortcode).strip('_')
+
+
+def character_class(characters):
+    """ Compile a regex matching any of characters. Runs of consecutive
+    codepoints become ranges, which re matches much faster than a long list
+    of single characters """
+    l_ranges = []   # [first, last] codepoints
+    for i_codepoint in sorted(map(ord, characters)):
+        if l_ranges and l_ranges[-1][1] == i_codepoint - 1:
+            l_ranges[-1][1] = i_codepoint
+        else:
+            l_ranges.append([i_codepoint, i_codepoint])
+    return re.compile('[' + ''.join(
+            re.escape(chr(i_first)) if i_first == i_last else
+            f'{re.escape(chr(i_first))}-{re.escape(chr(i_last))}'
+            for i_first, i_last in l_ranges) + ']')
+
+
+class EmojiText:
+    """ Shortcode table and emoji automaton for a DB. Make Emojizer and
+    Demojizer streams from it """
+
+    @emojam_profile.timed('text.build')
+    def __init__(self, emo):
+        self.d_emojis = {}          # shortcode: emoji
+        self.d_shortcodes = {}      # any form of an emoji: ':shortcode:'
+        for emoji_record in emo.l_records:
+            s_shortcode = shortcode_for(emoji_record.name)
+            self.d_emojis.setdefault(s_shortcode, emoji_record.emoji)
+        for s_emoji, emoji_record in emo.d_by_emoji.items():
+            # A lone character that has an emoji form with a variation
+            # selector is the text form (eg: (c), TM), so leave it be
+            if len(s_emoji) == 1 and \
+                    s_emoji + VARIATION_SELECTOR in emo.d_by_emoji:
+                continue
+            self.d_shortcodes[s_emoji] = \
+                f':{shortcode_for(emoji_record.name)}:'
+        self.i_max_shortcode = max(map(len, self.d_emojis), default=0)
+        self.build_automaton(self.d_shortcodes)
+
+    def build_automaton(self, patterns):
+        """ Aho-Corasick automaton: a trie of the patterns, with failure
+        links to the longest proper suffix that's also in the trie """
+        self.l_goto = [{}]      # state: {character: next state}
+        self.l_depth = [0]      # state: length of the text it stands for
+        l_ends = [0]            # state: length of the pattern ending there
+        for s_pattern in patterns:
+            i_state = 0
+            for s_char in s_pattern:
+                i_next = self.l_goto[i_state].get(s_char)
+                if i_next is None:
+                    i_next = len(self.l_goto)
+                    self.l_goto[i_state][s_char] = i_next
+                    self.l_goto.append({})
+                    self.l_depth.append(self.l_depth[i_state] + 1)
+                    l_ends.append(0)
+                i_state = i_next
+            l_ends[i_state] = len(s_pattern)
+        # breadth first, so a state's failure link is done before its
+        # children's
+        self.l_fail = [0] * len(self.l_goto)
+        # state: lengths of every pattern ending there, longest first
+        self.l_matches = [()] * len(self.l_goto)
+        l_queue = list(self.l_goto[0].values())
+        for i_state in l_queue:
+            self.l_matches[i_state] = (l_ends[i_state],) \
+                if l_ends[i_state] else ()
+        for i_state in l_queue:
+            for s_char, i_next in self.l_goto[i_state].items():
+                i_fail = self.l_fail[i_state]
+                while i_fail and s_char not in self.l_goto[i_fail]:
+                    i_fail = self.l_fail[i_fail]
+                i_fail = self.l_goto[i_fail].get(s_char, 0)
+                self.l_fail[i_next] = i_fail
+                t_own = (l_ends[i_next],) if l_ends[i_next] else ()
+                self.l_matches[i_next] = t_own + self.l_matches[i_fail]
+                l_queue.append(i_next)
+        # text from the root state can be skipped up to one of these
+        self.first_char_re = character_class(self.l_goto[0])
+
+    def emojize(self, s_text: str):
+        """ Convert a whole string's :shortcodes: to emojis """
+        emojizer = Emojizer(self)
+        return emojizer.feed(s_text) + emojizer.close()
+
+    def demojize(self, s_text: str):
+        """ Convert a whole string's emojis to :shortcodes: """
+        demojizer = Demojizer(self)
+        return demojizer.feed(s_text) + demojizer.close()
+
+
+class Emojizer:
+    """ Stream converting :shortcodes: to emojis """
+
+    def __init__(self, text_engine):
+        self.d_emojis = text_engine.d_emojis
+        self.i_max_held = text_engine.i_max_shortcode + 1
+        self.s_held = ''    # could be the start of a shortcode
+
+    def feed(self, s_chunk: str):
+        """ Convert the next chunk, return what's ready """
+        s_text = self.s_held + s_chunk
+        l_out = []
+        i_pos = 0
+        while True:
+            match = SHORTCODE_RE.search(s_text, i_pos)
+            if match is None:
+                break
+            s_emoji = self.d_emojis.get(match.group(1).lower())
+            if s_emoji is None:
+                # not a shortcode, but its closing colon could start one
+                l_out.append(s_text[i_pos:match.end()])
+                i_pos = match.end()
+            else:
+                l_out.append(s_text[i_pos:match.start()])
+                l_out.append(s_emoji)
+                i_pos = match.end() + 1     # past the closing colon
+        # hold back an unfinished shortcode at the end
+        i_hold = s_text.rfind(':', i_pos)
+        if i_hold != -1 and len(s_text) - i_hold <= self.i_max_held and \
+                SHORTCODE_TAIL_RE.fullmatch(s_text, i_hold):
+            self.s_held = s_text[i_hold:]
+        else:
+            i_hold = len(s_text)
+            self.s_held = ''
+        l_out.append(s_text[i_pos:i_hold])
+        return ''.join(l_out)
+
+    def close(self):
+        """ End of the stream: return whatever was held back """
+        s_held, self.s_held = self.s_held, ''
+        return s_held
+
+
+class Demojizer:
+    """ Stream converting emojis to :shortcodes:, longest leftmost match
+    first """
+
+    def __init__(self, text_engine):
+        self.text_engine = text_engine
+        self.s_held = ''        # text that could still be part of a match
+        self.i_state = 0        # automaton state at the end of s_held
+        # best match so far that could still grow, (start, end) in s_held
+        self.t_pending = None
+
+    @emojam_profile.timed('text.demojize_feed')
+    def feed(self, s_chunk: str):
+        """ Convert the next chunk, return what's ready """
+        text_engine = self.text_engine
+        l_goto = text_engine.l_goto
+        l_fail = text_engine.l_fail
+        l_depth = text_engine.l_depth
+        l_matches = text_engine.l_matches
+        d_shortcodes = text_engine.d_shortcodes
+        skip_to = text_engine.first_char_re.search
+        s_text = self.s_held + s_chunk
+        i_end = len(s_text)
+        i_pos = len(self.s_held)
+        i_state = self.i_state
+        t_pending = self.t_pending
+        i_emitted = 0       # s_text up to here is in l_out
+        l_out = []
+        while i_pos < i_end:
+            if not i_state and t_pending is None:
+                match = skip_to(s_text, i_pos)
+                if match is None:
+                    i_pos = i_end
+                    break
+                i_pos = match.start()
+            s_char = s_text[i_pos]
+            while i_state and s_char not in l_goto[i_state]:
+                i_state = l_fail[i_state]
+            i_state = l_goto[i_state].get(s_char, 0)
+            i_pos += 1
+            # the longest emoji ending here
+            t_lengths = l_matches[i_state]
+            if t_lengths:
+                i_start = i_pos - t_lengths[0]
+                if t_pending is None or i_start <= t_pending[0]:
+                    t_pending = (i_start, i_pos)
+            # convert the pending match once nothing can start at or
+            # before it any more
+            if t_pending is not None and \
+                    t_pending[0] < i_pos - l_depth[i_state]:
+                i_start, i_stop = t_pending
+                l_out.append(s_text[i_emitted:i_start])
+                l_out.append(d_shortcodes[s_text[i_start:i_stop]])
+                # matches after it were skipped while it was pending, so
+                # scan again from its end
+                i_emitted = i_pos = i_stop
+                i_state = 0
+                t_pending = None
+        # hold back what could still be part of a match
+        i_hold = max(i_emitted, i_end - l_depth[i_state])
+        if t_pending is not None:
+            i_hold = min(i_hold, t_pending[0])
+            t_pending = (t_pending[0] - i_hold, t_pending[1] - i_hold)
+        l_out.append(s_text[i_emitted:i_hold])
+        self.s_held = s_text[i_hold:]
+        self.i_state = i_state
+        self.t_pending = t_pending
+        return ''.join(l_out)
+
+    def close(self):
+        """ End of the stream: convert and return whatever was held
+        back """
+        d_shortcodes = self.text_engine.d_shortcodes
+        l_out = []
+        while self.s_held:
+            s_held = self.s_held
+            if self.t_pending is not None:
+                i_start, i_stop = self.t_pending
+                l_out.append(s_held[:i_start])
+                l_out.append(d_shortcodes[s_held[i_start:i_stop]])
+            else:
+                # the held text only starts an emoji that never finished,
+                # so its first character is plain text
+                i_stop = 1
+                l_out.append(s_held[0])
+            # the rest can't overlap what's out, so scan it afresh
+            self.s_held, self.i_state, self.t_pending = '', 0, None
+            l_out.append(self.feed(s_held[i_stop:]))
+        return ''.join(l_out)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+# Emoji usage tracking, for the Recently Used view and search ranking.
+#
+# Every pick is appended to a journal file, usage.log, next to emojam.ini.
+# In memory, each emoji picked so far has a frecency score: every pick adds 1,
+# and the score halves every HALF_LIFE seconds. Scores are stored as of the
+# emoji's last pick, so recording a pick is O(1) and nothing has to be decayed
+# in the background. Entries are also kept in least-recently-used order.
+#
+# Journal lines are tab separated:
+#   p <time> <name>              a pick
+#   s <time> <score> <name>      compacted state: score as of <time>
+# Once the journal has COMPACT_AFTER more picks in it than entries, it is
+# rewritten as one "s" line per emoji. Like the config file, journal writes
+# are batched and done from a background thread.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import atexit
+import collections
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import emojam.emojam_profile as emojam_profile
+
+HALF_LIFE = 7 * 24 * 60 * 60    # a week, in seconds
+MAX_ENTRIES = 1000              # forget the least used beyond this
+COMPACT_AFTER = 500             # journal picks allowed before compacting
+WRITE_DELAY = 0.5               # seconds to batch journal writes for
+
+
+class UsageTracker:
+    """ Frecency scores and LRU order for picked emojis, backed by an
+    append-only journal """
+
+    def __init__(self, s_journal_path: str):
+        self.s_journal_path = s_journal_path
+        # name: [score, time of score], least recently used first
+        self.d_entries = collections.OrderedDict()
+        self.i_journal_lines = 0
+        self.l_pending_lines = []
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()  # one journal writer at a time
+        self.write_timer = None
+        self.b_atexit_registered = False
+
+    def load(self):
+        """ Replay the journal into memory """
+        try:
+            f_journal = open(self.s_journal_path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f_journal:
+            for s_line in f_journal:
+                l_fields = s_line.rstrip('\n').split('\t')
+                try:
+                    if l_fields[0] == 'p' and len(l_fields) == 3:
+                        self.apply_pick(l_fields[2], float(l_fields[1]))
+                    elif l_fields[0] == 's' and len(l_fields) == 4:
+                        self.d_entries[l_fields[3]] = [float(l_fields[2]),
+                                                       float(l_fields[1])]
+                        self.d_entries.move_to_end(l_fields[3])
+                    else:
+                        continue    # damaged line, skip it
+                except ValueError:
+                    continue
+                self.i_journal_lines += 1
+
+    def is_empty(self):
+        return not self.d_entries
+
+    def seed(self, l_names, f_now=None):
+        """ Start from a list of names, most recently used first, as if
+        they'd been picked a second apart, and save them to the journal as
+        a compacted state """
+        if f_now is None:
+            f_now = time.time()
+        with self.lock:
+            # oldest first, so the LRU order comes out right
+            for i_age in range(len(l_names) - 1, -1, -1):
+                if l_names[i_age]:
+                    self.apply_pick(l_names[i_age], f_now - i_age)
+            l_snapshot = [(s_name, list(entry))
+                          for s_name, entry in self.d_entries.items()]
+        with self.write_lock:
+            try:
+                os.makedirs(os.path.dirname(self.s_journal_path),
+                            exist_ok=True)
+                self.compact(l_snapshot)
+            except OSError as err:
+                print(f"Emojam: couldn't save usage: {err}", file=sys.stderr)
+
+    def apply_pick(self, s_emoji_name: str, f_time: float):
+        entry = self.d_entries.get(s_emoji_name)
+        if entry is None:
+            self.d_entries[s_emoji_name] = [1.0, f_time]
+        elif f_time >= entry[1]:
+            entry[0] = entry[0] * 0.5 ** ((f_time - entry[1]) / HALF_LIFE) + 1
+            entry[1] = f_time
+            self.d_entries.move_to_end(s_emoji_name)
+        else:   # clock went backwards, count it as of the newer time
+            entry[0] += 0.5 ** ((entry[1] - f_time) / HALF_LIFE)
+
+    @emojam_profile.timed('usage.record_pick')
+    def record_pick(self, s_emoji_name: str, f_time=None):
+        """ Count a pick of s_emoji_name, and queue it for the journal """
+        if f_time is None:
+            f_time = time.time()
+        with self.lock:
+            self.apply_pick(s_emoji_name, f_time)
+            self.l_pending_lines.append(f'p\t{f_time:.0f}\t{s_emoji_name}\n')
+            if self.write_timer is None:
+                self.write_timer = threading.Timer(WRITE_DELAY, self.flush)
+                self.write_timer.daemon = True
+                self.write_timer.start()
+            if not self.b_atexit_registered:
+                atexit.register(self.flush)
+                self.b_atexit_registered = True
+
+    def frecency(self, s_emoji_name: str, f_now=None):
+        """ Return the decayed score of s_emoji_name, 0 if never picked """
+        entry = self.d_entries.get(s_emoji_name)
+        if entry is None:
+            return 0.0
+        if f_now is None:
+            f_now = time.time()
+        return entry[0] * 0.5 ** (max(0, f_now - entry[1]) / HALF_LIFE)
+
+    def boost(self, s_emoji_name: str):
+        """ Frecency squashed into 0 <= boost < 1, for ranking """
+        f_frecency = self.frecency(s_emoji_name)
+        return f_frecency / (f_frecency + 1)
+
+    def most_recent(self, i_limit=None):
+        """ Return picked names, most recently used first """
+        l_names = []
+        with self.lock:
+            for s_emoji_name in reversed(self.d_entries):
+                if i_limit is not None and len(l_names) >= i_limit:
+                    break
+                l_names.append(s_emoji_name)
+        return l_names
+
+    def ranked(self, i_limit=None):
+        """ Return picked names, highest frecency first """
+        f_now = time.time()
+        with self.lock:
+            l_names = list(self.d_entries)
+        l_names.sort(key=lambda s_name: self.frecency(s_name, f_now),
+                     reverse=True)
+        return l_names[:i_limit]
+
+    def flush(self):
+        """ Append pending picks to the journal, compacting it if it has
+        grown too long """
+        with self.write_lock:
+            self.write_pending()
+
+    @emojam_profile.timed('usage.write_journal')
+    def write_pending(self):
+        with self.lock:
+            self.write_timer = None
+            l_lines = self.l_pending_lines
+            self.l_pending_lines = []
+            b_compact = self.i_journal_lines + len(l_lines) > \
+                len(self.d_entries) + COMPACT_AFTER
+            if b_compact:
+                l_snapshot = [(s_name, list(entry))
+                              for s_name, entry in self.d_entries.items()]
+        try:
+            os.makedirs(os.path.dirname(self.s_journal_path), exist_ok=True)
+            if b_compact:
+                self.compact(l_snapshot)
+            elif l_lines:
+                with open(self.s_journal_path, 'a', encoding='utf-8') as \
+                        f_journal:
+                    f_journal.writelines(l_lines)
+                self.i_journal_lines += len(l_lines)
+        except OSError as err:
+            # keep them for the next flush to try again
+            with self.lock:
+                self.l_pending_lines[0:0] = l_lines
+            print(f"Emojam: couldn't save usage: {err}", file=sys.stderr)
+
+    def compact(self, l_snapshot):
+        """ Rewrite the journal as one state line per emoji, dropping the
+        least used beyond MAX_ENTRIES """
+        f_now = time.time()
+        if len(l_snapshot) > MAX_ENTRIES:
+            def frecency_of(t_item):
+                f_score, f_time = t_item[1]
+                return f_score * 0.5 ** (max(0, f_now - f_time) / HALF_LIFE)
+            keep = {s_name for s_name, entry in
+                    sorted(l_snapshot, key=frecency_of)[-MAX_ENTRIES:]}
+            l_snapshot = [t_item for t_item in l_snapshot if t_item[0] in keep]
+            with self.lock:
+                for s_name in list(self.d_entries):
+                    if s_name not in keep:
+                        del self.d_entries[s_name]
+        i_temp_fd, s_temp_path = tempfile.mkstemp(
+                prefix='.usage.', suffix='.tmp',
+                dir=os.path.dirname(self.s_journal_path))
+        try:
+            with os.fdopen(i_temp_fd, 'w', encoding='utf-8') as f_journal:
+                for s_name, (f_score, f_time) in l_snapshot:
+                    f_journal.write(
+                            f's\t{f_time:.0f}\t{f_score:.6g}\t{s_name}\n')
+                f_journal.flush()
+                os.fsync(f_journal.fileno())
+            os.replace(s_temp_path, self.s_journal_path)
+        except BaseException:
+            os.remove(s_temp_path)
+            raise
+        self.i_journal_lines = len(l_snapshot)
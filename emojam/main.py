@@ -10,18 +10,37 @@
 # fonts-noto-color-emoji
 # /usr/share/fonts/truetype/noto/NotoColorEmoji.ttf
 
+import os
+import signal
+import sys
+import time
+
 import gi
 
+import emojam.emojam_annotations as emojam_annotations
+import emojam.emojam_atlas as emojam_atlas
 import emojam.emojam_emojis as emojam_emojis
 import emojam.emojam_config as emojam_config
+import emojam.emojam_search as emojam_search
+import emojam.emojam_grid as emojam_grid
+import emojam.emojam_filter as emojam_filter
+import emojam.emojam_usage as emojam_usage
+import emojam.emojam_profile as emojam_profile
+import emojam.emojam_style as emojam_style
 
 gi.require_version("Gtk", "3.0")
-gi.require_version("Notify", "0.7")
 
-from gi.repository import Gtk, Gdk, Notify
+from gi.repository import Gtk, Gdk, GLib
+
+# Longest a chunk of background work may hold up the main loop, in seconds
+IDLE_TIME_SLICE = 0.004
+
+Notify = None   # libnotify, loaded on first use by notify()
+
 
 class EmojamWindow(Gtk.Window):
-    def __init__(self):
+    @emojam_profile.timed('window.build')
+    def __init__(self, b_show=True, emojis_load=None):
         # set up window
         super().__init__(title="Emojam")
         self.set_border_width(10)
@@ -37,21 +56,30 @@ class EmojamWindow(Gtk.Window):
         self.add_accel_group(self.accel_group)
         # init emoji related stuff, and config
         self.s_active_group = ""
-        self.set_css_style()    # for our emoji fonts
-        self.init_emojis()  # load emojis
         self.init_config()
+        self.set_css_style()    # for our emoji fonts
+        self.init_emojis(emojis_load)   # load emojis
+        self.init_usage()
+        self.init_filters()
         self.s_output_line = ""
-        self.current_menu_button = None
+        self.s_menu_emoji_name = None   # emoji the context menu is for
+        self.menu_emoji_rectangle = None    # and where it is in the grid
+        self.variant_popover = None     # made when first needed
         # Initialize composite layout for the window
         box_layout = self.make_larger_layout()
         self.add(box_layout)
-        self.show_all()
+        box_layout.show_all()
+        if b_show:  # a daemon builds everything, but stays hidden
+            self.show()
         self.set_active_group("All")
+        # Build the search index after the window is up, a slice at a time
+        GLib.idle_add(self.build_search_index_slice)
         self.refresh_statusbar()  # in case the config file overrides default
         self.refresh_zoomer()
-        Gtk.Settings.get_default().connect("notify::gtk-theme-name",
-                                           self.gtk_theme_changed)
-        Notify.init("Emojam")
+        settings = Gtk.Settings.get_default()
+        settings.connect("notify::gtk-theme-name", self.gtk_theme_changed)
+        settings.connect("notify::gtk-application-prefer-dark-theme",
+                         self.gtk_theme_changed)
 
     def make_larger_layout(self):
         box_layout = Gtk.VBox(spacing=10)
@@ -83,16 +111,16 @@ class EmojamWindow(Gtk.Window):
         # add groups buttons just below search box
         box_layout.pack_start(groups_button_box, expand=False, fill=True,
                               padding=0)
-        # Make flowbox label, showing which group is selected
+        # Make grid label, showing which group is selected
         self.selected_group_label = Gtk.Label(label="All")
         self.selected_group_label.props.xalign = 0.0
         self.selected_group_label.show()
         box_layout.pack_start(self.selected_group_label, expand=False,
                               fill=True, padding=0)
-        # make the emoji flowbox area
-        scrolled_flowbox = self.make_a_scrolled_flowbox_layout()
-        # add flowbox to the bottom of the VBox
-        box_layout.pack_start(scrolled_flowbox, expand=True, fill=True,
+        # make the emoji grid area
+        emoji_grid = self.make_emoji_grid()
+        # add grid to the bottom of the VBox
+        box_layout.pack_start(emoji_grid, expand=True, fill=True,
                               padding=0)
         # make a status bar - ugh, it's so big and ugly. why?
         self.status_bar = Gtk.Statusbar()
@@ -111,18 +139,19 @@ class EmojamWindow(Gtk.Window):
                             padding=0)
         return box_layout
 
-    def make_a_scrolled_flowbox_layout(self):
-        # flowbox, for resizable
-        scrolled = Gtk.ScrolledWindow()
-        scrolled.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
-        flowbox = Gtk.FlowBox()
-        flowbox.set_valign(Gtk.Align.START)
-        flowbox.set_max_children_per_line(30)
-        flowbox.set_selection_mode(Gtk.SelectionMode.NONE)
-        self.flowbox = flowbox
-        self.populate_flowbox_with_emojis(self.flowbox)
-        scrolled.add(self.flowbox)
-        return scrolled
+    def make_emoji_grid(self):
+        # custom-drawn grid - one widget, draws the emojis on screen itself
+        self.grid = emojam_grid.EmojiGrid(self.atlas,
+                                          self.emo.emoji_from_name,
+                                          self.emoji_grid_event,
+                                          self.show_variants)
+        # enable drag and drop, for whichever emoji was pressed
+        self.grid.layout.drag_source_set(Gdk.ModifierType.BUTTON1_MASK, [],
+                                         Gdk.DragAction.COPY)
+        self.grid.layout.drag_source_add_text_targets()
+        self.grid.layout.connect("drag-data-get", self.emoji_drag_data_get)
+        self.make_emoji_button_context_menu()
+        return self.grid
 
     def make_hamburger_menu(self):
         # Make button
@@ -191,6 +220,18 @@ class EmojamWindow(Gtk.Window):
         key, mod = Gtk.accelerator_parse("<Control>p")
         self.copy_checkbox_menu_item.add_accelerator("activate", self.accel_group,
                                                      key, mod, Gtk.AccelFlags.VISIBLE)
+        # make skin tone submenu
+        skin_tone_menu_item = Gtk.MenuItem(label="Skin _Tone")
+        skin_tone_menu_item.set_use_underline(True)
+        skin_tone_menu_item.set_submenu(self.make_skin_tone_menu())
+        skin_tone_menu_item.show()
+        menu.append(skin_tone_menu_item)
+        # make emoji version cap submenu
+        version_menu_item = Gtk.MenuItem(label="Newest Emoji _Version")
+        version_menu_item.set_use_underline(True)
+        version_menu_item.set_submenu(self.make_max_version_menu())
+        version_menu_item.show()
+        menu.append(version_menu_item)
         menu_separator = Gtk.SeparatorMenuItem()
         menu_separator.show()
         menu.append(menu_separator)
@@ -221,6 +262,73 @@ class EmojamWindow(Gtk.Window):
         menu_button.set_popup(menu)
         return menu_button
 
+    def make_skin_tone_menu(self):
+        """ Radio items for the default skin tone, checked from config """
+        menu = Gtk.Menu()
+        radio_group = None
+        for s_skin_tone in ('',) + tuple(emojam_emojis.SKIN_TONES.values()):
+            if s_skin_tone:
+                s_modifier = self.emo.emoji_from_name(
+                        f'{s_skin_tone} skin tone')
+                s_label = f"{s_modifier} {s_skin_tone.capitalize()}"
+            else:
+                s_label = "None"
+            menu_item = Gtk.RadioMenuItem.new_with_label_from_widget(
+                    radio_group, s_label)
+            radio_group = menu_item
+            menu_item.set_active(s_skin_tone == self.config.get_skin_tone())
+            menu_item.connect("toggled", self.toggled_skin_tone, s_skin_tone)
+            menu_item.show()
+            menu.append(menu_item)
+        return menu
+
+    def make_max_version_menu(self):
+        """ Radio items for the newest emoji version to show, for fonts
+        that can't draw the latest ones. Checked from config """
+        menu = Gtk.Menu()
+        radio_group = None
+        for s_version in [''] + self.emo.versions():
+            menu_item = Gtk.RadioMenuItem.new_with_label_from_widget(
+                    radio_group, s_version or "All")
+            radio_group = menu_item
+            menu_item.set_active(
+                    s_version == self.config.get_max_emoji_version())
+            menu_item.connect("toggled", self.toggled_max_version, s_version)
+            menu_item.show()
+            menu.append(menu_item)
+        return menu
+
+    def toggled_max_version(self, menu_item, s_version: str):
+        if not menu_item.get_active():
+            return
+        self.config.set_max_emoji_version(s_version)
+        self.config.save()
+        self.apply_max_version()
+        self.visible_bits = None
+        if self.search_matches is None:
+            self.show_active_group()
+        else:
+            self.show_search_matches()
+
+    def apply_max_version(self):
+        """ Hide emojis newer than the configured version cap """
+        s_version = self.config.get_max_emoji_version()
+        try:
+            t_version = emojam_emojis.parse_version(s_version) \
+                if s_version else None
+        except ValueError:  # hand edited config, show everything
+            t_version = None
+        self.filters.set_max_version(t_version)
+
+    def toggled_skin_tone(self, menu_item, s_skin_tone: str):
+        if not menu_item.get_active():
+            return
+        self.config.set_skin_tone(s_skin_tone)
+        self.config.save()
+        if self.search_matches is None:
+            self.visible_bits = None    # same emojis, different tone
+            self.show_active_group()
+
     def toggled_statusbar(self, statusbar_checkbox_menu_item):
         is_checked = statusbar_checkbox_menu_item.get_active()
         if is_checked:
@@ -268,10 +376,60 @@ class EmojamWindow(Gtk.Window):
     def init_config(self):
         self.config = emojam_config.EmojamConfig()
         self.config.load_config()
-        self.update_picker_font_size(self.config.picker_font_size)
 
-    def init_emojis(self):
-        self.emo = emojam_emojis.Emojis("emojis.csv")
+    @emojam_profile.timed('window.index_slice')
+    def build_search_index_slice(self):
+        """ Idle callback: build the search index for up to IDLE_TIME_SLICE
+        seconds, then give the main loop back. Searching before it's done
+        just finishes the index on the spot """
+        f_deadline = time.perf_counter() + IDLE_TIME_SLICE
+        while time.perf_counter() < f_deadline:
+            if not self.search.build_step():
+                return GLib.SOURCE_REMOVE
+        return GLib.SOURCE_CONTINUE
+
+    def init_usage(self):
+        s_journal_path = os.path.join(
+                os.path.dirname(self.config.full_config_path), 'usage.log')
+        self.usage = emojam_usage.UsageTracker(s_journal_path)
+        self.usage.load()
+        if self.usage.is_empty():
+            # first run with usage tracking, start from the old recent list
+            self.usage.seed(self.config.recently_used_emojis)
+        self.search.f_usage_boost = self.usage.boost
+
+    def recent_names(self):
+        """ Return recently used emoji names, highest frecency first """
+        return self.usage.ranked(self.config.recently_used_max_count)
+
+    def init_filters(self):
+        self.filters = emojam_filter.FilterEngine(self.emo)
+        self.filters.set_favorites(self.config.favorites)
+        self.filters.set_recent(self.recent_names())
+        self.apply_max_version()
+        self.visible_bits = None    # what the emoji grid is showing
+
+    def init_emojis(self, emojis_load=None):
+        """ Take the DB from emojis_load (an emojam_emojis.BackgroundLoad)
+        if it's given, or load it now """
+        if emojis_load is not None:
+            self.emo = emojis_load.result()
+        else:
+            self.emo = emojam_emojis.Emojis(emojam_emojis.DB_FILENAME)
+        # keywords in the user's language, read as the index is built
+        self.search = emojam_search.EmojiSearch(
+                self.emo, b_build=False,
+                annotations=emojam_annotations.Annotations.for_locale())
+        self.search_session = emojam_search.SearchSession(self.search)
+        self.search_matches = None  # None = not searching
+        self.atlas = emojam_atlas.GlyphAtlas(
+                [record.emoji for record in self.emo.l_records],
+                ready=self.atlas_ready)
+
+    def atlas_ready(self):
+        """ A glyph atlas for the current zoom is ready, use it """
+        if hasattr(self, 'grid'):
+            self.grid.redraw_cells()
 
     def make_output_line(self):
         # make box, put label and Entry in box, side by side, return box
@@ -297,41 +455,104 @@ class EmojamWindow(Gtk.Window):
         return self.search_entry
 
     def make_emoji_button_context_menu(self):
+        """ Make the one right-click menu shared by every emoji. It gets
+        pointed at an emoji when it pops up, in popup_emoji_context_menu """
         menu = Gtk.Menu()
         favorites_menu_item = Gtk.CheckMenuItem(label="Favorites")
-        favorites_menu_item.connect_object('toggled', self.toggled_favorites,
-                                           favorites_menu_item)
+        self.favorites_toggled_handler = favorites_menu_item.connect(
+                'toggled', self.toggled_favorites)
         menu.append(favorites_menu_item)
         copy_menu_item = Gtk.MenuItem(label="_Copy")
         copy_menu_item.set_use_underline(True)
         copy_menu_item.connect("activate", self.copy_emoji_to_clip)
         copy_menu_item.show()
         menu.append(copy_menu_item)
+        # only shown for emojis that have skin tones or genders
+        variants_menu_item = Gtk.MenuItem(label="_Variants...")
+        variants_menu_item.set_use_underline(True)
+        variants_menu_item.connect("activate", self.variants_menu_activated)
+        menu.append(variants_menu_item)
+        self.emoji_variants_menu_item = variants_menu_item
 
         favorites_menu_item.show()
-        return menu, favorites_menu_item    # I said I'd never love twice.
+        self.emoji_context_menu = menu
+        self.emoji_favorites_menu_item = favorites_menu_item
+
+    def popup_emoji_context_menu(self, s_emoji_name: str, event):
+        self.s_menu_emoji_name = s_emoji_name
+        # Sync favorite checkbox with config, without it counting as a toggle
+        favorites_menu_item = self.emoji_favorites_menu_item
+        favorites_menu_item.handler_block(self.favorites_toggled_handler)
+        favorites_menu_item.set_active(self.config.is_in_favorites(s_emoji_name))
+        favorites_menu_item.handler_unblock(self.favorites_toggled_handler)
+        self.menu_emoji_rectangle = self.grid.pressed_cell_rectangle()
+        self.emoji_variants_menu_item.set_visible(bool(
+                self.shown_variant_names(s_emoji_name)))
+        self.emoji_context_menu.popup(None, None, None, None, event.button,
+                                      event.time)
+
+    def variants_menu_activated(self, menu_item):
+        if self.s_menu_emoji_name:
+            self.show_variants(self.s_menu_emoji_name,
+                               self.menu_emoji_rectangle)
+
+    def shown_variant_names(self, s_emoji_name: str):
+        """ Names of the variants of the emoji s_emoji_name is a form of,
+        leaving out ones the version cap hides """
+        return [s_variant_name for s_variant_name
+                in self.emo.variant_names(self.emo.base_name(s_emoji_name))
+                if not self.filters.is_hidden(s_variant_name)]
+
+    def show_variants(self, s_emoji_name: str, rectangle):
+        """ Pop up an emoji's skin tone and gender variants, pointing at
+        rectangle in the grid. The popover is only made the first time """
+        s_base_name = self.emo.base_name(s_emoji_name)
+        l_variants = self.shown_variant_names(s_emoji_name)
+        if not l_variants:
+            return
+        if self.variant_popover is None:
+            self.variant_popover = Gtk.Popover.new(self.grid.layout)
+            self.variant_flowbox = Gtk.FlowBox()
+            self.variant_flowbox.set_max_children_per_line(6)
+            self.variant_flowbox.set_selection_mode(Gtk.SelectionMode.NONE)
+            self.variant_popover.add(self.variant_flowbox)
+        for child in self.variant_flowbox.get_children():
+            child.destroy()
+        for s_variant_name in [s_base_name] + l_variants:
+            button = Gtk.Button(label=self.emo.emoji_from_name(s_variant_name))
+            button.set_relief(Gtk.ReliefStyle.NONE)
+            button.set_tooltip_text(s_variant_name)
+            button.get_style_context().add_class('variant-button')
+            button.connect("clicked", self.clicked_variant_button,
+                           s_variant_name)
+            self.variant_flowbox.add(button)
+        self.variant_popover.set_pointing_to(rectangle)
+        self.variant_popover.show_all()
+        self.variant_popover.popup()
+
+    def clicked_variant_button(self, button, s_emoji_name: str):
+        self.variant_popover.popdown()
+        self.clicked_emoji_button(s_emoji_name)
 
     def copy_emoji_to_clip(self, widget):
-        print(widget)
-        if self.current_menu_button:    # tricky
-            s_name = self.current_menu_button.get_name()
-            s_emoji = self.emo.emoji_from_name(s_name)
+        if self.s_menu_emoji_name:
+            s_emoji = self.emo.emoji_from_name(self.s_menu_emoji_name)
             self.clipboard.set_text(s_emoji, -1)
             self.clipboard_primary.set_text(s_emoji, -1)
 
     def toggled_favorites(self, menu_item):
         is_checked = menu_item.get_active()
-        if self.current_menu_button:    # tricky
-            emoji_name = self.current_menu_button.get_name()
+        if self.s_menu_emoji_name:
+            emoji_name = self.s_menu_emoji_name
             if is_checked:
                 self.config.add_favorite(emoji_name)
             else:
                 self.config.remove_favorite(emoji_name)
+            self.filters.set_favorite(emoji_name, is_checked)
             self.config.save()
         # Refresh the favorites page, hopefully
         if self.s_active_group == "Favorites":
-            self.flowbox.set_filter_func(self.flowbox_group_filter,
-                                         self.s_active_group)
+            self.show_active_group()
 
     def make_group_button(self, s_button_name: str):
         s_button_label = self.emo.emoji_from_group(s_button_name)
@@ -454,29 +675,25 @@ class EmojamWindow(Gtk.Window):
         context_id = self.status_bar.get_context_id("hovered-group-name")
         self.status_bar.pop(context_id)
 
-    def enter_hover_over_emoji_button(self, button):
-        s_emoji_name = button.get_name()
+    def enter_hover_over_emoji_button(self, s_emoji_name: str):
         s_emoji = self.emo.emoji_from_name(s_emoji_name)
         # update statusbar:
         d_emoji = self.emo.emoji_dict_from_name(s_emoji_name)
         hex_code = d_emoji['codepoint']
+        version = d_emoji['version']
         group = d_emoji['group']
         sub_group = d_emoji['sub_group']
-        if self.config.is_in_favorites(button.get_name()):
+        if self.config.is_in_favorites(s_emoji_name):
             fav = "yes"
         else:
             fav = "no"
-        s_status_bar_text = f"{s_emoji} {s_emoji_name}, Favorite: {fav}, Hex: {hex_code}, Group: {group}, Sub-group: {sub_group}"
+        s_status_bar_text = f"{s_emoji} {s_emoji_name}, Favorite: {fav}, Hex: {hex_code}, Version: {version}, Group: {group}, Sub-group: {sub_group}"
         context_id = self.status_bar.get_context_id("emoji-info")
         self.status_bar.push(context_id, s_status_bar_text)
-        button_style_context = button.get_style_context()
-        button_style_context.add_class('highlighted')
 
-    def leave_hover_over_emoji_button(self, button):
+    def leave_hover_over_emoji_button(self, s_emoji_name: str):
         context_id = self.status_bar.get_context_id("emoji-info")
         self.status_bar.pop(context_id)
-        button_style_context = button.get_style_context()
-        button_style_context.remove_class('highlighted')
 
     def button_mouse_event(self, button, event):
         """ Generic handler for our eventbox buttons - adds hover events for highlighting """
@@ -488,21 +705,20 @@ class EmojamWindow(Gtk.Window):
             self.leave_hover_over_button(button)
 
     # Mouse event handlers - hovers, clicks, scrolls, etc
-    def emoji_button_mouse_event(self, widget, event, button):  # widget = menu
-        # print(f"Debug: emoji_button_mouse_event, button: %i" % (event.button.button))
-        # print(f"Debug: emoji_button_mouse_event, button: {event}")
-        if event.type == Gdk.EventType.ENTER_NOTIFY:
-            self.enter_hover_over_emoji_button(button)
-        elif event.type == Gdk.EventType.LEAVE_NOTIFY:
-            self.leave_hover_over_emoji_button(button)
-        elif event.type == Gdk.EventType.BUTTON_PRESS:
-            if event.button.button == 3:    # right-click
+    def emoji_grid_event(self, event_type, s_emoji_name, event):
+        """ Delegated handler for every emoji in the grid. The grid works
+        out which emoji the pointer is on, and draws the hover highlight """
+        if event_type == Gdk.EventType.ENTER_NOTIFY:
+            self.enter_hover_over_emoji_button(s_emoji_name)
+        elif event_type == Gdk.EventType.LEAVE_NOTIFY:
+            self.leave_hover_over_emoji_button(s_emoji_name)
+        elif event_type == Gdk.EventType.BUTTON_PRESS:
+            if event.button == 3:    # right-click
                 # make menu pop up
-                self.current_menu_button = button
-                widget.popup(None, None, None, None, event.button.button,
-                             event.time)
-            elif event.button.button == 1:  # left_click-click
-                self.clicked_emoji_button(button)
+                self.popup_emoji_context_menu(s_emoji_name, event)
+        elif event_type == Gdk.EventType.BUTTON_RELEASE:
+            if event.button == 1:  # left_click-click
+                self.clicked_emoji_button(s_emoji_name)
 
     def make_groups_buttons(self):
         # returns a gtk box containing ze buttons
@@ -582,158 +798,106 @@ class EmojamWindow(Gtk.Window):
         scrolled.add(groups_bbox)
         return scrolled
 
-    def flowbox_group_filter(self, fb_child, s_group):
-        """ Filter by group or category """
-        if s_group == 'All':
-            return True
-        elif s_group == "Recently Used":
-            for button in fb_child:
-                if self.config.is_in_recent_emojis(button.get_name()):
-                    return True
-                else:
-                    return False
-        elif s_group == "Favorites":
-            for button in fb_child:
-                if self.config.is_in_favorites(button.get_name()):
-                    return True
-                else:
-                    return False
-        else:
-            for button in fb_child:
-                if s_group in self.emo.emoji_group_from_name(button.get_name()):
-                    return True
-                else:
-                    return False
-        return False    # should never really get here
-
-    def flowbox_search_filter(self, fb_child, text):
-        # from example at:
-        # https://stackoverflow.com/questions/55828169/how-to-filter-gtk-flowbox-children-with-gtk-entrysearch
-        if text == '':
-            return True    # empty search
-        for button in fb_child:
-            if text in button.get_name().lower():
-                return True
-            elif text in self.emo.emoji_group_from_name(button.get_name()).lower():
-                return True
-            else:
-                return False
-        return False    # should never really get here
+    @emojam_profile.timed('window.show_group')
+    def show_active_group(self):
+        """ Show the emojis in the active group, in database order, or
+        Recently Used by frecency. Groups show base emojis, in the default
+        skin tone """
+        i_bits = self.filters.group_bits(self.s_active_group)
+        if self.s_active_group == "Recently Used":
+            self.visible_bits = i_bits
+            self.grid.set_names([s_emoji_name for s_emoji_name
+                                 in self.recent_names()
+                                 if self.filters.bit_for_name(s_emoji_name) &
+                                 i_bits])
+        elif i_bits != self.visible_bits:
+            self.visible_bits = i_bits
+            l_names = self.filters.names_from_bits(i_bits)
+            s_skin_tone = self.config.get_skin_tone()
+            if s_skin_tone and self.s_active_group != "Favorites":
+                l_toned_names = []
+                for s_emoji_name in l_names:
+                    s_toned_name = self.emo.toned_name(s_emoji_name,
+                                                       s_skin_tone)
+                    if self.filters.is_hidden(s_toned_name):
+                        s_toned_name = s_emoji_name
+                    l_toned_names.append(s_toned_name)
+                l_names = l_toned_names
+            self.grid.set_names(l_names)
 
-    def search_box_changed(self, widget, user_data):
-        self.set_active_group("All")    # since we're searching all, make it clear..
-        search_text = widget.get_text().lower()
-        self.flowbox.set_filter_func(self.flowbox_search_filter, search_text)
-        pass
+    @emojam_profile.timed('window.show_search_matches')
+    def show_search_matches(self):
+        """ Show the current search matches within the active group, best
+        first, ties in database order """
+        d_scores = self.search_matches.scores
+        i_bits = self.filters.group_bits(self.s_active_group,
+                                         b_fold_variants=False) & \
+            self.filters.bits_from_names(d_scores)
+        l_records = self.emo.l_records
+        l_names = [l_records[i_id].name
+                   for i_id in self.filters.ids_from_bits(i_bits)]
+        # sort is stable, so equal scores stay in database order
+        l_names.sort(key=lambda s_name: -d_scores[s_name])
+        self.visible_bits = i_bits
+        self.grid.set_names(l_names)
 
-    def make_emoji_button(self, s_emoji_name: str):
-        s_emoji = self.emo.emoji_from_name(s_emoji_name)
-        button = Gtk.EventBox()
-        button_label = Gtk.Label(label=s_emoji)
-        button.set_name(s_emoji_name)
-        button_label.set_name(s_emoji)
-        button.add(button_label)
-        # add button to .emoji-button CSS class
-        button_style_context = button.get_style_context()
-        button_style_context.add_class("emoji-button")
-        menu, checkbox_menu_item = self.make_emoji_button_context_menu()
-        if self.config.is_in_favorites(s_emoji_name):
-            # Preopulate favorite checkbox
-            checkbox_menu_item.set_active(True)
+    @emojam_profile.timed('window.search_keystroke')
+    def search_box_changed(self, widget, user_data):
+        # since we're searching all, make it clear..
+        self.set_active_group("All", b_refilter=False)
+        self.search_matches = self.search_session.query(widget.get_text())
+        if self.search_matches is None:
+            self.show_active_group()
         else:
-            checkbox_menu_item.set_active(False)
-        # right-click and hover:
-        button.connect_object("event", self.emoji_button_mouse_event, menu,
-                              button)
-        # enable drag and drop
-        button.drag_source_set(Gdk.ModifierType.BUTTON1_MASK, [],
-                               Gdk.DragAction.COPY)
-        button.drag_source_add_text_targets()
-        button.connect("drag-data-get", self.emoji_drag_data_get)
-        return button
+            self.show_search_matches()
+        if emojam_profile.ENABLED:
+            # how much filtering each keystroke did
+            emojam_profile.sample('keystroke.matches_scored',
+                                  len(self.search_matches or ()))
+            emojam_profile.sample('keystroke.names_shown',
+                                  len(self.grid.l_names))
 
     def emoji_drag_data_get(self, widget, drag_context, data, info, time):
         """ Get data to drop when emoji is drag and dropped """
         TARGET_TEXT_ENTRY = 0
-        if info == TARGET_TEXT_ENTRY:
-            text = self.emo.emoji_from_name(widget.get_name())
+        s_emoji_name = self.grid.s_pressed_name
+        if info == TARGET_TEXT_ENTRY and s_emoji_name:
+            text = self.emo.emoji_from_name(s_emoji_name)
             data.set_text(text, -1)
 
     def gtk_theme_changed(self, settings, gparam):
-        self.set_css_style()
+        self.style.update_theme()
 
+    @emojam_profile.timed('style.set_css_style')
     def set_css_style(self):
-        # Get "selected" color from theme, to use as our highlight color
-        tv = Gtk.TextView()  # dumb smart way to get theme's selected background color
-        selected_bg_color = tv.get_style_context().lookup_color('theme_selected_bg_color')
-        s_hilight_color = selected_bg_color.color.to_string()
-        selected_bg_color.color.alpha = 0.5
-        s_hilight_color_fainter = selected_bg_color.color.to_string()
-        # static css - should probably put this in a file...
-        css = """
-            .emoji-button {
-                font-family: Noto Color Emoji;
-                font-size: 275%;
-            }
-            .group-button {
-                font-family: Noto Color Emoji;
-                font-size: 90%;
-            }
-            .output-field {
-                font-family: Noto Color Emoji;
-            }
-            """
-        # dynamically generated to match theme highlight color
-        css += """
-            .highlighted {
-                border-radius: 10px;
-                background-color: %s;
-                text-shadow: 1px 1px 3px black;
-            }
-            .selected-group {
-                border-radius: 5px;
-                background-color: %s;
-                text-shadow: 1px 1px 2px black;
-            }
-            .hovered-group {
-                border-radius: 5px;
-                background-color: %s;
-                text-shadow: 1px 1px 2px black;
-            }
-            """ % (s_hilight_color, s_hilight_color, s_hilight_color_fainter)
-
-        css_provider = Gtk.CssProvider()
-        css_provider.load_from_data(css.encode())
-        context = Gtk.StyleContext()
-        screen = Gdk.Screen.get_default()
-        context.add_provider_for_screen(screen, css_provider,
-                                        Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
+        """ Install our stylesheets, with the theme's highlight color and the
+        configured picker font size """
+        self.style = emojam_style.StyleManager(
+                self, self.config.picker_font_size,
+                restyled=self.picker_restyled)
+
+    def picker_restyled(self):
+        """ A zoom has been applied, lay the emojis out again at the new
+        size """
+        if hasattr(self, 'grid'):
+            self.grid.queue_relayout()
 
     def change_picker_size(self, widget, new_size):     # from the menu item
         self.update_picker_font_size(new_size)
         self.config.save()
 
     def update_picker_font_size(self, new_size):
-        css = """
-            .emoji-button {
-                font-family: Noto Color Emoji;
-                font-size: %i%%;
-            }
-            """ % (new_size)
-        css_provider = Gtk.CssProvider()
-        css_provider.load_from_data(css.encode())
-        context = Gtk.StyleContext()
-        screen = Gdk.Screen.get_default()
-        context.add_provider_for_screen(screen, css_provider,
-                                        Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
+        """ Zoom the emojis. Restyling waits until the zoom clicks stop,
+        the config is updated straight away """
         self.config.set_picker_font_size(new_size)
+        self.style.set_font_size(new_size)
 
     def clicked_group_button(self, widget, event):
         s_group: str = widget.get_name()
-        self.set_active_group(s_group)
         self.search_entry.set_text("")
+        self.set_active_group(s_group)
 
-    def set_active_group(self, s_group):
+    def set_active_group(self, s_group, b_refilter=True):
         # un-highlight new button
         try:
             button = self.group_buttons_dict[self.s_active_group]
@@ -743,7 +907,8 @@ class EmojamWindow(Gtk.Window):
             pass
         # change group in data structures
         self.s_active_group = s_group
-        self.flowbox.set_filter_func(self.flowbox_group_filter, s_group)
+        if b_refilter:
+            self.show_active_group()
         self.selected_group_label.set_text(s_group)
         # highlight new button
         button = self.group_buttons_dict[s_group]
@@ -758,11 +923,13 @@ class EmojamWindow(Gtk.Window):
         self.s_output_line += s_emoji
         self.output_text_field.set_text(self.s_output_line)
 
-    def clicked_emoji_button(self, widget):
-        s_emoji_name: str = widget.get_name()
+    @emojam_profile.timed('window.emoji_clicked')
+    def clicked_emoji_button(self, s_emoji_name: str):
         s_emoji: str = self.emo.emoji_from_name(s_emoji_name)
         s_emoji_group: str = self.emo.emoji_group_from_name(s_emoji_name)
+        self.usage.record_pick(s_emoji_name)
         self.config.add_recent(s_emoji_name)
+        self.filters.add_recent(s_emoji_name)
         self.config.save()
         # Send emoji wherever! To the terminal:
         print(f"{s_emoji} :{s_emoji_name}: {s_emoji_group}")
@@ -772,22 +939,96 @@ class EmojamWindow(Gtk.Window):
         if self.config.auto_copy:
             self.clipboard.set_text(s_emoji, -1)
             self.clipboard_primary.set_text(s_emoji, -1)
-            Notify.Notification.new(f"{s_emoji} copied to clipboard").show()
+            self.notify(f"{s_emoji} copied to clipboard")
 
-    def populate_flowbox_with_emojis(self, flowbox):
-        # load all emojis:
-        for s_group in self.emo.d_emojis.keys():
-            label = Gtk.Label(label=s_group)
-            label.show()
-            for s_emoji_name in self.emo.d_emojis[s_group]:
-                button = self.make_emoji_button(s_emoji_name)
-                flowbox.add(button)
+    def notify(self, s_message: str):
+        """ Show a desktop notification. libnotify is only loaded the first
+        time, as most sessions never notify (auto-copy is off by default) """
+        global Notify
+        if Notify is None:
+            try:
+                gi.require_version("Notify", "0.7")
+                from gi.repository import Notify as notify_module
+                notify_module.init("Emojam")
+                Notify = notify_module
+            except (ImportError, ValueError) as err:
+                print(f"Emojam: notifications unavailable: {err}",
+                      file=sys.stderr)
+                Notify = False  # don't try again
+        if Notify:
+            Notify.Notification.new(s_message).show()
 
+    def hide_on_delete_event(self, widget, event):
+        """ In daemon mode, closing the window only hides it """
+        self.hide()
+        return True     # don't destroy it
 
-def main():
-    win = EmojamWindow()
+    def daemon_command(self, s_command: str, s_argument=None):
+        """ Run a command from an emojam client. Returns True if it made the
+        window visible """
+        b_was_visible = self.get_visible()
+        if s_command == "toggle":
+            if b_was_visible and self.is_active():
+                self.hide()
+                return False
+            self.present()
+        elif s_command == "show":
+            self.present()
+        elif s_command == "search":
+            self.search_entry.set_text(s_argument or "")
+            self.search_entry.grab_focus()
+            self.present()
+        return not b_was_visible
+
+
+def report_first_paint(win, cairo_context, f_start_time):
+    """ Print time from startup to the window's first draw, if the
+    EMOJAM_TIMING environment variable is set """
+    f_elapsed_ms = (time.perf_counter() - f_start_time) * 1000
+    win.f_first_paint_ms = f_elapsed_ms
+    win.disconnect(win.first_paint_handler)
+    if os.environ.get("EMOJAM_TIMING"):
+        print(f"Time to first paint: {f_elapsed_ms:.1f} ms", file=sys.stderr)
+    return False
+
+
+def main(s_search=None, b_daemon=False, emojis_load=None, f_start_time=None):
+    """ Run the picker. s_search starts it with a search. b_daemon keeps it
+    running hidden, for emojam clients to show (see emojam_cli).
+    emojis_load is a DB load already under way, f_start_time when startup
+    began, for timing """
+    if f_start_time is None:
+        f_start_time = time.perf_counter()
+    if emojis_load is None:     # load it while GTK sets up the window
+        emojis_load = emojam_emojis.BackgroundLoad(emojam_emojis.DB_FILENAME)
+    win = EmojamWindow(b_show=not b_daemon, emojis_load=emojis_load)
+    if s_search:
+        win.daemon_command("search", s_search)
+    server = None
+    if b_daemon:
+        import emojam.emojam_daemon as emojam_daemon
+        server = emojam_daemon.DaemonServer(win)
+        try:
+            server.start()
+        except (emojam_daemon.DaemonError, OSError) as err:
+            print(f"Emojam: can't start daemon: {err}", file=sys.stderr)
+            return 1
+        win.connect("delete-event", win.hide_on_delete_event)
+        # quit cleanly on kill too, so the socket gets removed
+        GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGTERM,
+                             Gtk.main_quit)
+    else:
+        win.first_paint_handler = win.connect("draw", report_first_paint,
+                                              f_start_time)
     win.connect("destroy", Gtk.main_quit)
-    Gtk.main()
+    try:
+        Gtk.main()
+    finally:
+        if server is not None:
+            server.stop()
+        win.config.flush()  # don't leave a pending save behind
+        win.usage.flush()
+    return 0
 
 
 if __name__ == "__main__":
@@ -39,7 +39,7 @@ setup(
     ],
     entry_points={
     'console_scripts': [
-        'emojam = emojam.main:main',
+        'emojam = emojam.emojam_cli:main',
     ],
 },
 )
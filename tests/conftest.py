@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+# Shared fixtures for Emojam's tests.
+#
+# Every test runs with HOME and the XDG dirs pointed at a scratch directory,
+# so nothing reads or writes the real user's config, cache or journal.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+
+@pytest.fixture(autouse=True)
+def scratch_home(tmp_path, monkeypatch):
+    """ A throwaway HOME, with the XDG dirs inside it """
+    s_home = str(tmp_path / 'home')
+    os.makedirs(s_home)
+    monkeypatch.setenv('HOME', s_home)
+    monkeypatch.setenv('XDG_CACHE_HOME', os.path.join(s_home, '.cache'))
+    monkeypatch.setenv('XDG_DATA_HOME', os.path.join(s_home, '.local',
+                                                     'share'))
+    monkeypatch.setenv('XDG_RUNTIME_DIR', os.path.join(s_home, 'run'))
+    os.makedirs(os.path.join(s_home, 'run'), mode=0o700)
+    return s_home
+
+
+@pytest.fixture(scope='session')
+def emo():
+    """ The real emoji DB, loaded from the CSV. Shared, so don't change it """
+    import emojam.emojam_emojis as emojam_emojis
+    return emojam_emojis.Emojis(emojam_emojis.DB_FILENAME, b_use_cache=False)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+# Tests for the cache dir: the compiled emoji DB, and pruning old entries.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import os
+
+import pytest
+
+import emojam.emojam_cache as emojam_cache
+import emojam.emojam_emojis as emojam_emojis
+
+
+def make_entry(s_dir: str, s_stem: str, i_size: int, i_age: int):
+    """ An entry of a .png and a .json, last used i_age seconds ago """
+    for s_extension, i_bytes in (('png', i_size - 10), ('json', 10)):
+        s_path = os.path.join(s_dir, f'{s_stem}.{s_extension}')
+        with open(s_path, 'wb') as f_out:
+            f_out.write(b'x' * i_bytes)
+        os.utime(s_path, (1_700_000_000 - i_age,) * 2)
+
+
+def entry_dir(tmp_path):
+    s_dir = str(tmp_path / 'atlas')
+    os.makedirs(s_dir)
+    return s_dir
+
+
+def stems_in(s_dir: str):
+    return sorted({s_name.partition('.')[0] for s_name in os.listdir(s_dir)})
+
+
+def test_prune_drops_least_recently_used(tmp_path):
+    s_dir = entry_dir(tmp_path)
+    make_entry(s_dir, 'old', 100, 300)
+    make_entry(s_dir, 'older', 100, 400)
+    make_entry(s_dir, 'recent', 100, 100)
+    make_entry(s_dir, 'new', 100, 0)
+    assert emojam_cache.prune_cache_entries(s_dir, 250) == 2
+    assert stems_in(s_dir) == ['new', 'recent']
+
+
+def test_prune_keeps_entry_just_saved(tmp_path):
+    s_dir = entry_dir(tmp_path)
+    make_entry(s_dir, 'huge', 1000, 500)
+    make_entry(s_dir, 'other', 100, 0)
+    assert emojam_cache.prune_cache_entries(s_dir, 500, 'huge') == 1
+    assert stems_in(s_dir) == ['huge']
+
+
+def test_prune_under_limit_keeps_everything(tmp_path):
+    s_dir = entry_dir(tmp_path)
+    make_entry(s_dir, 'one', 100, 10)
+    make_entry(s_dir, 'two', 100, 20)
+    assert emojam_cache.prune_cache_entries(s_dir, 1000) == 0
+    assert emojam_cache.prune_cache_entries(str(tmp_path / 'none'), 0) == 0
+    assert stems_in(s_dir) == ['one', 'two']
+
+
+def emojis_cache_path():
+    return emojam_cache.cache_path_for(emojam_emojis.DB_FILENAME)
+
+
+def test_cache_loads_like_the_csv(emo):
+    emojam_emojis.Emojis(emojam_emojis.DB_FILENAME)
+    assert os.path.exists(emojis_cache_path())
+    cached = emojam_emojis.Emojis(emojam_emojis.DB_FILENAME)
+    assert [tuple(record) for record in cached.l_records] == \
+        [tuple(record) for record in emo.l_records]
+
+
+HEADER_SIZE = emojam_cache.HEADER_SIZE
+
+
+@pytest.mark.parametrize('damage', [
+    pytest.param(lambda data: b'', id='empty'),
+    pytest.param(lambda data: data[:HEADER_SIZE - 1], id='short-header'),
+    pytest.param(lambda data: data[:HEADER_SIZE + 3], id='split-offset'),
+    pytest.param(lambda data: data[:HEADER_SIZE + 40], id='few-offsets'),
+    pytest.param(lambda data: data[:len(data) // 2], id='half'),
+    pytest.param(lambda data: data[:-5], id='split-record'),
+    pytest.param(lambda data: data + b'junk', id='trailing-junk'),
+    pytest.param(lambda data: data[:HEADER_SIZE] +
+                 b'\xff' * (len(data) - HEADER_SIZE), id='offsets-past-end'),
+    pytest.param(lambda data: data[:HEADER_SIZE + 4] + b'\xff\xff\0\0' +
+                 data[HEADER_SIZE + 8:], id='offsets-out-of-order'),
+    pytest.param(lambda data: data.replace('\U0001F600'.encode(),
+                                           b'\xff' * 4, 1),
+                 id='bad-utf-8'),
+])
+def test_damaged_cache_falls_back_and_is_rebuilt(emo, damage):
+    emojam_emojis.Emojis(emojam_emojis.DB_FILENAME)
+    s_cache_path = emojis_cache_path()
+    with open(s_cache_path, 'rb') as f_cache:
+        data = f_cache.read()
+    with open(s_cache_path, 'wb') as f_cache:
+        f_cache.write(damage(data))
+    with pytest.raises(emojam_cache.CacheError):
+        cache = emojam_cache.EmojiCache(s_cache_path)
+        try:
+            list(cache.rows())
+        finally:
+            cache.close()
+    loaded = emojam_emojis.Emojis(emojam_emojis.DB_FILENAME)
+    assert len(loaded.l_records) == len(emo.l_records)
+    with open(s_cache_path, 'rb') as f_cache:
+        assert f_cache.read() == data
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+# Tests for the command line.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import emojam.emojam_cli as emojam_cli
+
+from conftest import REPO_DIR
+
+
+def run_emojam(*args):
+    """ Run emojam in a fresh interpreter, return the finished process """
+    return subprocess.run([sys.executable, os.path.join(REPO_DIR, 'emojam.py'),
+                           *args], capture_output=True, text=True, timeout=60,
+                          cwd=REPO_DIR)
+
+
+def test_profile_output_implies_profile(tmp_path):
+    s_report_path = str(tmp_path / 'profile.json')
+    process = run_emojam('--profile-output', s_report_path, 'lookup',
+                         'red heart')
+    assert process.returncode == 0, process.stderr
+    with open(s_report_path, encoding='utf-8') as f_report:
+        d_report = json.load(f_report)
+    assert 'timers' in d_report
+
+
+@pytest.mark.parametrize('s_limit', ['-1', 'x', '1.5'])
+def test_bad_limit_is_a_usage_error(s_limit, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        emojam_cli.make_argument_parser().parse_args(
+                ['search', 'cat', '--limit', s_limit])
+    assert exit_info.value.code == 2
+    assert '--limit' in capsys.readouterr().err
+
+
+def test_limit(capsys):
+    assert emojam_cli.main(['search', 'cat', '--limit', '2']) == 0
+    assert len(capsys.readouterr().out.splitlines()) == 2
+    assert emojam_cli.main(['search', 'cat', '--limit', '0']) == 0
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+# Tests for the daemon client, against sockets standing in for the daemon.
+# Unlike test_daemon, these don't need PyGObject.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import os
+import socket
+
+import pytest
+
+import emojam.emojam_cli as emojam_cli
+import emojam.emojam_client as emojam_client
+
+
+@pytest.fixture
+def silent_daemon(monkeypatch):
+    """ A socket at the daemon's path that takes connections but never
+    answers """
+    monkeypatch.setattr(emojam_client, 'REPLY_TIMEOUT', 0.1)
+    s_path = emojam_client.socket_path()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(s_path)
+        server.listen(8)
+        yield s_path
+    os.remove(s_path)
+
+
+def test_encode_decode_round_trip():
+    b_line = emojam_client.encode_command('search', 'red\theart\n')
+    assert b_line == b'search\tred heart\n'
+    assert emojam_client.decode_command(b_line) == ('search', 'red heart')
+    assert emojam_client.decode_command(b'toggle\n') == ('toggle', None)
+    with pytest.raises(ValueError):
+        emojam_client.encode_command('explode')
+
+
+def test_no_daemon_is_unavailable():
+    with pytest.raises(emojam_client.DaemonUnavailable):
+        emojam_client.send_command('toggle')
+    assert emojam_cli.run_client('toggle') is None  # start a picker
+
+
+def test_stale_socket_is_unavailable():
+    s_path = emojam_client.socket_path()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(s_path)     # bound, but nobody listening
+        with pytest.raises(emojam_client.DaemonUnavailable):
+            emojam_client.send_command('toggle')
+
+
+def test_slow_daemon_times_out(silent_daemon):
+    with pytest.raises(emojam_client.DaemonTimeout):
+        emojam_client.send_command('toggle')
+
+
+def test_slow_daemon_doesnt_start_a_picker(silent_daemon, capsys):
+    assert emojam_cli.run_client('toggle') == 1
+    assert "didn't answer" in capsys.readouterr().err
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+# Tests for the config file: write-behind saves, and failed writes.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import configparser
+
+import pytest
+
+import emojam.emojam_config as emojam_config
+
+
+@pytest.fixture(autouse=True)
+def no_background_writes(monkeypatch):
+    """ Hold saves back long enough that only the tests' flush() writes """
+    for s_delay in ('SAVE_DELAY', 'SAVE_MAX_DELAY', 'SAVE_RETRY_DELAY'):
+        monkeypatch.setattr(emojam_config, s_delay, 600)
+
+
+def make_config():
+    config = emojam_config.EmojamConfig()
+    config.load_config()
+    return config
+
+
+def test_save_round_trips():
+    config = make_config()
+    config.add_favorite('cat')
+    config.add_recent('dog')
+    config.set_skin_tone('medium skin tone')
+    config.enable_zoomer()
+    config.save()
+    config.flush()
+    reloaded = make_config()
+    assert reloaded.favorites == ['cat']
+    assert reloaded.recently_used_emojis == ['dog']
+    assert reloaded.get_skin_tone() == 'medium skin tone'
+    assert reloaded.zoomer_is_enabled()
+
+
+def test_save_leaves_serializing_to_the_writer(monkeypatch):
+    config = make_config()
+    l_writes = []
+    write = configparser.ConfigParser.write
+    monkeypatch.setattr(configparser.ConfigParser, 'write',
+                        lambda *args: l_writes.append(True) or write(*args))
+    config.add_favorite('cat')
+    config.save()
+    assert not l_writes
+    # later changes don't leak into the queued save
+    config.add_favorite('dog')
+    config.flush()
+    assert len(l_writes) == 1
+    assert make_config().favorites == ['cat']
+
+
+def test_failed_write_is_retried(tmp_path):
+    config = make_config()
+    s_config_path = config.full_config_path
+    # a file where the config's directory should be
+    config.full_config_path = str(tmp_path / 'blocked' / 'emojam.ini')
+    (tmp_path / 'blocked').write_text('')
+    config.add_favorite('cat')
+    config.save()
+    with pytest.raises(OSError):
+        config.flush()
+    assert config.d_pending_snapshot['favorites'] == ('cat',)
+    config.full_config_path = s_config_path
+    config.flush()
+    assert config.d_pending_snapshot is None
+    assert make_config().favorites == ['cat']
+
+
+def test_failed_write_keeps_a_newer_save(monkeypatch):
+    config = make_config()
+    write_config_file = config.write_config_file
+
+    def save_then_fail(s_text):
+        # a click saves while the writer is busy with the old snapshot
+        config.add_favorite('dog')
+        config.save()
+        raise OSError('disk full')
+    config.add_favorite('cat')
+    config.save()
+    monkeypatch.setattr(config, 'write_config_file', save_then_fail)
+    with pytest.raises(OSError):
+        config.flush()
+    assert config.d_pending_snapshot['favorites'] == ('cat', 'dog')
+    monkeypatch.setattr(config, 'write_config_file', write_config_file)
+    config.flush()
+    assert make_config().favorites == ['cat', 'dog']
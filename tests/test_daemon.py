@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+# Tests for daemon mode: the real DaemonServer, driven over its socket by
+# the client, first with a stand-in window and then with the picker.
+#
+# Needs PyGObject with GTK 3, and the picker window tests a display too (run
+# under xvfb-run on a headless box). Skipped without them.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import socket
+import threading
+import time
+
+import pytest
+
+import emojam.emojam_client as emojam_client
+
+gi = pytest.importorskip('gi')
+try:    # emojam_daemon asks gi for GTK 3 when it's imported
+    import emojam.emojam_daemon as emojam_daemon
+    from gi.repository import GLib
+except (ValueError, ImportError) as err:   # no GTK 3 typelib
+    pytest.skip(f'needs GTK 3: {err}', allow_module_level=True)
+
+# Toggle to visible on the picker, from the client sending the command to
+# the daemon's reply after the window has drawn
+TOGGLE_BUDGET_MS = 500
+
+
+class StandInWindow:
+    """ Just enough of EmojamWindow for DaemonServer: takes commands, and
+    "draws" on the next idle after being shown """
+
+    def __init__(self):
+        self.b_visible = False
+        self.b_destroyed = False
+        self.l_commands = []
+        self.d_draw_handlers = {}
+
+    def daemon_command(self, s_command: str, s_argument=None):
+        self.l_commands.append((s_command, s_argument))
+        b_was_visible = self.b_visible
+        self.b_visible = not b_was_visible if s_command == 'toggle' else True
+        return self.b_visible and not b_was_visible
+
+    def connect_after(self, s_signal: str, f_handler):
+        i_handler = len(self.d_draw_handlers) + 1
+        self.d_draw_handlers[i_handler] = f_handler
+        GLib.idle_add(self.draw)
+        return i_handler
+
+    def disconnect(self, i_handler: int):
+        del self.d_draw_handlers[i_handler]
+
+    def draw(self):
+        for f_handler in list(self.d_draw_handlers.values()):
+            f_handler(self, None)
+        return GLib.SOURCE_REMOVE
+
+    def destroy(self):
+        self.b_destroyed = True
+
+
+def send(s_path: str, s_command: str, s_argument=None):
+    """ Send a command from a client thread, running the main loop until the
+    reply comes. Returns (reply, ms taken) """
+    d_outcome = {}
+
+    def client():
+        try:
+            d_outcome['reply'] = emojam_client.timed_send_command(
+                    s_command, s_argument, s_path)
+        except emojam_client.DaemonUnavailable as err:
+            d_outcome['error'] = err
+    thread = threading.Thread(target=client)
+    thread.start()
+    context = GLib.MainContext.default()
+    while thread.is_alive():
+        if not context.iteration(False):
+            time.sleep(0.0005)
+    thread.join()
+    if 'error' in d_outcome:
+        raise d_outcome['error']
+    return d_outcome['reply']
+
+
+@pytest.fixture
+def stand_in_server():
+    win = StandInWindow()
+    server = emojam_daemon.DaemonServer(win)
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_commands_reach_the_window(stand_in_server):
+    win = stand_in_server.win
+    s_path = stand_in_server.s_path
+    s_reply, f_ms = send(s_path, 'toggle')
+    assert s_reply == 'shown'
+    assert f_ms < emojam_daemon.SHOW_REPLY_TIMEOUT  # drawn, not timed out
+    assert send(s_path, 'show')[0] == 'ok'          # already showing
+    assert send(s_path, 'toggle')[0] == 'ok'        # hidden
+    assert not win.b_visible
+    assert send(s_path, 'search', 'red\theart')[0] == 'shown'
+    assert win.l_commands == [('toggle', None), ('show', None),
+                              ('toggle', None), ('search', 'red heart')]
+    assert send(s_path, 'quit')[0] == 'ok'
+    assert win.b_destroyed
+
+
+def test_bad_command_gets_an_error(stand_in_server):
+    def client(d_outcome):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(emojam_client.REPLY_TIMEOUT)
+            sock.connect(stand_in_server.s_path)
+            sock.sendall(b'explode\n')
+            d_outcome['reply'] = sock.recv(emojam_client.MAX_LINE)
+    d_outcome = {}
+    thread = threading.Thread(target=client, args=(d_outcome,))
+    thread.start()
+    while thread.is_alive():
+        GLib.MainContext.default().iteration(False)
+    assert d_outcome['reply'].startswith(b'error\t')
+    assert not stand_in_server.win.l_commands
+
+
+def test_second_daemon_refused(stand_in_server):
+    with pytest.raises(emojam_daemon.DaemonError):
+        emojam_daemon.DaemonServer(StandInWindow()).start()
+
+
+def test_toggle_shows_picker_in_budget():
+    """ The real picker window, built hidden like --daemon does """
+    gi.require_version('Gtk', '3.0')
+    from gi.repository import Gtk
+    if not Gtk.init_check()[0]:
+        pytest.skip('needs a display')
+    import emojam.main as main
+    win = main.EmojamWindow(b_show=False)
+    server = emojam_daemon.DaemonServer(win)
+    server.start()
+    try:
+        s_reply, f_ms = send(server.s_path, 'toggle')
+        print(f'toggle to visible: {f_ms:.1f} ms')
+        assert s_reply == 'shown'
+        assert win.get_visible()
+        assert f_ms < TOGGLE_BUDGET_MS
+        s_reply, f_ms = send(server.s_path, 'search', 'cat')
+        assert s_reply == 'ok'  # already visible
+        assert win.search_entry.get_text() == 'cat'
+        win.hide()
+        s_reply, f_ms = send(server.s_path, 'show')
+        assert s_reply == 'shown'
+        assert f_ms < TOGGLE_BUDGET_MS
+        assert send(server.s_path, 'quit')[0] == 'ok'
+    finally:
+        server.stop()
+        win.usage.flush()
+        win.config.flush()
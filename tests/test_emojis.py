@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# Tests for the emoji database.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import csv
+import gc
+import tracemalloc
+
+import pytest
+
+import emojam.emojam_emojis as emojam_emojis
+
+
+def retained_bytes(f_build):
+    """ Bytes still allocated after f_build() returns, and what it
+    returned """
+    gc.collect()
+    tracemalloc.start()
+    i_before = tracemalloc.get_traced_memory()[0]
+    kept = f_build()
+    gc.collect()
+    i_after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return i_after - i_before, kept
+
+
+def read_csv_rows(emo):
+    """ The CSV's rows as csv.DictReader gives them, fresh strings in each
+    row like the old loader had """
+    s_path = emo.get_resource('emojam.emoji_sets', emojam_emojis.DB_FILENAME)
+    with open(s_path, encoding='utf-8') as f_db_csv:
+        return list(csv.DictReader(f_db_csv))
+
+
+def test_records_use_less_memory_than_dicts(emo):
+    """ A slotted EmojiRecord with pooled group strings, against the
+    six-key dict per emoji it replaced """
+    def dict_rows():
+        return [{'name': d_row['Name'],
+                 'emoji': d_row['Representation'],
+                 'group': d_row['Group'],
+                 'sub_group': d_row['Subgroup'],
+                 'codepoint': d_row['CodePoint'],
+                 'favorite': False}
+                for d_row in read_csv_rows(emo)]
+
+    def records():
+        pool = {}.setdefault
+        return [emojam_emojis.EmojiRecord(
+                    d_row['Name'], d_row['Representation'],
+                    pool(d_row['Group'], d_row['Group']),
+                    pool(d_row['Subgroup'], d_row['Subgroup']),
+                    d_row['CodePoint'], pool(d_row['Section'],
+                                             d_row['Section']))
+                for d_row in read_csv_rows(emo)]
+
+    i_dict_bytes, l_dicts = retained_bytes(dict_rows)
+    i_record_bytes, l_records = retained_bytes(records)
+    assert len(l_dicts) == len(l_records)
+    f_dict_per_emoji = i_dict_bytes / len(l_dicts)
+    f_record_per_emoji = i_record_bytes / len(l_records)
+    print(f'bytes per emoji: {f_dict_per_emoji:.0f} as dicts, '
+          f'{f_record_per_emoji:.0f} as records')
+    # about 630 against 335 on CPython 3.11
+    assert f_record_per_emoji < f_dict_per_emoji * 0.7
+
+
+def test_record_reads_like_a_dict(emo):
+    """ The GTK code still reads records with ['key'] """
+    emoji_record = emo.emoji_dict_from_name('red heart')
+    assert emoji_record['emoji'] == emoji_record.emoji
+    assert emoji_record['favorite'] is False
+    assert set(dict(emoji_record)) == set(emojam_emojis.EmojiRecord.KEYS)
+
+
+@pytest.mark.parametrize('s_qualification', emojam_emojis.QUALIFICATIONS)
+def test_qualification_counts_and_indexes(emo, s_qualification):
+    l_rows = read_csv_rows(emo)
+    qualified = emojam_emojis.Emojis(emojam_emojis.DB_FILENAME,
+                                     b_use_cache=False,
+                                     s_qualification=s_qualification)
+    i_records = len(qualified.l_records)
+    # every shown record is counted once, under a name of its own
+    assert qualified.emoji_count() == i_records
+    assert len(qualified.d_by_name) == i_records
+    assert sum(map(len, qualified.d_emojis.values())) == i_records
+    assert [emoji_record.id for emoji_record in qualified.l_records] == \
+        list(range(i_records))
+    # and every row, shown or an alias, can be looked up
+    assert i_records + len(qualified.l_aliases) == len(l_rows)
+    for d_row in l_rows:
+        assert qualified.d_by_emoji[d_row['Representation']] is not None
+        assert qualified.emoji_dict_from_codepoint(d_row['CodePoint']) \
+            is not None
+    t_shown = emojam_emojis.QUALIFICATIONS[s_qualification]
+    assert i_records >= sum(d_row['Status'] in t_shown for d_row in l_rows)
+
+
+def test_qualification_default_shows_fewer(emo):
+    """ Fully-qualified only by default, the other forms as aliases """
+    everything = emojam_emojis.Emojis(emojam_emojis.DB_FILENAME,
+                                      b_use_cache=False, s_qualification='all')
+    assert not everything.l_aliases
+    assert emo.l_aliases
+    assert len(emo.l_records) < len(everything.l_records)
+    # smiling face, without and with a variation selector
+    assert emo.d_by_emoji['\u263A'] is emo.d_by_emoji['\u263A\uFE0F']
+
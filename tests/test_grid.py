@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+# Widget and signal handler counts of the picker's emoji grid, against the
+# widget-per-emoji layout it replaced.
+#
+# Needs PyGObject with GTK 3 and a display (run under xvfb-run on a headless
+# box), and is skipped without them.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import pytest
+
+gi = pytest.importorskip('gi')
+try:
+    gi.require_version('Gtk', '3.0')
+    from gi.repository import Gdk, GObject, Gtk
+except (ValueError, ImportError) as err:   # no GTK 3 typelib
+    pytest.skip(f'needs GTK 3: {err}', allow_module_level=True)
+
+if not Gtk.init_check()[0]:
+    pytest.skip('needs a display', allow_module_level=True)
+
+
+class HandlerCounter:
+    """ Counts signal handlers connected inside a with block """
+
+    def __init__(self):
+        self.i_count = 0
+        self.patch = pytest.MonkeyPatch()
+
+    def __enter__(self):
+        for s_method in ('connect', 'connect_after', 'connect_object'):
+            self.patch.setattr(GObject.Object, s_method,
+                               self.counted(getattr(GObject.Object,
+                                                    s_method)))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.patch.undo()
+
+    def counted(self, f_connect):
+        def connect(obj, *args, **kwargs):
+            self.i_count += 1
+            return f_connect(obj, *args, **kwargs)
+        return connect
+
+
+def count_widgets(widget):
+    """ widget and everything inside it, internal children included """
+    l_count = [0]
+
+    def walk(child):
+        l_count[0] += 1
+        if isinstance(child, Gtk.Container):
+            child.forall(walk)
+    walk(widget)
+    return l_count[0]
+
+
+def make_old_emoji_button(emo, s_emoji_name: str):
+    """ An emoji button as the picker used to make them: an EventBox and
+    Label, with a context menu of its own """
+    button = Gtk.EventBox()
+    button.set_name(s_emoji_name)
+    button.add(Gtk.Label(label=emo.emoji_from_name(s_emoji_name)))
+    button.get_style_context().add_class('emoji-button')
+    menu = Gtk.Menu()
+    favorites_menu_item = Gtk.CheckMenuItem(label='Favorites')
+    favorites_menu_item.connect_object('toggled', lambda *args: None,
+                                       favorites_menu_item)
+    menu.append(favorites_menu_item)
+    copy_menu_item = Gtk.MenuItem(label='_Copy')
+    copy_menu_item.connect('activate', lambda *args: None)
+    menu.append(copy_menu_item)
+    button.connect_object('event', lambda *args: None, menu, button)
+    button.drag_source_set(Gdk.ModifierType.BUTTON1_MASK, [],
+                           Gdk.DragAction.COPY)
+    button.drag_source_add_text_targets()
+    button.connect('drag-data-get', lambda *args: None)
+    return button, menu
+
+
+def test_grid_cuts_widgets_and_handlers(emo):
+    import emojam.main as main
+    with HandlerCounter() as old_counter:
+        flowbox = Gtk.FlowBox()
+        l_menus = []
+        for emoji_record in emo.l_records:
+            button, menu = make_old_emoji_button(emo, emoji_record.name)
+            flowbox.add(button)
+            l_menus.append(menu)
+    i_old_widgets = count_widgets(flowbox) + sum(map(count_widgets, l_menus))
+    with HandlerCounter() as new_counter:
+        win = main.EmojamWindow(b_show=False)
+    # the whole window, not just the grid, still comes in far under
+    i_new_widgets = count_widgets(win) + \
+        count_widgets(win.emoji_context_menu)
+    win.destroy()
+    print(f'widgets: {i_old_widgets} -> {i_new_widgets}, '
+          f'handlers: {old_counter.i_count} -> {new_counter.i_count}')
+    assert i_old_widgets >= 4 * len(emo.l_records)
+    assert i_new_widgets * 10 <= i_old_widgets
+    assert new_counter.i_count * 10 <= old_counter.i_count
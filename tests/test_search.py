@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+# Tests for search ranking and the step by step index build.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import pytest
+
+import emojam.emojam_annotations as emojam_annotations
+import emojam.emojam_search as emojam_search
+
+
+def make_annotations(tmp_path, d_keywords):
+    """ Annotations from a text file of emoji: [keywords] """
+    s_path = str(tmp_path / 'test.txt')
+    with open(s_path, 'w', encoding='utf-8') as f_annotations:
+        for s_emoji, l_keywords in d_keywords.items():
+            f_annotations.write(f"{s_emoji}\t{'|'.join(l_keywords)}\n")
+    return emojam_annotations.Annotations([s_path])
+
+
+def test_tiers_order():
+    assert emojam_search.TIER_EXACT > emojam_search.TIER_KEYWORD > \
+        emojam_search.TIER_PREFIX > emojam_search.TIER_TOKEN > \
+        emojam_search.TIER_FUZZY
+
+
+def test_exact_keyword_ranks_above_name_prefix(emo, tmp_path):
+    annotations = make_annotations(tmp_path, {
+        '\U0001F602': ['lol', 'laugh'],
+        '\U0001F639': ['cat', 'laugh']})
+    search = emojam_search.EmojiSearch(emo, annotations=annotations)
+    l_ranked = search.ranked_query('lol').ranked()
+    assert l_ranked[0] == 'face with tears of joy'
+    assert 'lollipop' in l_ranked
+    # a query that only starts a keyword ranks as a token prefix match
+    d_scores = search.ranked_query('laug').scores
+    assert d_scores['face with tears of joy'] < emojam_search.TIER_KEYWORD
+
+
+def test_scan_query_ranks_like_the_index(emo, tmp_path):
+    annotations = make_annotations(tmp_path, {'\U0001F602': ['lol']})
+    search = emojam_search.EmojiSearch(emo, b_build=False,
+                                       annotations=annotations)
+    assert search.scan_query('lol').ranked()[0] == 'face with tears of joy'
+
+
+def test_small_steps_build_the_same_index(emo, tmp_path):
+    d_keywords = {record.emoji: ['shared', 'common', record.name]
+                  for record in emo.l_records}
+    whole = emojam_search.EmojiSearch(
+            emo, annotations=make_annotations(tmp_path, d_keywords))
+    stepped = emojam_search.EmojiSearch(
+            emo, b_build=False,
+            annotations=make_annotations(tmp_path, d_keywords))
+    i_steps = 0
+    for _ in stepped.iter_build_steps(i_chunk=5, i_merges=100):
+        i_steps += 1
+    assert stepped.b_ready
+    # every emoji has "shared", so merging it into the trie alone takes
+    # many steps
+    assert i_steps > 2 * len(emo.l_records) * len('shared') // 100
+    assert stepped.d_index == whole.d_index
+    assert stepped.d_keyword_names == whole.d_keyword_names
+    assert stepped.prefix_matches('sha') == whole.prefix_matches('sha')
+    assert isinstance(stepped.prefix_matches('sha'), frozenset)
+
+
+@pytest.fixture(scope='module')
+def search(emo):
+    return emojam_search.EmojiSearch(emo)
+
+
+@pytest.fixture(scope='module')
+def scan_search(emo):
+    return emojam_search.EmojiSearch(emo, b_build=False)
+
+
+@pytest.mark.parametrize('s_query, s_first', [
+    ('smilng', 'smiling face'),
+    ('grining', 'grinning cat'),
+    ('thumbs pu', 'thumbs up'),
+    ('catt', 'cat'),
+])
+def test_misspelled_best_match_first(search, scan_search, s_query,
+                                     s_first):
+    assert search.ranked_query(s_query).ranked()[0] == s_first
+    assert scan_search.scan_query(s_query).ranked()[0] == s_first
+
+
+def test_misspelled_name_beats_sub_group(search):
+    # "winking face" is only in the face-smiling sub-group
+    d_scores = search.ranked_query('smilng').scores
+    assert d_scores['smiling face'] > d_scores['winking face']
+
+
+@pytest.mark.parametrize('s_query', ['hert', 'hart'])
+def test_one_typo_finds_short_words(search, s_query):
+    l_ranked = search.ranked_query(s_query).ranked()
+    assert 'red heart' in l_ranked
+    assert 'heart suit' in l_ranked
+
+
+@pytest.mark.parametrize('s_query', [
+    'smilng', 'hert', 'grining', 'thumbs pu', 'catt', 'fcae', 'cat fce',
+    'smiling', 'heart', 'xyzzy'])
+def test_index_and_scan_rank_the_same(search, scan_search, s_query):
+    index_result = search.ranked_query(s_query)
+    scan_result = scan_search.scan_query(s_query)
+    assert index_result.scores == scan_result.scores
+    assert index_result.ranked() == scan_result.ranked()
+
+
+@pytest.mark.parametrize('s_a, s_b, b_expected', [
+    ('hert', 'heart', True),
+    ('heart', 'hert', True),
+    ('hert', 'herb', True),
+    ('fcae', 'face', True),
+    ('face', 'face', False),
+    ('face', 'cafe', False),
+    ('hert', 'hearts', False),
+])
+def test_one_typo_apart(s_a, s_b, b_expected):
+    assert emojam_search.one_typo_apart(s_a, s_b) is b_expected
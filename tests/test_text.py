@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+# Tests for emojize and demojize: shortcodes, longest matches, and streams
+# split into chunks anywhere.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import random
+
+import pytest
+
+import emojam.emojam_text as emojam_text
+
+
+@pytest.fixture(scope='module')
+def text_engine(emo):
+    return emojam_text.EmojiText(emo)
+
+
+def feed_in_chunks(converter, s_text: str, l_cuts):
+    """ Feed s_text split at l_cuts, return everything converted """
+    l_out = []
+    i_last = 0
+    for i_cut in sorted(l_cuts) + [len(s_text)]:
+        l_out.append(converter.feed(s_text[i_last:i_cut]))
+        i_last = i_cut
+    l_out.append(converter.close())
+    return ''.join(l_out)
+
+
+def test_shortcode_for():
+    assert emojam_text.shortcode_for('thumbs up') == 'thumbs_up'
+    assert emojam_text.shortcode_for('keycap: #') == 'keycap_hash'
+    assert emojam_text.shortcode_for('flag: Germany') == 'flag_germany'
+
+
+def test_shortcodes_round_trip(text_engine):
+    for s_shortcode, s_emoji in text_engine.d_emojis.items():
+        if s_emoji not in text_engine.d_shortcodes:
+            continue    # a text form, left alone by demojize
+        s_text = f'a :{s_shortcode}: b'
+        s_emojized = text_engine.emojize(s_text)
+        assert s_emojized == f'a {s_emoji} b'
+        assert text_engine.demojize(s_emojized) == \
+            f'a {text_engine.d_shortcodes[s_emoji]} b'
+
+
+def test_unknown_shortcodes_stay(text_engine):
+    assert text_engine.emojize(':nope: :thumbs_up:x: 10:30') == \
+        ':nope: \U0001F44Dx: 10:30'
+
+
+@pytest.mark.parametrize('s_text, s_expected', [
+    ('\U0001F468‍\U0001F469‍\U0001F467',
+     ':family_man_woman_girl:'),
+    ('\U0001F1E9\U0001F1EA\U0001F1EB\U0001F1F7',
+     ':flag_germany::flag_france:'),
+    ('\U0001F44D\U0001F3FD', ':thumbs_up_medium_skin_tone:'),
+    ('\U0001F44D\U0001F3FD\U0001F44D', ':thumbs_up_medium_skin_tone:'
+                                        ':thumbs_up:'),
+    ('#️⃣', ':keycap_hash:'),
+    ('❤️', ':red_heart:'),
+])
+def test_demojize_longest_match(text_engine, s_text, s_expected):
+    assert text_engine.demojize(s_text) == s_expected
+
+
+@pytest.mark.parametrize('s_text, s_expected', [
+    ('version 1', 'version 1'),
+    ('issue #', 'issue #'),
+    ('I love you ❤', 'I love you ❤'),
+    ('flag \U0001F1E9', 'flag \U0001F1E9'),
+    ('1️', '1️'),
+    ('\U0001F44D\U0001F3FD1', ':thumbs_up_medium_skin_tone:1'),
+    ('\U0001F468‍\U0001F469‍',
+     ':man:‍:woman:‍'),
+    ('1#*1', '1#*1'),
+])
+def test_demojize_ends_mid_sequence(text_engine, s_text, s_expected):
+    assert text_engine.demojize(s_text) == s_expected
+
+
+def test_chunk_splits_match_whole_string(text_engine, emo):
+    randomizer = random.Random(2022)
+    l_emojis = [record.emoji for record in emo.l_records]
+    l_pieces = l_emojis + ['a', ' ', ':', '1', '#', '❤', '️',
+                           '‍', '\U0001F1E9', ':thumbs_up:']
+    for _ in range(200):
+        s_text = ''.join(randomizer.choice(l_pieces)
+                         for _ in range(randomizer.randint(0, 30)))
+        l_cuts = [randomizer.randint(0, len(s_text))
+                  for _ in range(randomizer.randint(0, 6))]
+        assert feed_in_chunks(emojam_text.Demojizer(text_engine), s_text,
+                              l_cuts) == text_engine.demojize(s_text)
+        assert feed_in_chunks(emojam_text.Emojizer(text_engine), s_text,
+                              l_cuts) == text_engine.emojize(s_text)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+# Tests for usage tracking: frecency order, decay, the journal and its
+# compaction.
+#
+# Part of Emojam, (c) 2022 Sam Foster
+# See LICENSE file for details
+
+import os
+
+import emojam.emojam_usage as emojam_usage
+
+NOW = 1_700_000_000.0
+
+
+def make_tracker(tmp_path):
+    """ A tracker with its journal in tmp_path, replayed like at startup """
+    usage = emojam_usage.UsageTracker(str(tmp_path / 'emojam' / 'usage.log'))
+    usage.load()
+    return usage
+
+
+def journal_lines(usage):
+    with open(usage.s_journal_path, encoding='utf-8') as f_journal:
+        return f_journal.readlines()
+
+
+def test_seed_keeps_recent_list_order(tmp_path):
+    usage = make_tracker(tmp_path)
+    usage.seed(['newest', '', 'middle', 'oldest'], NOW)
+    assert usage.ranked() == ['newest', 'middle', 'oldest']
+    assert usage.most_recent() == ['newest', 'middle', 'oldest']
+
+
+def test_seed_survives_a_pick_and_restart(tmp_path):
+    usage = make_tracker(tmp_path)
+    usage.seed(['newest', 'middle', 'oldest'], NOW)
+    usage.record_pick('picked', NOW + 10)
+    usage.flush()
+    reloaded = make_tracker(tmp_path)
+    assert reloaded.most_recent() == ['picked', 'newest', 'middle', 'oldest']
+    assert set(reloaded.ranked()) == {'picked', 'newest', 'middle', 'oldest'}
+
+
+def test_scores_decay_by_half_life(tmp_path):
+    usage = make_tracker(tmp_path)
+    usage.record_pick('fire', NOW)
+    usage.record_pick('fire', NOW)
+    assert usage.frecency('fire', NOW) == 2
+    assert usage.frecency('fire', NOW + emojam_usage.HALF_LIFE) == 1
+    assert usage.frecency('never picked', NOW) == 0
+    # picked often a while ago, against once just now
+    usage.record_pick('rocket', NOW + 3 * emojam_usage.HALF_LIFE)
+    f_later = NOW + 3 * emojam_usage.HALF_LIFE
+    assert usage.frecency('rocket', f_later) > usage.frecency('fire', f_later)
+    assert 0 <= usage.boost('fire') < 1
+
+
+def test_journal_compacts_and_reloads(tmp_path, monkeypatch):
+    monkeypatch.setattr(emojam_usage, 'COMPACT_AFTER', 10)
+    usage = make_tracker(tmp_path)
+    for i_pick in range(30):
+        usage.record_pick(f'emoji {i_pick % 3}', NOW + i_pick)
+    usage.flush()
+    # compacted to one state line per emoji
+    l_lines = journal_lines(usage)
+    assert len(l_lines) == 3
+    assert all(s_line.startswith('s\t') for s_line in l_lines)
+    reloaded = make_tracker(tmp_path)
+    assert reloaded.most_recent() == usage.most_recent()
+    for s_name in usage.d_entries:
+        assert abs(reloaded.frecency(s_name, NOW + 30) -
+                   usage.frecency(s_name, NOW + 30)) < 1e-4
+
+
+def test_picks_append_until_compacting(tmp_path):
+    usage = make_tracker(tmp_path)
+    usage.record_pick('cat', NOW)
+    usage.flush()
+    usage.record_pick('dog', NOW + 1)
+    usage.flush()
+    assert [s_line.split('\t')[0] for s_line in journal_lines(usage)] == \
+        ['p', 'p']
+    assert make_tracker(tmp_path).most_recent() == ['dog', 'cat']
+
+
+def test_failed_write_is_retried(tmp_path):
+    usage = make_tracker(tmp_path)
+    s_journal_path = usage.s_journal_path
+    # a file where the journal's directory should be
+    usage.s_journal_path = str(tmp_path / 'blocked' / 'usage.log')
+    (tmp_path / 'blocked').write_text('')
+    usage.record_pick('cat', NOW)
+    usage.flush()
+    assert len(usage.l_pending_lines) == 1
+    usage.s_journal_path = s_journal_path
+    usage.record_pick('dog', NOW + 1)
+    usage.flush()
+    assert not usage.l_pending_lines
+    assert os.path.exists(s_journal_path)
+    assert make_tracker(tmp_path).most_recent() == ['dog', 'cat']